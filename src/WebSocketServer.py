@@ -1,80 +1,546 @@
+import argparse
 import asyncio
+import math
 import websockets
-import socket
-import json
+import os
+import random
+import time
+from urllib.parse import parse_qs, urlsplit
 import logging
+from metrics import Histogram, MetricsServer, RateMeter, histogram_lines, metric_lines
+import telemetry_codec
+from telemetry_recorder import FlightRecorder, TelemetryLog, replay
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 
-async def telemetry_bridge(websocket, path):
-    """WebSocket 处理函数"""
-    logging.info(f"Client connected from {websocket.remote_address}")
-    
-    try:
-        # 连接到TCP服务器
-        rc_ip = "10.87.49.48"
-        tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        tcp_socket.settimeout(5)  # 设置超时
-        tcp_socket.connect((rc_ip, 8081))
-        
-        buffer = ""
+METRICS_PORT = 9101  # Prometheus 指标端口
+
+RC_HOST = "10.87.49.48"  # 遥控器遥测 TCP 地址
+RC_PORT = 8081
+CLIENT_QUEUE_SIZE = 64   # 每个客户端最多积压的消息数，超出后丢弃最旧的
+RECONNECT_DELAY = 1.0    # 上游断开后的首次重连间隔 (秒)，之后指数退避
+MAX_RECONNECT_DELAY = 30.0
+HEARTBEAT_INTERVAL = 5.0  # 上游无数据多久后向客户端发送心跳 (秒)
+MAX_LINE_BYTES = 1 << 20  # 单行遥测的最大长度
+
+CONTROL_HOST = "127.0.0.1"  # 飞控 HTTP 接口 (与前端 /api 代理的目标相同)
+CONTROL_PORT = 8080
+CONTROL_TICK = 0.05         # 控制周期 (秒)：一个周期内的摇杆/云台更新只发送最新值
+CONTROL_TIMEOUT = 2.0
+# 可经 WebSocket 发送的控制命令 -> HTTP 路径 (请求体与 src/api/control.js 相同的 CSV)
+CONTROL_COMMANDS = {
+    'stick': '/send/stick',
+    'gimbalPitch': '/send/gimbal/pitch',
+    'gimbalYaw': '/send/gimbal/yaw',
+}
+
+# 运行统计 (供 /metrics 导出)
+connected_clients = {}  # websocket -> StreamClient / CoalescingClient
+telemetry_state = {}    # 合并后的最新遥测状态
+stats = {'messages': 0, 'bytes': 0, 'invalid': 0, 'heartbeats': 0,
+         'upstream_lines': 0, 'upstream_connects': 0, 'client_drops': 0, 'coalesced': 0,
+         'control_sent': 0, 'control_coalesced': 0, 'control_failed': 0, 'control_invalid': 0,
+         'control_connects': 0}
+message_rate = RateMeter()
+control_rtt = Histogram()  # 控制命令上游往返耗时
+control_channel = None     # ControlChannel，回放模式下为 None
+
+
+def collect_metrics():
+    """遥测桥接的 Prometheus 指标"""
+    return (
+        metric_lines('telemetry_connected_clients', '当前连接的 WebSocket 客户端数', 'gauge',
+                     [({}, len(connected_clients))])
+        + metric_lines('telemetry_upstream_lines_total', '从遥控器收到的遥测行数', 'counter',
+                       [({}, stats['upstream_lines'])])
+        + metric_lines('telemetry_upstream_connects_total', '与遥控器建立连接的次数', 'counter',
+                       [({}, stats['upstream_connects'])])
+        + metric_lines('telemetry_messages_forwarded_total', '累计转发的遥测消息数', 'counter',
+                       [({}, stats['messages'])])
+        + metric_lines('telemetry_messages_per_second', '最近几秒平均每秒转发消息数', 'gauge',
+                       [({}, message_rate.rate())])
+        + metric_lines('telemetry_bytes_forwarded_total', '累计转发的字节数', 'counter',
+                       [({}, stats['bytes'])])
+        + metric_lines('telemetry_client_dropped_total', '因客户端过慢被丢弃的消息数', 'counter',
+                       [({}, stats['client_drops'])])
+        + metric_lines('telemetry_coalesced_total', '合并到较新状态中、未单独发送的遥测数', 'counter',
+                       [({}, stats['coalesced'])])
+        + metric_lines('telemetry_invalid_lines_total', '无法解析的遥测行数', 'counter',
+                       [({}, stats['invalid'])])
+        + metric_lines('telemetry_heartbeats_total', '累计发送的心跳数', 'counter',
+                       [({}, stats['heartbeats'])])
+        + metric_lines('control_commands_total', '经 WebSocket 收到的控制命令', 'counter',
+                       [({'result': result}, stats[f'control_{result}'])
+                        for result in ('sent', 'coalesced', 'failed', 'invalid')])
+        + metric_lines('control_upstream_connects_total', '与飞控 HTTP 接口建立连接的次数', 'counter',
+                       [({}, stats['control_connects'])])
+        + histogram_lines('control_rtt_seconds', '控制命令发往飞控到收到响应的耗时', [({}, control_rtt)])
+    )
+
+
+HEARTBEAT = {"heartbeat": True}
+HEARTBEAT_LINE = '{"heartbeat": true}\n'
+
+
+class StreamClient:
+    """逐条转发 (日志记录等需要完整数据的客户端)，队列满时丢弃最旧的消息"""
+    def __init__(self, binary=False):
+        self.binary = binary  # 协商了 'binary' 子协议：发送 telemetry_codec 二进制帧
+        self.queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+
+    def offer(self, line, data, packed=None):
+        if self.queue.full():
+            self.queue.get_nowait()  # 慢客户端丢弃最旧的消息，不影响其他客户端
+            stats['client_drops'] += 1
+        self.queue.put_nowait(packed if self.binary else line)
+
+    async def next_message(self):
+        return await self.queue.get()
+
+
+class CoalescingClient:
+    """
+    只保留最新状态 (仪表盘等只关心当前值的客户端)
+    新遥测合并进待发送状态，按每客户端最大频率发送完整快照或字段级增量，不会积压。
+    """
+    def __init__(self, max_rate=10.0, mode='delta', binary=False):
+        self.binary = binary
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.mode = mode          # 'snapshot' | 'delta'
+        self.pending = {}         # 上次发送后变化过的字段
+        self.sent = {}            # 已发送给该客户端的字段值 (增量模式)
+        self.updates = 0
+        self.last_send = 0.0
+        self.event = asyncio.Event()
+        self.offer(None, telemetry_state)  # 连接后先发送一次当前完整状态
+
+    def offer(self, line, data, packed=None):
+        if not data or data is HEARTBEAT:
+            return  # 心跳：websockets 自身的 ping 已能保活
+        self.pending.update(data)
+        self.updates += 1
+        self.event.set()
+
+    async def next_message(self):
+        while True:
+            await self.event.wait()
+            wait = self.last_send + self.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)  # 等待期间的更新继续合并到 pending
+            self.event.clear()
+
+            if self.mode == 'snapshot':
+                message = dict(telemetry_state)
+            else:
+                message = {k: v for k, v in self.pending.items() if k not in self.sent or self.sent[k] != v}
+                self.sent.update(message)
+            stats['coalesced'] += self.updates - 1
+            self.pending = {}
+            self.updates = 0
+            self.last_send = time.monotonic()
+            if message:
+                if self.binary:
+                    return telemetry_codec.encode(message)
+                return telemetry_codec.dumps(message) + '\n'
+
+
+def broadcast(line, data):
+    """把一条消息交给所有客户端 (只在事件循环中调用)，二进制编码每条只做一次"""
+    packed = None
+    for client in connected_clients.values():
+        if packed is None and client.binary and isinstance(client, StreamClient):
+            packed = telemetry_codec.encode(data)
+        client.offer(line, data, packed)
+
+
+def create_client(path, binary=False):
+    """
+    根据连接 URL 的查询参数选择发送方式 (子协议 'binary' 时改为二进制编码):
+        ws://host:8765/                      逐条转发 (默认)
+        ws://host:8765/?rate=10              最多 10 Hz，发送字段级增量
+        ws://host:8765/?rate=5&mode=snapshot 最多 5 Hz，发送完整快照
+    """
+    query = parse_qs(urlsplit(path or '').query)
+    mode = query.get('mode', [''])[0]
+    rate = float(query.get('rate', ['0'])[0] or 0)
+    if mode in ('delta', 'snapshot') or rate > 0:
+        return CoalescingClient(rate, mode if mode in ('delta', 'snapshot') else 'delta', binary)
+    return StreamClient(binary)
+
+
+async def upstream_reader(host, port, recorder=None):
+    """
+    唯一的遥控器连接 (asyncio 流，不阻塞事件循环)
+    按字节逐行读取，每行只解析一次后广播给所有客户端；断开后按指数退避重连。
+    recorder: FlightRecorder，每条遥测同时写入飞行记录
+    """
+    delay = RECONNECT_DELAY
+    while True:
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, limit=MAX_LINE_BYTES), timeout=5)
+        except (OSError, asyncio.TimeoutError) as e:
+            logging.error(f"Connection error: {e}, retry in {delay:.1f}s")
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            continue
+
+        stats['upstream_connects'] += 1
+        logging.info(f"Connected to RC {host}:{port}")
+        delay = RECONNECT_DELAY
         try:
             while True:
                 try:
-                    # 从TCP接收数据
-                    data = tcp_socket.recv(4096).decode('utf-8')
-                    if not data:
-                        logging.info("TCP connection closed")
-                        break
-                    
-                    buffer += data
-                    while '\n' in buffer:
-                        line, buffer = buffer.split('\n', 1)
-                        if line.strip():
-                            # 验证JSON格式
-                            try:
-                                telemetry = json.loads(line)
-                                # 转发到WebSocket
-                                await websocket.send(line)
-                                logging.debug(f"Sent: {telemetry.get('batteryLevel', 'N/A')}%")
-                            except json.JSONDecodeError:
-                                logging.error(f"Invalid JSON: {line}")
-                                
-                except socket.timeout:
-                    # 发送心跳保持连接
-                    await websocket.send(json.dumps({"heartbeat": True}))
+                    line = await asyncio.wait_for(reader.readuntil(b'\n'), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    # 上游暂时没有数据，发送心跳保持连接
+                    broadcast(HEARTBEAT_LINE, HEARTBEAT)
+                    stats['heartbeats'] += 1
+                    continue
+                except asyncio.LimitOverrunError as e:
+                    # 超长行：丢弃到下一个换行符为止
+                    await reader.readexactly(e.consumed)
+                    stats['invalid'] += 1
+                    continue
+
+                if not line.strip():
+                    continue
+                # 验证JSON格式 (直接解析 bytes，有 orjson 时使用 orjson)
+                try:
+                    data = telemetry_codec.loads(line)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    stats['invalid'] += 1
+                    logging.error(f"Invalid JSON: {line[:200]!r}")
                     continue
-                    
+                stats['upstream_lines'] += 1
+                telemetry_state.update(data)
+                broadcast(line.decode('utf-8'), data)
+                if recorder is not None:
+                    recorder.record(time.time(), data)
+
+        except asyncio.IncompleteReadError:
+            logging.info("TCP connection closed")
         except Exception as e:
             logging.error(f"TCP error: {e}")
         finally:
-            tcp_socket.close()
-            
-    except Exception as e:
-        logging.error(f"Connection error: {e}")
+            writer.close()
+        await asyncio.sleep(delay)
+
+
+def select_subprotocol(connection, subprotocols):
+    """客户端提供 'binary' 时使用 telemetry_codec 紧凑编码；没有提供子协议的普通客户端照常接入"""
+    return 'binary' if 'binary' in subprotocols else None
+
+
+def format_control_value(value):
+    """和前端模板字符串一致：整数不带小数点"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"control value must be a number: {value!r}")
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"control value must be finite: {value!r}")
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+async def send_ack(websocket, ack):
+    try:
+        await websocket.send(telemetry_codec.dumps(ack) + '\n')
+    except websockets.ConnectionClosed:
+        pass
+
+
+class ControlChannel:
+    """
+    WebSocket 控制通道
+    客户端在遥测连接上发送 {"type": "stick", "id": 1, "v": [lx, ly, rx, ry]}，
+    每个控制周期内同类命令只保留最新值，经一条持久的 HTTP/1.1 连接依次发给飞控，
+    完成后回复 {"ack": id, "ok": true, "status": 200, "rtt_ms": 上游往返, "queue_ms": 排队}。
+    被更新的值取代的命令回复 {"ack": id, "coalesced": true}。
+    """
+    def __init__(self, host=CONTROL_HOST, port=CONTROL_PORT, tick=CONTROL_TICK):
+        self.host = host
+        self.port = port
+        self.tick = tick
+        self.pending = {}  # 命令 -> (websocket, id, 请求体, 收到时间)
+        self.event = asyncio.Event()
+        self._reader = None
+        self._writer = None
+
+    def submit(self, websocket, message):
+        """校验并排队一条命令；格式不对时抛出 ValueError，不会排队"""
+        command = message.get('type')
+        if command not in CONTROL_COMMANDS:
+            raise ValueError(f"unknown control type: {command!r}")
+        values = message.get('v')
+        if not isinstance(values, list) or not values:
+            raise ValueError("control values must be a non-empty list")
+        body = ','.join(format_control_value(v) for v in values)
+        previous = self.pending.get(command)
+        if previous is not None:
+            stats['control_coalesced'] += 1
+            asyncio.create_task(send_ack(previous[0], {'ack': previous[1], 'coalesced': True}))
+        self.pending[command] = (websocket, message.get('id'), body, time.monotonic())
+        self.event.set()
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _read_response(self):
+        status_line = await self._reader.readuntil(b'\r\n')
+        version, status = status_line.split()[:2]
+        status = int(status)
+        # HTTP/1.0 默认不保持连接
+        length, chunked, keep_alive = None, False, version != b'HTTP/1.0'
+        while True:
+            header = await self._reader.readuntil(b'\r\n')
+            if header == b'\r\n':
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'transfer-encoding' and 'chunked' in value:
+                chunked = True
+            elif name == 'connection':
+                if value == 'close':
+                    keep_alive = False
+                elif value == 'keep-alive':
+                    keep_alive = True
+        if chunked:
+            await self._read_chunked()
+        elif length is not None:
+            await self._reader.readexactly(length)
+        elif not (100 <= status < 200 or status in (204, 304)):
+            # 既无长度也不分块：响应体到连接关闭为止，这条连接不能再复用
+            await self._reader.read()
+            keep_alive = False
+        if not keep_alive:
+            self._close()
+        return status
+
+    async def _read_chunked(self):
+        # 分块响应体必须读到结束块和尾部空行，否则残留数据会错位到下一条命令的响应
+        while True:
+            size_line = await self._reader.readuntil(b'\r\n')
+            size = int(size_line.split(b';')[0].strip(), 16)
+            if size == 0:
+                break
+            await self._reader.readexactly(size + 2)
+        while await self._reader.readuntil(b'\r\n') != b'\r\n':
+            pass
+
+    async def _post(self, path, body):
+        data = body.encode('utf-8')
+        request = (f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                   f"Content-Type: text/plain\r\nContent-Length: {len(data)}\r\n"
+                   f"Connection: keep-alive\r\n\r\n").encode('latin-1') + data
+        if self._reader is not None and self._reader.at_eof():
+            # 飞控已关闭空闲连接
+            self._close()
+        for attempt in range(2):
+            reused = self._writer is not None
+            if not reused:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), timeout=CONTROL_TIMEOUT)
+                stats['control_connects'] += 1
+            try:
+                self._writer.write(request)
+                await asyncio.wait_for(self._writer.drain(), timeout=CONTROL_TIMEOUT)
+            except OSError:
+                # 复用的连接写入失败，命令没有发出，重连后重试一次
+                self._close()
+                if not reused or attempt:
+                    raise
+                continue
+            except asyncio.TimeoutError:
+                self._close()
+                raise
+            try:
+                return await asyncio.wait_for(self._read_response(), timeout=CONTROL_TIMEOUT)
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                    asyncio.TimeoutError, ValueError):
+                # 请求已写出，飞控可能已经执行，不能重发
+                self._close()
+                raise
+
+    async def run(self):
+        while True:
+            await self.event.wait()
+            self.event.clear()
+            tick_start = time.monotonic()
+            commands, self.pending = self.pending, {}
+            for command, (websocket, command_id, body, received) in commands.items():
+                sent = time.monotonic()
+                ack = {'ack': command_id, 'queue_ms': round((sent - received) * 1000, 1)}
+                try:
+                    ack['status'] = await self._post(CONTROL_COMMANDS[command], body)
+                    ack['ok'] = 200 <= ack['status'] < 300
+                    stats['control_sent'] += 1
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        asyncio.LimitOverrunError, ValueError) as e:
+                    ack['ok'] = False
+                    ack['error'] = str(e) or type(e).__name__
+                    stats['control_failed'] += 1
+                    logging.error(f"Control {command} failed: {ack['error']}")
+                rtt = time.monotonic() - sent
+                control_rtt.observe(rtt)
+                ack['rtt_ms'] = round(rtt * 1000, 1)
+                await send_ack(websocket, ack)
+            # 周期剩余时间内到达的更新继续合并
+            remaining = self.tick - (time.monotonic() - tick_start)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+
+async def receive_control(websocket):
+    """读取客户端发来的控制命令"""
+    async for message in websocket:
+        data = None
+        try:
+            data = telemetry_codec.loads(message)
+            if not isinstance(data, dict):
+                raise ValueError("control message must be an object")
+            if control_channel is None:
+                await send_ack(websocket, {'ack': data.get('id'), 'ok': False, 'error': 'no control link'})
+                continue
+            control_channel.submit(websocket, data)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # 被拒绝的命令也要回复，前端的 sendControl() 只在收到 ack 时结束
+            stats['control_invalid'] += 1
+            logging.error(f"Invalid control message: {str(message)[:200]}")
+            command_id = data.get('id') if isinstance(data, dict) else None
+            await send_ack(websocket, {'ack': command_id, 'ok': False, 'error': 'invalid'})
+
+
+async def send_telemetry(websocket, client):
+    while True:
+        message = await client.next_message()
+        await websocket.send(message)
+        stats['messages'] += 1
+        # 文本帧按 UTF-8 编码后的字节数计 (中文字段等非 ASCII 字符不止一个字节)
+        stats['bytes'] += len(message.encode('utf-8')) if isinstance(message, str) else len(message)
+        message_rate.mark()
+
+
+async def telemetry_bridge(websocket, path=None):
+    """WebSocket 处理函数：订阅共享的上游连接按客户端选择的方式发送，同时接收控制命令"""
+    if path is None:
+        request = getattr(websocket, 'request', None)  # websockets >= 13 不再传入 path
+        path = request.path if request is not None else '/'
+    client = create_client(path, binary=websocket.subprotocol == 'binary')
+    logging.info(f"Client connected from {websocket.remote_address} ({type(client).__name__} {path})")
+    connected_clients[websocket] = client
+
+    # 发送遥测和接收控制命令并行进行，任一方结束 (连接断开) 即清理
+    tasks = {asyncio.create_task(send_telemetry(websocket, client)),
+             asyncio.create_task(receive_control(websocket))}
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, websockets.ConnectionClosed):
+                logging.error(f"Connection error: {error}")
     finally:
+        for task in tasks:
+            task.cancel()
+        connected_clients.pop(websocket, None)
         logging.info(f"Client {websocket.remote_address} disconnected")
 
-async def main():
-    """主函数"""
+def emit_replayed(message):
+    """回放的遥测和上游遥测走同一条广播路径"""
+    stats['upstream_lines'] += 1
+    telemetry_state.update(message)
+    broadcast(telemetry_codec.dumps(message) + '\n', message)
+
+
+async def main(rc_host=RC_HOST, rc_port=RC_PORT, port=8765, record_path=None, replay_options=None,
+               control_host=CONTROL_HOST, control_port=CONTROL_PORT, metrics_port=METRICS_PORT):
+    """
+    主函数
+    record_path: 把上游遥测写入该飞行记录文件
+    metrics_port: Prometheus 指标端口，0 = 关闭
+    replay_options: {'path', 'speed', 'start', 'end', 'loop'}，回放飞行记录代替遥控器连接
+    """
+    global control_channel
     # 启动WebSocket服务器
     server = await websockets.serve(
         telemetry_bridge, 
         "0.0.0.0",  # 监听所有IP
-        8765,        # 端口
+        port,        # 端口
         ping_interval=20,  # 心跳间隔
-        ping_timeout=40    # 心跳超时
+        ping_timeout=40,   # 心跳超时
+        select_subprotocol=select_subprotocol
     )
     
-    logging.info("WebSocket server started on ws://0.0.0.0:8765")
+    logging.info(f"WebSocket server started on ws://0.0.0.0:{port}")
+    tasks = []
+    if replay_options:
+        log = TelemetryLog(replay_options['path'])
+        logging.info(f"Replaying {replay_options['path']} at {replay_options['speed']}x")
+        tasks.append(asyncio.create_task(replay(
+            log, emit_replayed, replay_options['speed'], replay_options['start'],
+            replay_options['end'], replay_options['loop'])))
+    else:
+        recorder = None
+        if record_path:
+            recorder = FlightRecorder(record_path)
+            tasks.append(asyncio.create_task(recorder.run()))
+            logging.info(f"Recording telemetry to {record_path}")
+        # 所有客户端共享一个遥控器连接
+        tasks.append(asyncio.create_task(upstream_reader(rc_host, rc_port, recorder)))
+        # 所有客户端共享一个控制通道
+        control_channel = ControlChannel(control_host, control_port)
+        tasks.append(asyncio.create_task(control_channel.run()))
+    if metrics_port:
+        try:
+            MetricsServer(collect_metrics, port=metrics_port).start()
+        except OSError as e:
+            # 指标只是附加功能，端口被占用时不影响遥测桥接
+            logging.warning(f"Metrics server disabled (port {metrics_port}): {e}")
     logging.info("Press Ctrl+C to stop")
     
     # 保持服务器运行
-    await server.wait_closed()
+    try:
+        await server.wait_closed()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='遥控器遥测 WebSocket 桥接')
+    parser.add_argument('--rc-host', type=str, default=RC_HOST, help='遥控器遥测地址 (本地压测可指向 fake_rc.py)')
+    parser.add_argument('--rc-port', type=int, default=RC_PORT, help='遥控器遥测端口')
+    parser.add_argument('--port', type=int, default=8765, help='WebSocket 监听端口')
+    parser.add_argument('--control-host', type=str, default=CONTROL_HOST, help='飞控 HTTP 接口地址')
+    parser.add_argument('--control-port', type=int, default=CONTROL_PORT, help='飞控 HTTP 接口端口')
+    parser.add_argument('--record', type=str, default='', metavar='DIR',
+                       help='把遥测写入飞行记录 (DIR/flight-时间.tlog)')
+    parser.add_argument('--replay', type=str, default='', metavar='TLOG',
+                       help='回放飞行记录代替遥控器连接')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速')
+    parser.add_argument('--replay-start', type=float, default=None, help='回放起点 (秒，相对记录开头)')
+    parser.add_argument('--replay-end', type=float, default=None, help='回放终点 (秒，相对记录开头)')
+    parser.add_argument('--loop', action='store_true', help='循环回放')
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                       help=f'Prometheus 指标端口 (默认: {METRICS_PORT}, 0 = 关闭)')
+    args = parser.parse_args()
+
+    record_path = None
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+        record_path = os.path.join(args.record, time.strftime('flight-%Y%m%d-%H%M%S.tlog'))
+    replay_options = None
+    if args.replay:
+        replay_options = {'path': args.replay, 'speed': args.speed, 'start': args.replay_start,
+                          'end': args.replay_end, 'loop': args.loop}
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.rc_host, args.rc_port, args.port, record_path, replay_options,
+                         args.control_host, args.control_port, args.metrics_port))
     except KeyboardInterrupt:
         logging.info("Server stopped by user")
\ No newline at end of file
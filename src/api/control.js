@@ -1,5 +1,6 @@
 // src/api/control.js
 import http from '@/utils/request'
+import { sendControl } from '@/api/info'
 
 export const takeoff = () => http.post('/send/takeoff')
 export const land = () => http.post('/send/land')
@@ -23,11 +24,39 @@ export const enableVirtualStick = () =>
 export const abortMission = () =>
   http.post('/send/abortMission')
 
+// 高频命令优先走遥测 WebSocket (桥接合并后经持久连接转发)，连接不可用时退回 HTTP
+// HTTP 退路每条 POST 都会单独转发给飞控，保持原来的 5Hz：间隔内的更新合并，到点只发最新值
+const HTTP_FALLBACK_INTERVAL = 200
+const fallbacks = {}  // 路径 -> { last, data, timer }
+
+const postText = (path, data) => http.post(path, data, {
+  headers: { 'Content-Type': 'text/plain' }         // 必须 text/plain
+})
+
+const postThrottled = (path, data) => {
+  const slot = fallbacks[path] || (fallbacks[path] = { last: 0, data: null, timer: null })
+  const wait = HTTP_FALLBACK_INTERVAL - (Date.now() - slot.last)
+  if (wait <= 0 && !slot.timer) {
+    slot.last = Date.now()
+    return postText(path, data)
+  }
+  // 最后一次更新 (如松开摇杆归零) 不会丢，延后到下一个发送时刻
+  slot.data = data
+  if (!slot.timer) {
+    slot.timer = setTimeout(() => {
+      slot.timer = null
+      slot.last = Date.now()
+      postText(path, slot.data).catch(err => console.warn(`${path} 发送失败:`, err))
+    }, Math.max(wait, 0))
+  }
+  return Promise.resolve({ coalesced: true })
+}
+
 export const stick = (leftX = 0, leftY = 0, rightX = 0, rightY = 0) => {
+  const ack = sendControl('stick', [leftX, leftY, rightX, rightY])
+  if (ack) return ack
   const data = `${leftX},${leftY},${rightX},${rightY}`   // ✅ CSV string
-  return http.post('/send/stick', data, {
-    headers: { 'Content-Type': 'text/plain' }         // 必须 text/plain
-  })
+  return postThrottled('/send/stick', data)
 }
 // camera
 export const startRecording = () =>
@@ -39,16 +68,16 @@ export const stopRecording = () =>
 
 // 万向节 Pitch 控制
 export const gimbalPitch = (roll = 0, pitch = 0, yaw = 0) => {
+  const ack = sendControl('gimbalPitch', [roll, pitch, yaw])
+  if (ack) return ack
   const data = `${roll},${pitch},${yaw}`   // CSV
-  return http.post('/send/gimbal/pitch', data, {
-    headers: { 'Content-Type': 'text/plain' }
-  })
+  return postThrottled('/send/gimbal/pitch', data)
 }
 
 // 万向节 Yaw 控制
 export const gimbalYaw = (roll = 0, pitch = 0, yaw = 0) => {
+  const ack = sendControl('gimbalYaw', [roll, pitch, yaw])
+  if (ack) return ack
   const data = `${roll},${pitch},${yaw}`   // CSV
-  return http.post('/send/gimbal/yaw', data, {
-    headers: { 'Content-Type': 'text/plain' }
-  })
+  return postThrottled('/send/gimbal/yaw', data)
 }
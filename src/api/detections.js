@@ -0,0 +1,51 @@
+// src/api/detections.js
+import { reactive } from 'vue'
+
+// yolo_ocr.py --overlay metadata 推送的每帧检测元数据
+export const overlay = reactive({
+  stream: '',
+  frame: 0,
+  timestamp: 0,
+  width: 0,
+  height: 0,
+  detections: [],
+  ocr: []
+})
+
+let socket = null
+const META_WS_BASE = 'ws://192.168.246.214:8766'
+// stream: 只保留这一路的元数据 (多路时各路的消息都经同一个 WebSocket 推送)；不传则接收所有路
+export function connectDetections(stream = null) {
+  if (socket) socket.close()
+
+  socket = new WebSocket(META_WS_BASE)
+
+  let buffer = ''
+
+  socket.onmessage = (e) => {
+    // 每帧一行 JSON，只保留最新一帧
+    buffer += e.data
+    let newlineIndex = buffer.indexOf('\n')
+    while (newlineIndex !== -1) {
+      const line = buffer.slice(0, newlineIndex).trim()
+      buffer = buffer.slice(newlineIndex + 1)
+      if (line) {
+        try {
+          const data = JSON.parse(line)
+          if (!stream || data.stream === stream) Object.assign(overlay, data)
+        } catch (err) {
+          console.warn('元数据解析错误:', line)
+        }
+      }
+      newlineIndex = buffer.indexOf('\n')
+    }
+  }
+
+  socket.onopen = () => console.log('✅ 检测元数据已连接')
+  socket.onerror = e => console.error('❌ 检测元数据连接报错', e)
+}
+
+export function disconnectDetections() {
+  if (socket) socket.close()
+  socket = null
+}
@@ -1,5 +1,6 @@
 // src/api/info.js
 import { reactive } from 'vue'
+import { decodeTelemetry } from '@/utils/telemetryCodec'
 
 export const telemetry = reactive({
   speed: {},
@@ -14,29 +15,42 @@ export const telemetry = reactive({
   remainingFlightTime: 0
 })
 
+// 控制通道：stick / gimbal 命令经遥测 WebSocket 发送，桥接按控制周期合并后转发给飞控
+export const controlStats = reactive({
+  rtt: 0,          // 最近一条命令从发送到确认的往返 (ms)
+  upstreamRtt: 0,  // 其中桥接到飞控的往返 (ms)
+  acked: 0,
+  coalesced: 0,
+  failed: 0
+})
+const pendingControl = new Map()  // id -> { sentAt, resolve, reject }
+let controlSeq = 0
+
 let socket = null
 const WS_BASE = 'ws://192.168.246.214:8765'
+// 界面只关心最新状态：桥接把遥测合并后最多 10 Hz 发送字段级增量，正好配合 Object.assign
+const WS_QUERY = '/?rate=10&mode=delta'
 export function connectTelemetry() {
   if (socket) socket.close()
     
-    // 指定 'binary' 子协议可以告诉 websockify 我们准备好处理二进制了
-    socket = new WebSocket(WS_BASE, ['binary'])
+    // 'binary' 子协议：桥接发送 telemetryCodec 紧凑二进制帧 (websockify 时代沿用下来的协议名)
+    socket = new WebSocket(WS_BASE + WS_QUERY, ['binary'])
+    socket.binaryType = 'arraybuffer'
     
     let buffer = '' 
     
-    socket.onmessage = async (e) => {
-    console.log('收到数据类型:', e.data.constructor.name)
-    // 1. 模拟 Python 的 .decode('utf-8')
-    // 这一步是核心：不管发来什么，都统一转成 String
-    let textData = ''
-    if (e.data instanceof Blob) {
-        textData = await e.data.text() // <--- 这就是 JS 版的 decode()
-    } else {
-        textData = e.data // 如果本来就是文本，直接用
+    socket.onmessage = (e) => {
+    // 二进制帧：一帧一条遥测
+    if (e.data instanceof ArrayBuffer) {
+      try {
+        Object.assign(telemetry, decodeTelemetry(e.data))
+      } catch (err) {
+        console.warn('遥测解码错误:', err)
+      }
+      return
     }
-    console.log('收到数据:', textData)
-    // 2. 下面是你原本的逻辑 (完全正确，不用改)
-    buffer += textData
+    // 文本帧：按行分隔的 JSON
+    buffer += e.data
     
     let newlineIndex = buffer.indexOf('\n')
     while (newlineIndex !== -1) {
@@ -45,7 +59,8 @@ export function connectTelemetry() {
       if (line) {
         try {
           const data = JSON.parse(line)
-          Object.assign(telemetry, data)
+          if ('ack' in data) handleAck(data)
+          else Object.assign(telemetry, data)
         } catch (err) {
           console.warn('JSON解析错误:', line)
         }
@@ -55,5 +70,50 @@ export function connectTelemetry() {
   }
 
   socket.onopen = () => console.log('✅ 遥测链路已连接')
+  socket.onclose = () => {
+    pendingControl.forEach(p => p.reject(new Error('遥测链路已断开')))
+    pendingControl.clear()
+  }
   socket.onerror = e => console.error('❌ 连接报错', e)
 }
+
+export function ensureTelemetry() {
+  if (!socket || socket.readyState === WebSocket.CLOSING || socket.readyState === WebSocket.CLOSED) {
+    connectTelemetry()
+  }
+}
+
+// 连接可用时经 WebSocket 发送控制命令，返回在桥接确认后完成的 Promise；
+// 连接不可用时返回 null (由调用方退回 HTTP)
+export function sendControl(type, values) {
+  if (!socket || socket.readyState !== WebSocket.OPEN) return null
+  const id = ++controlSeq
+  const ack = new Promise((resolve, reject) => {
+    pendingControl.set(id, { sentAt: performance.now(), resolve, reject })
+  })
+  socket.send(JSON.stringify({ type, id, v: values }))
+  return ack
+}
+
+function handleAck(data) {
+  const pending = pendingControl.get(data.ack)
+  pendingControl.delete(data.ack)
+  if (data.coalesced) {
+    // 被同一周期内更新的值取代，视为完成
+    controlStats.coalesced++
+    pending?.resolve(data)
+    return
+  }
+  if (!data.ok) {
+    controlStats.failed++
+    console.warn('控制命令失败:', data.error || data.status)
+    pending?.reject(new Error(data.error || `HTTP ${data.status}`))
+    return
+  }
+  controlStats.acked++
+  controlStats.upstreamRtt = data.rtt_ms
+  if (pending) {
+    controlStats.rtt = Math.round(performance.now() - pending.sentAt)
+    pending.resolve(data)
+  }
+}
@@ -0,0 +1,197 @@
+"""
+推理后端对比基准测试：同一组视频帧在各 YOLO / OCR 后端上的延迟，以及与参考后端结果的一致性
+
+    python bench_backends.py --video flight.mp4 --frames 200 --threads 4 --cpu \
+        --backends pt onnx onnx-int8 openvino openvino-int8 --output bench_backends.json
+    python bench_backends.py --video flight.mp4 --backends pt --ocr-backends paddle hpi --ocr-frames 20
+
+没有标注数据，准确率以列表中第一个后端 (默认 PyTorch .pt，即原有路径) 的结果为参考，
+衡量导出 / 量化带来的偏差：同类别 IoU >= 0.5 视为匹配，报告 precision / recall / 匹配框平均 IoU。
+OCR 以参考后端识别出的文字为准，报告其它后端识别出相同文字的比例。
+延迟只统计推理本身 (letterbox 由共享预处理阶段完成，各后端相同)。
+"""
+import argparse
+import json
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from yolo_ocr import (MODEL_CACHE_DIR, PreparedFrame, box_iou, create_paddle_ocr, load_yolo_model,
+                      parse_paddle_ocr, warmup_ocr)
+
+
+def read_frames(video, count, step=1):
+    """均匀读取视频中的若干帧"""
+    cap = cv2.VideoCapture(video)
+    frames = []
+    index = 0
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % step == 0:
+            frames.append(frame)
+        index += 1
+    cap.release()
+    return frames
+
+
+def _latency_ms(seconds):
+    ms = np.array(seconds) * 1000
+    return {
+        'mean': round(float(ms.mean()), 2),
+        'p50': round(float(np.percentile(ms, 50)), 2),
+        'p95': round(float(np.percentile(ms, 95)), 2)
+    }
+
+
+def _match(reference, detections, iou_threshold=0.5):
+    """同类别贪心匹配，返回匹配上的 IoU 列表"""
+    if len(reference) == 0 or len(detections) == 0:
+        return []
+    iou = box_iou(reference.xyxy, detections.xyxy)
+    iou[reference.cls[:, None] != detections.cls[None, :]] = 0
+    matched = []
+    for _ in range(min(iou.shape)):
+        row, col = np.unravel_index(iou.argmax(), iou.shape)
+        if iou[row, col] < iou_threshold:
+            break
+        matched.append(float(iou[row, col]))
+        iou[row, :] = 0
+        iou[:, col] = 0
+    return matched
+
+
+def _agreement(reference, results):
+    ious = []
+    ref_total = det_total = 0
+    for ref, det in zip(reference, results):
+        ious += _match(ref, det)
+        ref_total += len(ref)
+        det_total += len(det)
+    return {
+        'precision': round(len(ious) / det_total, 4) if det_total else 1.0,
+        'recall': round(len(ious) / ref_total, 4) if ref_total else 1.0,
+        'mean_iou': round(float(np.mean(ious)), 4) if ious else None
+    }
+
+
+def bench_yolo(args, frames):
+    prepared = [PreparedFrame(frame) for frame in frames]
+    reports = []
+    reference = None
+    for spec in args.backends:
+        export_format, _, quant = spec.partition('-')
+        start_time = time.time()
+        backend = load_yolo_model(args.yolo, None if export_format == 'pt' else export_format,
+                                  args.model_cache, args.imgsz, use_gpu=not args.cpu,
+                                  int8=quant == 'int8', int8_data=args.int8_data, threads=args.threads)
+        load_s = time.time() - start_time
+
+        inputs = [p.letterbox(args.imgsz, backend.rect)[0] for p in prepared]
+        for image in inputs[:args.warmup]:
+            backend.predict([image], conf=args.conf, imgsz=args.imgsz)
+
+        latencies = []
+        results = []
+        for p, image in zip(prepared, inputs):
+            start_time = time.perf_counter()
+            detections = backend.predict([image], conf=args.conf, imgsz=args.imgsz)[0]
+            latencies.append(time.perf_counter() - start_time)
+            results.append(p.map_detections(detections, args.imgsz, backend.rect))
+
+        report = {
+            'backend': spec,
+            'name': backend.name,
+            'load_s': round(load_s, 2),
+            'latency_ms': _latency_ms(latencies),
+            'fps': round(len(latencies) / sum(latencies), 2),
+            'detections_per_frame': round(sum(map(len, results)) / len(results), 2)
+        }
+        if reference is None:
+            reference = results
+        else:
+            report['agreement'] = _agreement(reference, results)
+        reports.append(report)
+        print(f"✅ {spec}: {report['latency_ms']['p50']}ms (p50)")
+    return reports
+
+
+def bench_ocr(args, frames):
+    images = [PreparedFrame(frame).level(args.ocr_max_side)[0] for frame in frames[:args.ocr_frames]]
+    reports = []
+    reference = None
+    for spec in args.ocr_backends:
+        start_time = time.time()
+        ocr = create_paddle_ocr(cpu_threads=args.threads, enable_hpi=spec == 'hpi')
+        load_s = time.time() - start_time
+        warmup_ocr(ocr, images[0].shape)
+
+        latencies = []
+        texts = []
+        for image in images:
+            start_time = time.perf_counter()
+            records = parse_paddle_ocr(ocr.ocr(image))
+            latencies.append(time.perf_counter() - start_time)
+            texts.append(Counter(text for text, _, _ in records))
+
+        report = {
+            'backend': spec,
+            'load_s': round(load_s, 2),
+            'latency_ms': _latency_ms(latencies),
+            'texts_per_frame': round(sum(sum(t.values()) for t in texts) / len(texts), 2)
+        }
+        if reference is None:
+            reference = texts
+        else:
+            total = sum(sum(t.values()) for t in reference)
+            same = sum(sum((ref & t).values()) for ref, t in zip(reference, texts))
+            report['text_recall'] = round(same / total, 4) if total else 1.0
+        reports.append(report)
+        print(f"✅ OCR {spec}: {report['latency_ms']['p50']}ms (p50)")
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='YOLO / OCR 推理后端对比')
+    parser.add_argument('--video', type=str, required=True, help='测试视频')
+    parser.add_argument('--frames', type=int, default=100, help='测试帧数')
+    parser.add_argument('--step', type=int, default=5, help='每隔多少帧取一帧')
+    parser.add_argument('--yolo', type=str, default='yolo11n.pt', help='YOLO 权重')
+    parser.add_argument('--backends', nargs='*', default=['pt', 'onnx', 'openvino'],
+                        help='YOLO 后端: pt / torchscript / onnx / onnx-int8 / openvino / openvino-int8 '
+                             '(第一个作为参考)')
+    parser.add_argument('--ocr-backends', nargs='*', default=[], help='OCR 后端: paddle / hpi (第一个作为参考)')
+    parser.add_argument('--ocr-frames', type=int, default=10, help='OCR 测试帧数')
+    parser.add_argument('--ocr-max-side', type=int, default=1920, help='整帧OCR输入的最大边长')
+    parser.add_argument('--imgsz', type=int, default=640, help='YOLO 输入尺寸')
+    parser.add_argument('--conf', type=float, default=0.25, help='置信度阈值')
+    parser.add_argument('--threads', type=int, default=0, help='CPU 推理线程数 (0 = 后端默认)')
+    parser.add_argument('--int8-data', type=str, default='coco8.yaml', help='OpenVINO int8 校准数据集')
+    parser.add_argument('--model-cache', type=str, default=MODEL_CACHE_DIR, help='导出模型缓存目录')
+    parser.add_argument('--warmup', type=int, default=3, help='每个后端的预热帧数')
+    parser.add_argument('--cpu', action='store_true', help='强制使用CPU')
+    parser.add_argument('--output', type=str, default='', help='JSON 结果输出文件 (默认只打印)')
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.frames, args.step)
+    if not frames:
+        parser.error(f"无法读取视频: {args.video}")
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'frame_size': list(frames[0].shape[:2][::-1]),
+        'yolo': bench_yolo(args, frames) if args.backends else [],
+        'ocr': bench_ocr(args, frames) if args.ocr_backends else []
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"📄 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+推流写入器丢帧策略检查：用固定速度读取的慢速桩代替 FFmpeg，按固定帧率提交帧，
+统计各策略下写入 / 丢弃的帧数以及 submit 阻塞的时间，并检查每种策略的行为是否符合预期
+
+    python bench_push.py --frames 60 --sink-ms 50 --interval-ms 10 --output bench_push.json
+
+oldest: 有丢帧、不阻塞，写出的是较新的帧
+newest: 有丢帧、不阻塞
+block:  不丢帧，渲染循环被拖慢到桩的速度
+不满足时以非零状态退出。
+"""
+import argparse
+import json
+import sys
+import time
+
+from yolo_ocr import FFmpegWriter
+
+# 慢速桩：每读完一帧睡眠 sink_ms，模拟跟不上的编码器 / RTSP 服务器
+SLOW_SINK = """
+import sys, time
+frame_bytes, delay = int(sys.argv[1]), float(sys.argv[2]) / 1000
+stdin = sys.stdin.buffer
+while True:
+    remaining = frame_bytes
+    while remaining:
+        chunk = stdin.read(remaining)
+        if not chunk:
+            sys.exit(0)
+        remaining -= len(chunk)
+    time.sleep(delay)
+"""
+
+
+def slow_sink_factory(sink_ms):
+    def command(url, width, height, fps, pix_fmt):
+        frame_bytes = width * height * 3 if pix_fmt == 'bgr24' else width * height * 3 // 2
+        return [sys.executable, '-c', SLOW_SINK, str(frame_bytes), str(sink_ms)]
+    return command
+
+
+def run_policy(args, policy):
+    writer = FFmpegWriter('null', args.width, args.height, fps=25, queue_size=args.queue,
+                          drop_policy=policy, command_factory=slow_sink_factory(args.sink_ms))
+    writer.start()
+    acquire_misses = 0
+    start_time = time.time()
+    for i in range(args.frames):
+        buffer = writer.acquire()
+        if buffer is None:
+            acquire_misses += 1
+        else:
+            buffer[:] = i % 256
+            writer.submit(buffer, time.time())
+        time.sleep(args.interval_ms / 1000)
+    loop_s = time.time() - start_time
+
+    # 等待队列写完再统计
+    deadline = time.time() + args.frames * args.sink_ms / 1000 + 5.0
+    while writer.queue_depth and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(args.sink_ms / 1000 * 2)
+    writer.close()
+    return {
+        'policy': policy,
+        'written': writer.written,
+        'dropped': writer.dropped,
+        'acquire_misses': acquire_misses,
+        'blocked_s': round(writer.blocked_seconds, 3),
+        'loop_s': round(loop_s, 3)
+    }
+
+
+def check(report, args):
+    """每种策略的预期行为，返回不满足的条件列表"""
+    failures = []
+    ideal_s = args.frames * args.interval_ms / 1000
+    for result in report:
+        policy = result['policy']
+        if policy == 'block':
+            if result['dropped'] or result['written'] != args.frames:
+                failures.append(f"block: 应当不丢帧 (written={result['written']}, dropped={result['dropped']})")
+            if result['blocked_s'] < ideal_s * 0.5:
+                failures.append(f"block: submit 没有等待 (blocked_s={result['blocked_s']})")
+        else:
+            if result['dropped'] == 0:
+                failures.append(f"{policy}: 编码器跟不上时应当丢帧")
+            if result['loop_s'] > ideal_s * 1.5 + 0.5 or result['blocked_s'] > 0.1:
+                failures.append(f"{policy}: 不应阻塞渲染循环 (loop_s={result['loop_s']})")
+            if result['written'] + result['dropped'] != args.frames:
+                failures.append(f"{policy}: 写入 + 丢弃 != 提交帧数 ({result['written']} + {result['dropped']})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='推流写入器丢帧策略检查')
+    parser.add_argument('--frames', type=int, default=60, help='提交帧数')
+    parser.add_argument('--interval-ms', type=float, default=10.0, help='提交间隔 (毫秒)')
+    parser.add_argument('--sink-ms', type=float, default=50.0, help='慢速桩每帧耗时 (毫秒)')
+    parser.add_argument('--queue', type=int, default=2, help='推流写入队列长度')
+    parser.add_argument('--width', type=int, default=320)
+    parser.add_argument('--height', type=int, default=240)
+    parser.add_argument('--policies', nargs='*', default=['oldest', 'newest', 'block'])
+    parser.add_argument('--output', type=str, default='', help='JSON 结果输出文件 (默认只打印)')
+    args = parser.parse_args()
+
+    report = [run_policy(args, policy) for policy in args.policies]
+    failures = check(report, args)
+    text = json.dumps({'config': vars(args), 'results': report, 'failures': failures},
+                      ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ 所有丢帧策略符合预期")
+
+
+if __name__ == "__main__":
+    main()
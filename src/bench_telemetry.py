@@ -0,0 +1,75 @@
+"""
+遥测编码基准测试：对比原来的文本转发路径与二进制编码路径的每条消息字节数和 CPU 耗时
+
+    python bench_telemetry.py --messages 20000 --output bench_telemetry.json
+
+ingest: 上游一行遥测的解析 (json.loads / orjson.loads)
+encode: 发给客户端前的编码 (文本路径直接转发原始行，二进制路径为 telemetry_codec.encode)
+"""
+import argparse
+import json
+import time
+
+import telemetry_codec
+from fake_rc import fake_telemetry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _per_message_us(func, items, repeat):
+    """多轮取最快一轮，返回每条消息耗时 (微秒)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.process_time()
+        for item in items:
+            func(item)
+        best = min(best, time.process_time() - start)
+    return round(best / len(items) * 1e6, 3)
+
+
+def run_benchmark(args):
+    messages = [fake_telemetry(i * 0.02) for i in range(args.messages)]
+    lines = [json.dumps(m, separators=(',', ':')).encode('utf-8') + b'\n' for m in messages]
+    packed = [telemetry_codec.encode(m) for m in messages]
+
+    report = {
+        'config': vars(args),
+        'orjson': orjson is not None,
+        'bytes_per_message': {
+            'json': round(sum(map(len, lines)) / len(lines), 1),
+            'binary': round(sum(map(len, packed)) / len(packed), 1)
+        },
+        'cpu_us_per_message': {
+            # 原路径：json.loads 校验，再把原始行解码为 str 发送
+            'json_ingest': _per_message_us(json.loads, lines, args.repeat),
+            'text_forward': _per_message_us(lambda line: line.decode('utf-8'), lines, args.repeat),
+            'binary_encode': _per_message_us(telemetry_codec.encode, messages, args.repeat),
+            'binary_decode': _per_message_us(telemetry_codec.decode, packed, args.repeat)
+        }
+    }
+    if orjson is not None:
+        report['cpu_us_per_message']['orjson_ingest'] = _per_message_us(orjson.loads, lines, args.repeat)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='遥测编码基准测试')
+    parser.add_argument('--messages', type=int, default=20000, help='测试消息条数')
+    parser.add_argument('--repeat', type=int, default=5, help='重复轮数 (取最快一轮)')
+    parser.add_argument('--output', type=str, default='', help='JSON 结果输出文件 (默认只打印)')
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"📄 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
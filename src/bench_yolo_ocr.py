@@ -0,0 +1,281 @@
+"""
+检测流水线离线回放基准测试
+对视频文件无界面运行 HighPerformanceDetectorPaddle，输出机器可读的 JSON，方便对比不同提交的性能。
+
+示例 (无模型权重、纯 CPU 也能跑):
+    python bench_yolo_ocr.py --video flight.mp4 --stub-yolo-ms 30 --stub-ocr-ms 200 --duration 30 --output bench.json
+使用真实模型:
+    python bench_yolo_ocr.py --video flight.mp4 --yolo yolo11n.pt --duration 60
+"""
+import argparse
+import functools
+import json
+import resource
+import subprocess
+import time
+from threading import Thread
+
+import cv2
+import numpy as np
+
+import yolo_ocr
+from yolo_ocr import (HighPerformanceDetectorPaddle, BoxTracker, RegionOcrCache, LoadScheduler, SceneChangeGate,
+                      TiledInference, ClipRecorder, EventRules)
+
+
+class _HostArray:
+    """模拟 torch.Tensor 的 .cpu().numpy()"""
+    def __init__(self, array):
+        self._array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._array
+
+
+class _StubBoxes:
+    def __init__(self, data):
+        self.data = _HostArray(data)
+
+
+class _StubResult:
+    def __init__(self, data, names):
+        self.boxes = _StubBoxes(data)
+        self.names = names
+
+
+class StubYolo:
+    """固定延迟的 YOLO 桩模型：输出若干个随帧号匀速移动的框"""
+    names = {0: 'person', 1: 'car', 2: 'sign'}
+
+    def __init__(self, latency_ms=30.0, num_boxes=8):
+        self.latency = latency_ms / 1000
+        self.num_boxes = num_boxes
+        self._calls = 0
+
+    def _fake_boxes(self, frame):
+        h, w = frame.shape[:2]
+        i = np.arange(self.num_boxes, dtype=np.float32)
+        x1 = (i * 97 + self._calls * 4) % max(w - 80, 1)
+        y1 = (i * 53) % max(h - 60, 1)
+        data = np.stack([x1, y1, x1 + 80, y1 + 60,
+                         np.full_like(i, 0.9), i % len(self.names)], axis=1)
+        return data
+
+    def __call__(self, source, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        time.sleep(self.latency)
+        self._calls += 1
+        return [_StubResult(self._fake_boxes(frame), self.names) for frame in frames]
+
+
+class StubOcr:
+    """固定延迟的 OCR 桩模型：返回 PaddleOCR 格式的结果 (可被 pickle，进程池模式也能用)"""
+    def __init__(self, latency_ms=200.0, num_texts=5):
+        self.latency = latency_ms / 1000
+        self.num_texts = num_texts
+
+    def ocr(self, frame):
+        time.sleep(self.latency)
+        h, w = frame.shape[:2]
+        polys = []
+        for i in range(self.num_texts):
+            x, y = (i * 131) % max(w - 60, 1), (i * 71) % max(h - 20, 1)
+            polys.append([[x, y], [x + 60, y], [x + 60, y + 20], [x, y + 20]])
+        return [{
+            'rec_texts': [f"TEXT{i}" for i in range(self.num_texts)],
+            'rec_scores': [0.9] * self.num_texts,
+            'rec_polys': polys
+        }]
+
+
+class PacedCapture:
+    """按视频原始帧率读取，模拟实时视频源"""
+    def __init__(self, cap, fps):
+        self.cap = cap
+        self.interval = 1.0 / fps if fps > 0 else 0
+        self._next = None
+
+    def read(self):
+        now = time.time()
+        if self._next is not None and now < self._next:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next or now) + self.interval
+        return self.cap.read()
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _peak_rss_mb():
+    """本进程及已回收子进程 (OCR进程池/ffmpeg) 的峰值常驻内存 (Linux 下单位为 KB)"""
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(self_kb / 1024, 1), round(children_kb / 1024, 1)
+
+
+def run_benchmark(args):
+    if args.stub_yolo_ms is not None:
+        yolo_model = StubYolo(args.stub_yolo_ms)
+    else:
+        yolo_model = args.yolo
+    if args.stub_ocr_ms is not None:
+        ocr_factory = functools.partial(StubOcr, args.stub_ocr_ms)
+    else:
+        ocr_factory = functools.partial(yolo_ocr.create_paddle_ocr, cpu_threads=args.threads,
+                                        enable_hpi=args.ocr_backend == 'hpi')
+
+    detector = HighPerformanceDetectorPaddle(
+        stream_source=args.video,
+        yolo_model=yolo_model,
+        use_gpu=not args.cpu,
+        rtsp_url='null' if args.encode else None,
+        ocr_processes=args.ocr_procs,
+        region_ocr=RegionOcrCache() if args.ocr_mode == 'region' else None,
+        tracker=BoxTracker() if args.track else None,
+        yolo_stride=args.yolo_stride,
+        push_options={'yuv420': args.push_yuv, 'ladder': args.push_ladder},
+        ocr_factory=ocr_factory,
+        scheduler=LoadScheduler(target_fps=args.target_fps) if args.adaptive else None,
+        auto_ocr=not args.no_ocr,
+        ocr_max_side=args.ocr_max_side,
+        scene_gate=SceneChangeGate(args.gate_yolo_threshold, args.gate_ocr_threshold) if args.scene_gate else None,
+        yolo_format=args.yolo_format,
+        yolo_options={'int8': args.int8, 'threads': args.threads},
+        tiler=TiledInference(args.tile_size, adaptive=args.tile_adaptive) if args.tile else None,
+        recorder=ClipRecorder(EventRules(args.record_on), output_dir=args.record_dir) if args.record_on else None
+    )
+    if args.realtime:
+        fps = detector.cap.get(cv2.CAP_PROP_FPS) or 25
+        detector.cap = PacedCapture(detector.cap, fps)
+
+    thread = Thread(target=detector.run, daemon=True, name="Benchmark")
+    start_time = time.time()
+    thread.start()
+    thread.join(timeout=args.duration)
+    detector.running = False
+    thread.join(timeout=10.0)
+    duration = time.time() - start_time
+
+    writer = detector.writer
+    self_rss, children_rss = _peak_rss_mb()
+    report = {
+        'commit': _git_commit(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'duration_s': round(duration, 3),
+        'ttfaf_s': round(detector.ttfaf, 3) if detector.ttfaf is not None else None,
+        'startup_s': {stage: round(seconds, 3) for stage, seconds in detector.startup_times.items()},
+        'frames': {
+            'captured': detector.capture_count,
+            'displayed': detector.frame_count,
+            'yolo': detector.yolo_count,
+            'ocr': detector.ocr_count
+        },
+        'fps': {
+            'capture': round(detector.capture_count / duration, 2),
+            'display': round(detector.frame_count / duration, 2),
+            'yolo': round(detector.yolo_count / duration, 2),
+            'ocr': round(detector.ocr_count / duration, 2)
+        },
+        'dropped': dict(detector.dropped),
+        'stages': detector.stats.summary(),
+        'peak_rss_mb': {'self': self_rss, 'children': children_rss},
+        'encoder': None,
+        'scheduler': None,
+        'scene_gate': None,
+        'tiles_per_frame': None,
+        'recorder': None
+    }
+    if writer is not None:
+        report['dropped']['encode'] += writer.dropped
+        report['encoder'] = {
+            'written': writer.written,
+            'dropped': writer.dropped,
+            'restarts': writer.restarts,
+            'fps': round(writer.written / duration, 2),
+            'encoder_fps': writer.fps,
+            'mb_per_s': round(writer.bytes_written / duration / 1e6, 2),
+            'renditions': {r.name: {'written': r.written, 'dropped': r.dropped, 'restarts': r.restarts}
+                           for r in writer.renditions}
+        }
+    if detector.scheduler is not None:
+        report['scheduler'] = {
+            'yolo_imgsz': detector.yolo_imgsz,
+            'yolo_stride': detector.yolo_stride,
+            'decision': detector.scheduler.decision
+        }
+    if detector.tiler is not None and detector.tiler.frames:
+        report['tiles_per_frame'] = round(detector.tiler.tiles_total / detector.tiler.frames, 2)
+    if detector.recorder is not None:
+        recorder = detector.recorder
+        report['recorder'] = {
+            'mode': recorder.mode,
+            'events': recorder.events,
+            'clips': recorder.clips,
+            'dropped': recorder.dropped,
+            'buffer_mb': round(recorder.buffer_bytes / 1024 / 1024, 2)
+        }
+    if detector.scene_gate is not None:
+        report['scene_gate'] = {
+            'counts': detector.scene_gate.counts,
+            'hit_rates': detector.scene_gate.hit_rates()
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='YOLO + PaddleOCR 流水线离线回放基准测试')
+    parser.add_argument('--video', type=str, required=True, help='回放的视频文件')
+    parser.add_argument('--duration', type=float, default=30.0, help='最长运行时间 (秒)')
+    parser.add_argument('--realtime', action='store_true', help='按视频原始帧率读取 (默认尽可能快地解码；此时 capture 耗时包含节流等待)')
+    parser.add_argument('--yolo', type=str, default='yolo11n.pt', help='YOLO模型')
+    parser.add_argument('--stub-yolo-ms', type=float, default=None, help='使用固定延迟的YOLO桩模型 (毫秒)')
+    parser.add_argument('--stub-ocr-ms', type=float, default=None, help='使用固定延迟的OCR桩模型 (毫秒)')
+    parser.add_argument('--no-ocr', action='store_true', help='关闭自动OCR')
+    parser.add_argument('--ocr-max-side', type=int, default=1920, help='整帧OCR输入的最大边长 (0 = 原图)')
+    parser.add_argument('--ocr-procs', type=int, default=0, help='OCR进程池大小')
+    parser.add_argument('--ocr-mode', choices=['frame', 'region'], default='frame', help='OCR模式')
+    parser.add_argument('--track', action='store_true', help='启用目标跟踪')
+    parser.add_argument('--yolo-stride', type=int, default=1, help='每N帧运行一次YOLO')
+    parser.add_argument('--adaptive', action='store_true', help='启用自适应负载调度')
+    parser.add_argument('--target-fps', type=float, default=20.0, help='自适应调度的目标输出帧率')
+    parser.add_argument('--tile', action='store_true', help='启用切块推理')
+    parser.add_argument('--tile-size', type=int, default=640, help='切块边长 (原图像素)')
+    parser.add_argument('--tile-adaptive', action='store_true', help='只切有检测结果或运动的区域')
+    parser.add_argument('--scene-gate', action='store_true', help='启用场景变化门控')
+    parser.add_argument('--gate-yolo-threshold', type=float, default=0.5, help='YOLO 门控阈值 (变化像素百分比)')
+    parser.add_argument('--gate-ocr-threshold', type=float, default=2.0, help='整帧OCR 门控阈值 (变化像素百分比)')
+    parser.add_argument('--record-on', type=str, nargs='*', default=[], help='事件录像触发规则, 例如 class:person')
+    parser.add_argument('--record-dir', type=str, default='recordings', help='事件录像保存目录')
+    parser.add_argument('--encode', action='store_true', help='经 ffmpeg 编码 (输出到 null) 以测量编码吞吐')
+    parser.add_argument('--push-yuv', action='store_true', help='在进程内预转换为 yuv420p')
+    parser.add_argument('--push-ladder', type=int, nargs='*', default=[], help='额外编码的低分辨率高度, 例如 720 360')
+    parser.add_argument('--cpu', action='store_true', help='强制使用CPU')
+    parser.add_argument('--yolo-format', type=str, default=None, help='YOLO导出格式 (onnx / openvino ...)')
+    parser.add_argument('--int8', action='store_true', help='int8 量化 (onnx / openvino)')
+    parser.add_argument('--threads', type=int, default=0, help='CPU 推理线程数 (0 = 后端默认)')
+    parser.add_argument('--ocr-backend', choices=['paddle', 'hpi'], default='paddle', help='PaddleOCR 推理后端')
+    parser.add_argument('--output', type=str, default='', help='JSON 结果输出文件 (默认只打印)')
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"📄 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
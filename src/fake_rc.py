@@ -0,0 +1,269 @@
+"""
+本地遥控器遥测模拟 (代替 10.87.49.48:8081)，用于不连飞机时压测 WebSocketServer.py
+
+只启动模拟遥控器，供桥接连接:
+    python fake_rc.py --rate 50
+    python WebSocketServer.py --rc-host 127.0.0.1 --rc-port 8081
+同时启动多个 WebSocket 客户端压测桥接，结束后输出 JSON 统计:
+    python fake_rc.py --rate 500 --clients 50 --duration 20 --bridge ws://127.0.0.1:8765
+用录制的真实飞行记录 (WebSocketServer.py --record) 代替合成数据，4 倍速循环:
+    python fake_rc.py --replay records/flight-20250101-120000.tlog --speed 4 --clients 50
+压测控制通道 (每个客户端 50 Hz 摇杆命令，模拟飞控接口 5 ms 处理延迟):
+    python WebSocketServer.py --rc-host 127.0.0.1 --control-host 127.0.0.1 --control-port 8090
+    python fake_rc.py --clients 5 --control-port 8090 --control-rate 50 --control-delay-ms 5
+压测合并/限速模式 (每客户端最多 10 Hz 增量):
+    python fake_rc.py --rate 500 --clients 50 --bridge "ws://127.0.0.1:8765/?rate=10"
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+
+import websockets
+
+import telemetry_codec
+from telemetry_recorder import TelemetryLog, replay
+
+
+def fake_telemetry(t):
+    """生成一条和遥控器格式一致的遥测 (绕圈飞行)"""
+    return {
+        'speed': {'x': round(5 * math.cos(t / 10), 3), 'y': round(5 * math.sin(t / 10), 3), 'z': 0.0},
+        'heading': round((t * 36) % 360, 2),
+        'attitude': {'pitch': round(2 * math.sin(t), 3), 'roll': round(2 * math.cos(t), 3),
+                     'yaw': round((t * 36) % 360 - 180, 2)},
+        'location': {'lat': round(22.5 + 0.0005 * math.sin(t / 10), 7),
+                     'lon': round(113.9 + 0.0005 * math.cos(t / 10), 7),
+                     'alt': 50.0},
+        'gimbalAttitude': {'pitch': -30.0, 'roll': 0.0, 'yaw': 0.0},
+        'batteryLevel': max(0, 100 - int(t / 30)),
+        'satelliteCount': 18,
+        'flightMode': 'GPS',
+        'distanceToHome': round(50 + 10 * math.sin(t / 10), 2),
+        'remainingFlightTime': max(0, 1800 - int(t)),
+        'ts': time.time()  # 发送时间，压测客户端用来计算延迟
+    }
+
+
+async def serve_rc(host, port, rate, burst=1, log=None, speed=1.0):
+    """
+    每个连接按 rate 条/秒 发送 NDJSON 遥测，burst > 1 时一次写入多条以模拟突发
+    给出 log (TelemetryLog) 时改为按 speed 倍速循环回放飞行记录
+    """
+    start = time.time()
+
+    def encode_recorded(message):
+        message = dict(message, ts=time.time())  # 用发送时间替换，方便压测客户端计算延迟
+        return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+    async def handle(reader, writer):
+        print(f"🔗 桥接已连接: {writer.get_extra_info('peername')}")
+        interval = burst / rate
+        next_time = time.time()
+        try:
+            if log is not None:
+                await replay(log, lambda message: writer.write(encode_recorded(message)), speed,
+                             loop_forever=True)
+                return
+            while True:
+                chunk = b''.join(
+                    json.dumps(fake_telemetry(time.time() - start), separators=(',', ':')).encode() + b'\n'
+                    for _ in range(burst))
+                writer.write(chunk)
+                await writer.drain()
+                next_time += interval
+                await asyncio.sleep(max(0.0, next_time - time.time()))
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass  # 桥接断开或压测结束
+        finally:
+            writer.close()
+            print("🔌 桥接已断开")
+
+    server = await asyncio.start_server(handle, host, port)
+    source = f"回放 {log.path} {speed}x" if log is not None else f"{rate} 条/秒"
+    print(f"✅ 模拟遥控器已启动: {host}:{port} ({source})")
+    return server
+
+
+async def serve_control(host, port, delay_ms=0.0):
+    """模拟飞控 HTTP 接口 (/send/...)，支持 keep-alive，统计连接数和请求数"""
+    counters = {'connections': 0, 'requests': 0}
+
+    async def handle(reader, writer):
+        counters['connections'] += 1
+        try:
+            while True:
+                await reader.readuntil(b'\r\n')  # 请求行
+                length = 0
+                while True:
+                    header = await reader.readuntil(b'\r\n')
+                    if header == b'\r\n':
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                await reader.readexactly(length)
+                if delay_ms:
+                    await asyncio.sleep(delay_ms / 1000)
+                counters['requests'] += 1
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n\r\nOK')
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"✅ 模拟飞控接口已启动: http://{host}:{port}")
+    return server, counters
+
+
+async def load_client(url, duration, encoding='json', control_rate=0.0):
+    """
+    一个压测客户端：统计收到的消息数、字节数和端到端延迟
+    control_rate > 0 时同时按该频率发送摇杆命令，统计确认往返延迟
+    """
+    result = {'received': 0, 'bytes': 0, 'latencies': [], 'control_sent': 0,
+              'control_rtts': [], 'control_coalesced': 0, 'control_failed': 0}
+    sent_at = {}
+    deadline = time.time() + duration
+
+    async def send_sticks(websocket):
+        command_id = 0
+        while True:
+            command_id += 1
+            value = round(math.sin(command_id / 10), 3)
+            sent_at[command_id] = time.time()
+            await websocket.send(json.dumps({'type': 'stick', 'id': command_id, 'v': [value, 0, 0, value]}))
+            result['control_sent'] += 1
+            await asyncio.sleep(1 / control_rate)
+
+    def on_ack(data):
+        started = sent_at.pop(data['ack'], None)
+        if data.get('coalesced'):
+            result['control_coalesced'] += 1
+        elif not data.get('ok'):
+            result['control_failed'] += 1
+        elif started is not None:
+            result['control_rtts'].append(time.time() - started)
+
+    sender = None
+    try:
+        async with websockets.connect(url, subprotocols=[encoding]) as websocket:
+            if control_rate > 0:
+                sender = asyncio.create_task(send_sticks(websocket))
+            while time.time() < deadline:
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=deadline - time.time())
+                except asyncio.TimeoutError:
+                    break
+                result['bytes'] += len(message)
+                if isinstance(message, bytes):
+                    messages = [telemetry_codec.decode(message)]
+                else:
+                    messages = [json.loads(line) for line in message.splitlines()]
+                for data in messages:
+                    if 'ack' in data:
+                        on_ack(data)
+                        continue
+                    result['received'] += 1
+                    if 'ts' in data:
+                        result['latencies'].append(time.time() - data['ts'])
+    except (OSError, websockets.ConnectionClosed) as e:
+        print(f"❌ 客户端错误: {e}")
+    finally:
+        if sender is not None:
+            sender.cancel()
+    return result
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None}
+    return {f'p{p}': round(values[min(len(values) - 1, int(len(values) * p / 100))] * 1000, 2)
+            for p in (50, 90, 99)}
+
+
+async def run_load_test(args):
+    server = await serve_rc(args.host, args.port, args.rate, args.burst, open_log(args), args.speed)
+    control_server, control_counters = None, None
+    if args.control_port:
+        control_server, control_counters = await serve_control(args.host, args.control_port,
+                                                               args.control_delay_ms)
+    print(f"⏳ 等待桥接连接，{args.clients} 个客户端将连接 {args.bridge}")
+    await asyncio.sleep(args.warmup)
+
+    results = await asyncio.gather(*(load_client(args.bridge, args.duration, args.encoding, args.control_rate)
+                                     for _ in range(args.clients)))
+    server.close()
+    if control_server is not None:
+        control_server.close()
+
+    counts = [r['received'] for r in results]
+    total_bytes = sum(r['bytes'] for r in results)
+    report = {
+        'config': vars(args),
+        'clients': len(results),
+        'messages_per_client_per_s': {
+            'min': round(min(counts) / args.duration, 2) if counts else 0,
+            'mean': round(sum(counts) / len(counts) / args.duration, 2) if counts else 0,
+            'max': round(max(counts) / args.duration, 2) if counts else 0
+        },
+        'bytes_per_message': round(total_bytes / sum(counts), 1) if sum(counts) else None,
+        'latency_ms': _percentiles([l for r in results for l in r['latencies']])
+    }
+    if args.control_rate > 0:
+        report['control'] = {
+            'sent': sum(r['control_sent'] for r in results),
+            'acked': sum(len(r['control_rtts']) for r in results),
+            'coalesced': sum(r['control_coalesced'] for r in results),
+            'failed': sum(r['control_failed'] for r in results),
+            'upstream_requests': control_counters['requests'] if control_counters else None,
+            'upstream_connections': control_counters['connections'] if control_counters else None,
+            'rtt_ms': _percentiles([t for r in results for t in r['control_rtts']])
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def open_log(args):
+    return TelemetryLog(args.replay) if args.replay else None
+
+
+async def run_server_only(args):
+    server = await serve_rc(args.host, args.port, args.rate, args.burst, open_log(args), args.speed)
+    if args.control_port:
+        await serve_control(args.host, args.control_port, args.control_delay_ms)
+    await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟遥控器遥测 / 桥接压测')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8081, help='监听端口')
+    parser.add_argument('--rate', type=float, default=10.0, help='每个连接每秒发送的遥测条数')
+    parser.add_argument('--burst', type=int, default=1, help='每次写入的条数 (模拟突发)')
+    parser.add_argument('--replay', type=str, default='', metavar='TLOG', help='循环回放飞行记录代替合成数据')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速')
+    parser.add_argument('--clients', type=int, default=0, help='压测的 WebSocket 客户端数 (0 = 只启动模拟遥控器)')
+    parser.add_argument('--bridge', type=str, default='ws://127.0.0.1:8765', help='桥接地址')
+    parser.add_argument('--encoding', choices=['json', 'binary'], default='json',
+                        help='压测客户端协商的子协议 (binary = telemetry_codec 二进制编码)')
+    parser.add_argument('--control-port', type=int, default=0,
+                        help='同时模拟飞控 HTTP 接口 (WebSocketServer.py --control-host/--control-port 指向这里)')
+    parser.add_argument('--control-delay-ms', type=float, default=0.0, help='模拟飞控接口的处理延迟')
+    parser.add_argument('--control-rate', type=float, default=0.0,
+                        help='每个压测客户端发送摇杆命令的频率 (Hz)，0 = 不发送')
+    parser.add_argument('--duration', type=float, default=10.0, help='压测时长 (秒)')
+    parser.add_argument('--warmup', type=float, default=2.0, help='开始压测前等待桥接连接的时间 (秒)')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_load_test(args) if args.clients > 0 else run_server_only(args))
+    except KeyboardInterrupt:
+        print("⏹️ 已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+本地指标接口 (Prometheus 文本格式，无第三方依赖)
+yolo_ocr.py 和 WebSocketServer.py 共用：
+    server = MetricsServer(collect, port=9100)
+    server.start()
+collect() 返回指标文本行列表，每次抓取 /metrics 时调用。
+"""
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock
+
+# 默认延迟分桶 (秒)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """累积分桶直方图 (线程安全)"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        """返回 (各桶累积计数, 总和, 总数)"""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class RateMeter:
+    """按秒分片计数，估算最近一段时间内的每秒速率"""
+    def __init__(self, window=5):
+        self.window = window
+        self._slots = deque()  # [(秒, 计数)]
+        self._lock = Lock()
+
+    def mark(self, n=1):
+        second = int(time.time())
+        with self._lock:
+            if self._slots and self._slots[-1][0] == second:
+                self._slots[-1][1] += n
+            else:
+                self._slots.append([second, n])
+            while self._slots and self._slots[0][0] <= second - self.window:
+                self._slots.popleft()
+
+    def rate(self):
+        now = int(time.time())
+        with self._lock:
+            # 只统计已经结束的完整秒
+            total = sum(n for second, n in self._slots if now - self.window <= second < now)
+        return total / self.window
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def metric_lines(name, help_text, metric_type, samples):
+    """
+    普通指标 (gauge / counter)
+    :param samples: [(标签字典, 数值), ...]
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    return lines
+
+
+def histogram_lines(name, help_text, histograms):
+    """
+    直方图指标
+    :param histograms: [(标签字典, Histogram), ...]
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in histograms:
+        cumulative, total, count = histogram.snapshot()
+        for bound, value in zip(histogram.buckets + ('+Inf',), cumulative):
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {value}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return lines
+
+
+class MetricsServer:
+    """在后台线程中提供 http://host:port/metrics"""
+    def __init__(self, collect, host="127.0.0.1", port=9100):
+        self.collect = collect
+        self.host = host
+        self.port = port
+        self._httpd = None
+
+    def start(self):
+        collect = self.collect
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = ('\n'.join(collect()) + '\n').encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不打印每次抓取
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._httpd.daemon_threads = True
+        Thread(target=self._httpd.serve_forever, daemon=True, name="Metrics").start()
+        print(f"📈 指标接口已启动: http://{self.host}:{self.port}/metrics")
+
+    def close(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
@@ -0,0 +1,134 @@
+"""
+遥测紧凑二进制编码 (WebSocket 子协议 'binary')，与 src/utils/telemetryCodec.js 对应
+
+一条消息 = 一个二进制帧 (小端):
+    uint8   版本号 (1)
+    uint32  字段位图：SCHEMA 中第 i 个字段存在则第 i 位为 1
+    ...     按 SCHEMA 顺序排列的已存在字段的数值 (经纬度 float64，其余 float32)
+    ...     其余字段 (字符串、未知字段、心跳等) 的 UTF-8 JSON，没有则为空
+
+已知数值字段省去了重复的键名和十进制文本；未知字段原样走 JSON，所以遥控器新增字段不会丢。
+"""
+import json
+import struct
+
+try:
+    import orjson  # 可选：更快的 JSON 解析/序列化
+except ImportError:
+    orjson = None
+
+VERSION = 1
+
+# (顶层字段, 子字段 或 None, struct 格式)
+SCHEMA = (
+    ('heading', None, 'f'),
+    ('batteryLevel', None, 'f'),
+    ('satelliteCount', None, 'f'),
+    ('distanceToHome', None, 'f'),
+    ('remainingFlightTime', None, 'f'),
+    ('attitude', 'pitch', 'f'),
+    ('attitude', 'roll', 'f'),
+    ('attitude', 'yaw', 'f'),
+    ('gimbalAttitude', 'pitch', 'f'),
+    ('gimbalAttitude', 'roll', 'f'),
+    ('gimbalAttitude', 'yaw', 'f'),
+    ('location', 'lat', 'd'),
+    ('location', 'lon', 'd'),
+    ('location', 'alt', 'f'),
+    ('speed', 'x', 'f'),
+    ('speed', 'y', 'f'),
+    ('speed', 'z', 'f'),
+)
+_HEADER = struct.Struct('<BI')
+_NESTED = {key for key, sub, _ in SCHEMA if sub is not None}
+_INDEX = {(key, sub): i for i, (key, sub, _) in enumerate(SCHEMA)}
+_FORMATS = [fmt for _, _, fmt in SCHEMA]
+_STRUCTS = {}  # 位图 -> 预编译的 Struct
+
+
+def loads(data):
+    """解析 JSON (str 或 bytes)，有 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """紧凑 JSON 文本"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _struct_for(mask):
+    packer = _STRUCTS.get(mask)
+    if packer is None:
+        fmt = '<' + ''.join(f for i, f in enumerate(_FORMATS) if mask >> i & 1)
+        packer = _STRUCTS[mask] = struct.Struct(fmt)
+    return packer
+
+
+def encode(message):
+    """dict -> bytes"""
+    slots = [None] * len(SCHEMA)
+    rest = {}
+    for key, value in message.items():
+        if key in _NESTED and isinstance(value, dict):
+            extra = {}
+            for sub, sub_value in value.items():
+                i = _INDEX.get((key, sub))
+                if i is not None and _is_number(sub_value):
+                    slots[i] = sub_value
+                else:
+                    extra[sub] = sub_value
+            if extra or not value:
+                rest[key] = extra
+        else:
+            i = _INDEX.get((key, None))
+            if i is not None and _is_number(value):
+                slots[i] = value
+            else:
+                rest[key] = value
+
+    mask = 0
+    values = []
+    for i, value in enumerate(slots):
+        if value is not None:
+            mask |= 1 << i
+            values.append(value)
+    body = _struct_for(mask).pack(*values)
+    tail = dumps(rest).encode('utf-8') if rest else b''
+    return _HEADER.pack(VERSION, mask) + body + tail
+
+
+def decode(data):
+    """bytes -> dict (压测客户端和回放校验用)"""
+    version, mask = _HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"未知的遥测编码版本: {version}")
+    packer = _struct_for(mask)
+    values = iter(packer.unpack_from(data, _HEADER.size))
+    message = {}
+    for i, (key, sub, fmt) in enumerate(SCHEMA):
+        if mask >> i & 1:
+            value = next(values)
+            if fmt == 'f':
+                value = float(f"{value:.7g}")  # 去掉 float32 的尾数噪声
+                if value.is_integer():
+                    value = int(value)
+            if sub is None:
+                message[key] = value
+            else:
+                message.setdefault(key, {})[sub] = value
+    offset = _HEADER.size + packer.size
+    if offset < len(data):
+        for key, value in loads(data[offset:]).items():
+            if isinstance(value, dict) and isinstance(message.get(key), dict):
+                message[key].update(value)
+            else:
+                message[key] = value
+    return message
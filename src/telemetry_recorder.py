@@ -0,0 +1,221 @@
+"""
+遥测飞行记录仪：把桥接收到的每条遥测追加写入紧凑的日志文件，支持按时间范围查询和回放
+
+文件格式 (小端):
+    flight.tlog       8 字节文件头 b'TLOG' + 版本号，之后是连续的记录:
+                      float64 接收时间 | uint32 长度 | telemetry_codec 二进制编码
+    flight.tlog.idx   稀疏时间索引，每 INDEX_EVERY 条记录一项: float64 时间 | uint64 记录偏移
+
+写入在后台线程按批进行，不占用事件循环；查询通过 mmap 只读取需要的区间，不加载整个日志。
+
+    python telemetry_recorder.py info flight.tlog
+    python telemetry_recorder.py query flight.tlog --start 60 --end 90 > clip.ndjson
+回放见 WebSocketServer.py --replay / fake_rc.py --replay。
+"""
+import argparse
+import asyncio
+import mmap
+import os
+import struct
+import sys
+import time
+from bisect import bisect_right
+from threading import Lock
+
+import telemetry_codec
+
+MAGIC = b'TLOG\x01\x00\x00\x00'
+INDEX_EVERY = 64  # 每多少条记录写一项索引
+_RECORD = struct.Struct('<dI')
+_INDEX = struct.Struct('<dQ')
+
+
+class FlightRecorder:
+    """
+    追加写入遥测日志
+    record() 只把消息放入内存批次 (在事件循环中调用，开销很小)，
+    run() 协程定期把批次交给线程池编码并写盘。
+    """
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._batch = []
+        self._data = open(path, 'ab')
+        if self._data.tell() == 0:
+            self._data.write(MAGIC)
+        self._index = open(path + '.idx', 'ab')
+        self._count = 0  # 本次打开后写入的记录数 (决定何时写索引)
+        self.records = 0
+        self.bytes_written = 0
+        self._lock = Lock()  # 退出时的最后一批可能和线程池中的写入重叠
+
+    def record(self, timestamp, message):
+        self._batch.append((timestamp, message))
+
+    def _write_batch(self, batch):
+        with self._lock:
+            self._write_locked(batch)
+
+    def _write_locked(self, batch):
+        chunks = []
+        offset = self._data.tell()
+        for timestamp, message in batch:
+            payload = telemetry_codec.encode(message)
+            if self._count % INDEX_EVERY == 0:
+                self._index.write(_INDEX.pack(timestamp, offset))
+            chunks.append(_RECORD.pack(timestamp, len(payload)))
+            chunks.append(payload)
+            offset += _RECORD.size + len(payload)
+            self._count += 1
+        data = b''.join(chunks)
+        self._data.write(data)
+        # 先落盘数据再落盘索引，索引不会指向不存在的记录
+        self._data.flush()
+        self._index.flush()
+        self.records += len(batch)
+        self.bytes_written += len(data)
+
+    async def flush(self):
+        if self._batch:
+            batch, self._batch = self._batch, []
+            await asyncio.get_running_loop().run_in_executor(None, self._write_batch, batch)
+
+    async def run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        finally:
+            if self._batch:
+                self._write_batch(self._batch)
+                self._batch = []
+            self.close()
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+            self._index.close()
+
+
+class TelemetryLog:
+    """只读打开遥测日志 (mmap)，按时间范围读取"""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"不是遥测日志文件: {path}")
+        self._index = None
+        self._times = []
+        index_path = path + '.idx'
+        if os.path.exists(index_path) and os.path.getsize(index_path) >= _INDEX.size:
+            with open(index_path, 'rb') as f:
+                self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            entries = len(self._index) // _INDEX.size
+            # 只取出时间列用于二分，偏移在定位后再按需读取
+            self._times = [_INDEX.unpack_from(self._index, i * _INDEX.size)[0] for i in range(entries)]
+
+    @property
+    def start_time(self):
+        for timestamp, _ in self._records(len(MAGIC)):
+            return timestamp
+        return None
+
+    @property
+    def end_time(self):
+        last = None
+        for last, _ in self._records(self._seek(float('inf'))):
+            pass
+        return last
+
+    def _records(self, offset):
+        """从偏移处开始依次产出 (时间, 编码后的消息)，遇到未写完的尾部记录即停止"""
+        data = self._data
+        size = len(data)
+        while offset + _RECORD.size <= size:
+            timestamp, length = _RECORD.unpack_from(data, offset)
+            start = offset + _RECORD.size
+            if start + length > size:
+                break
+            yield timestamp, data[start:start + length]
+            offset = start + length
+
+    def _seek(self, start):
+        """不晚于 start 的最近一个索引项的记录偏移"""
+        i = bisect_right(self._times, start) - 1
+        if i < 0:
+            return len(MAGIC)
+        return _INDEX.unpack_from(self._index, i * _INDEX.size)[1]
+
+    def range(self, start=None, end=None):
+        """产出 [start, end] 内的 (时间, 消息字典)，时间为绝对时间戳"""
+        offset = len(MAGIC) if start is None else self._seek(start)
+        for timestamp, payload in self._records(offset):
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp > end:
+                break
+            yield timestamp, telemetry_codec.decode(payload)
+
+    def close(self):
+        self._data.close()
+        if self._index is not None:
+            self._index.close()
+
+
+async def replay(log, emit, speed=1.0, start=None, end=None, loop_forever=False):
+    """
+    按原始时间间隔 (除以 speed) 回放，每条调用 emit(消息字典)
+    start / end 为相对日志开头的秒数
+    """
+    origin = log.start_time
+    if origin is None:
+        return
+    start = origin + start if start is not None else None
+    end = origin + end if end is not None else None
+    while True:
+        first = None
+        began = time.monotonic()
+        for timestamp, message in log.range(start, end):
+            if first is None:
+                first = timestamp
+            delay = (timestamp - first) / speed - (time.monotonic() - began)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            emit(message)
+        if not loop_forever or first is None:
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='遥测飞行记录查询')
+    sub = parser.add_subparsers(dest='command', required=True)
+    info = sub.add_parser('info', help='显示日志时间范围和记录数')
+    info.add_argument('log', type=str)
+    query = sub.add_parser('query', help='按时间范围导出 NDJSON (秒，相对日志开头)')
+    query.add_argument('log', type=str)
+    query.add_argument('--start', type=float, default=None)
+    query.add_argument('--end', type=float, default=None)
+    args = parser.parse_args()
+
+    log = TelemetryLog(args.log)
+    origin = log.start_time
+    if args.command == 'info':
+        count = sum(1 for _ in log._records(len(MAGIC)))
+        end_time = log.end_time
+        print(f"记录数: {count}")
+        if origin is not None:
+            print(f"开始: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(origin))}")
+            print(f"时长: {end_time - origin:.1f} 秒")
+        print(f"大小: {os.path.getsize(args.log) / 1024:.1f} KB")
+    elif origin is not None:
+        start = origin + args.start if args.start is not None else None
+        end = origin + args.end if args.end is not None else None
+        out = sys.stdout
+        for timestamp, message in log.range(start, end):
+            out.write(telemetry_codec.dumps({'t': round(timestamp - origin, 3), **message}) + '\n')
+    log.close()
+
+
+if __name__ == "__main__":
+    main()
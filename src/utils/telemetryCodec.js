@@ -0,0 +1,69 @@
+// src/utils/telemetryCodec.js
+// 遥测二进制解码 (WebSocket 子协议 'binary')，与 src/telemetry_codec.py 对应
+//   uint8 版本号 | uint32 字段位图 | 按 SCHEMA 顺序的数值 (小端) | 其余字段的 JSON
+// SCHEMA 的顺序必须和 Python 端一致
+
+const VERSION = 1
+
+// [顶层字段, 子字段 或 null, 'f' = float32 / 'd' = float64]
+const SCHEMA = [
+  ['heading', null, 'f'],
+  ['batteryLevel', null, 'f'],
+  ['satelliteCount', null, 'f'],
+  ['distanceToHome', null, 'f'],
+  ['remainingFlightTime', null, 'f'],
+  ['attitude', 'pitch', 'f'],
+  ['attitude', 'roll', 'f'],
+  ['attitude', 'yaw', 'f'],
+  ['gimbalAttitude', 'pitch', 'f'],
+  ['gimbalAttitude', 'roll', 'f'],
+  ['gimbalAttitude', 'yaw', 'f'],
+  ['location', 'lat', 'd'],
+  ['location', 'lon', 'd'],
+  ['location', 'alt', 'f'],
+  ['speed', 'x', 'f'],
+  ['speed', 'y', 'f'],
+  ['speed', 'z', 'f']
+]
+
+const textDecoder = new TextDecoder()
+
+export function decodeTelemetry(buffer) {
+  const view = new DataView(buffer)
+  const version = view.getUint8(0)
+  if (version !== VERSION) throw new Error(`未知的遥测编码版本: ${version}`)
+  const mask = view.getUint32(1, true)
+
+  const message = {}
+  let offset = 5
+  SCHEMA.forEach(([key, sub, fmt], i) => {
+    if (!((mask >>> i) & 1)) return
+    let value
+    if (fmt === 'd') {
+      value = view.getFloat64(offset, true)
+      offset += 8
+    } else {
+      // 去掉 float32 的尾数噪声 (和 Python 端一致，保留 7 位有效数字)
+      value = parseFloat(view.getFloat32(offset, true).toPrecision(7))
+      offset += 4
+    }
+    if (sub === null) {
+      message[key] = value
+    } else {
+      if (!message[key]) message[key] = {}
+      message[key][sub] = value
+    }
+  })
+
+  if (offset < buffer.byteLength) {
+    const rest = JSON.parse(textDecoder.decode(new Uint8Array(buffer, offset)))
+    for (const [key, value] of Object.entries(rest)) {
+      if (value && typeof value === 'object' && message[key] && typeof message[key] === 'object') {
+        Object.assign(message[key], value)
+      } else {
+        message[key] = value
+      }
+    }
+  }
+  return message
+}
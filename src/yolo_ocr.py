@@ -5,14 +5,145 @@ PaddleOCR安装: pip install paddlepaddle-gpu paddleocr
 """
 import cv2
 import numpy as np
-from ultralytics import YOLO
-from paddleocr import PaddleOCR
 import time
-from collections import deque
-from threading import Thread, Lock
+from collections import deque, OrderedDict
+from threading import Thread, Lock, Condition, Event
 import queue
 from PIL import Image, ImageDraw, ImageFont
 import subprocess
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import asyncio
+import json
+import os
+import shutil
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from metrics import Histogram, MetricsServer, metric_lines, histogram_lines
+
+PROCESS_START = time.time()  # 模块导入时间，作为首帧标注耗时 (TTFAF) 的起点
+MODEL_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'yolo_ocr')  # 导出模型缓存目录
+
+class LabelSprite:
+    """栅格化后的文字标签贴图 (alpha 蒙版 + 预乘颜色层)"""
+    __slots__ = ('inv_alpha', 'color_layer', 'offset_x', 'offset_y', 'width', 'height')
+
+    def __init__(self, alpha, color, offset_x, offset_y):
+        self.inv_alpha = 1.0 - alpha
+        self.color_layer = alpha * np.array(color, dtype=np.float32)
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+        self.height, self.width = alpha.shape[:2]
+
+
+class OverlayRenderer:
+    """
+    叠加层渲染器
+    1. 字体按字号只加载一次
+    2. 文字标签按 (文本, 字号, 颜色) 栅格化为 alpha 蒙版，放入 LRU 缓存
+    3. 标签贴图直接 alpha 合成到 BGR 帧的局部区域，不做整帧 PIL 转换
+    4. 半透明多边形只在外接矩形 ROI 内混合
+    """
+    def __init__(self, font_path="simhei.ttf", cache_size=512):
+        # 字体的格式，请注意：
+        # 1. 确保你的系统中存在该字体文件
+        # 2. Windows 下通常在 "C:/Windows/Fonts/simhei.ttf" (黑体) 或 "simsun.ttc" (宋体)
+        # 3. Linux/Mac 下需替换为你系统中的中文字体路径
+        self.font_path = font_path
+        self.cache_size = cache_size
+        self._fonts = {}
+        self._sprites = OrderedDict()
+        self._lock = Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def get_font(self, size):
+        """获取指定字号的字体 (只加载一次)"""
+        font = self._fonts.get(size)
+        if font is None:
+            try:
+                font = ImageFont.truetype(self.font_path, size, encoding="utf-8")
+            except OSError:
+                # 如果找不到字体，回退到默认
+                font = ImageFont.load_default()
+                if not self._fonts:
+                    print(f"⚠️ 未找到字体 {self.font_path}，已回退默认字体")
+            self._fonts[size] = font
+        return font
+
+    def get_sprite(self, text, size, color):
+        """获取标签贴图，命中缓存时无需重新栅格化"""
+        key = (text, size, tuple(color))
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                self.cache_hits += 1
+                return sprite
+
+            self.cache_misses += 1
+            font = self.get_font(size)
+            left, top, right, bottom = font.getbbox(text)
+            mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)), 0)
+            ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font)
+            alpha = np.asarray(mask, dtype=np.float32)[..., None] / 255.0
+            sprite = LabelSprite(alpha, color, left, top)
+
+            self._sprites[key] = sprite
+            if len(self._sprites) > self.cache_size:
+                self._sprites.popitem(last=False)
+            return sprite
+
+    def blit(self, frame, sprite, x, y):
+        """把贴图合成到 frame 上，(x, y) 为文字绘制原点 (与 PIL draw.text 一致)"""
+        x += sprite.offset_x
+        y += sprite.offset_y
+        fh, fw = frame.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + sprite.width, fw), min(y + sprite.height, fh)
+        if x0 >= x1 or y0 >= y1:
+            return frame
+
+        sy, sx = slice(y0 - y, y1 - y), slice(x0 - x, x1 - x)
+        roi = frame[y0:y1, x0:x1]
+        roi[:] = roi * sprite.inv_alpha[sy, sx] + sprite.color_layer[sy, sx]
+        return frame
+
+    def draw_text(self, frame, text, position, color, size):
+        """绘制文字，返回贴图以便调用方获取宽高"""
+        sprite = self.get_sprite(text, size, color)
+        self.blit(frame, sprite, int(position[0]), int(position[1]))
+        return sprite
+
+    def fill_poly_alpha(self, frame, points, color, alpha):
+        """半透明填充多边形，只处理外接矩形区域"""
+        fh, fw = frame.shape[:2]
+        x, y, w, h = cv2.boundingRect(points)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, fw), min(y + h, fh)
+        if x0 >= x1 or y0 >= y1:
+            return frame
+
+        roi = frame[y0:y1, x0:x1]
+        overlay = roi.copy()
+        cv2.fillPoly(overlay, [points - (x0, y0)], color)
+        roi[:] = cv2.addWeighted(overlay, alpha, roi, 1 - alpha, 0)
+        return frame
+
+
+_overlay_renderer = None
+_overlay_renderer_lock = Lock()
+
+
+def get_overlay_renderer():
+    """全局共享的叠加层渲染器 (字体与标签缓存在各处复用)"""
+    global _overlay_renderer
+    with _overlay_renderer_lock:
+        if _overlay_renderer is None:
+            _overlay_renderer = OverlayRenderer()
+        return _overlay_renderer
+
 
 def cv2_add_chinese_text(img, text, position, textColor=(0, 255, 0), textSize=30):
     """
@@ -20,106 +151,2511 @@ def cv2_add_chinese_text(img, text, position, textColor=(0, 255, 0), textSize=30
     :param img: OpenCV 图片对象 (numpy array)
     :param text: 要写入的中文文本
     :param position: 文字左上角坐标 (x, y)
-    :param textColor: 文字颜色 (B, G, R)
+    :param textColor: 文字颜色 (R, G, B)，与原先在 PIL RGB 图上绘制的含义一致
     :param textSize: 文字大小
     :return: 绘制了中文的 OpenCV 图片
     """
-    if (isinstance(img, np.ndarray)):  # 判断是否OpenCV图片类型
-        img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    if isinstance(img, np.ndarray):  # 判断是否OpenCV图片类型
+        img = img.copy()
+    else:
+        img = cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
+
+    # 使用共享缓存的标签贴图直接合成，不再整帧转换为 PIL；贴图按 BGR 着色，颜色需反转
+    get_overlay_renderer().draw_text(img, text, position, tuple(textColor[::-1]), textSize)
+    return img
+
+
+class StageStats:
+    """各阶段耗时：有界采样供基准测试统计分位数，累积直方图供 /metrics 导出"""
+    def __init__(self, maxlen=10000):
+        self.maxlen = maxlen
+        self._samples = {}
+        self._counts = {}
+        self.histograms = {}
+        self._lock = Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.maxlen)
+                self._counts[stage] = 0
+                self.histograms[stage] = Histogram()
+            samples.append(seconds)
+            self._counts[stage] += 1
+        self.histograms[stage].observe(seconds)
+
+    def summary(self, percentiles=(50, 90, 95, 99)):
+        """{阶段: {count, mean_ms, max_ms, p50_ms, ...}}"""
+        with self._lock:
+            snapshot = {stage: np.array(samples) for stage, samples in self._samples.items()}
+            counts = dict(self._counts)
+
+        result = {}
+        for stage, samples in snapshot.items():
+            if len(samples) == 0:
+                continue
+            ms = samples * 1000
+            entry = {'count': counts[stage], 'mean_ms': round(float(ms.mean()), 3),
+                     'max_ms': round(float(ms.max()), 3)}
+            for p, value in zip(percentiles, np.percentile(ms, percentiles)):
+                entry[f'p{p}_ms'] = round(float(value), 3)
+            result[stage] = entry
+        return result
 
-    # 创建一个可以在给定图像上绘图的对象
-    draw = ImageDraw.Draw(img)
 
-    # 字体的格式，请注意：
-    # 1. 确保你的系统中存在该字体文件
-    # 2. Windows 下通常在 "C:/Windows/Fonts/simhei.ttf" (黑体) 或 "simsun.ttc" (宋体)
-    # 3. Linux/Mac 下需替换为你系统中的中文字体路径
-    fontStyle = ImageFont.truetype(
-        "simhei.ttf", textSize, encoding="utf-8")
+class LatestFrameSlot:
+    """
+    单槽最新帧缓冲 (带版本号)
+    采集线程只发布最新一帧 (PreparedFrame)，YOLO / OCR / 渲染各自按版本号取帧，
+    来不及处理的旧帧直接被覆盖，不会在缓冲区里积压造成延迟。
+    发布的帧是只读的，各阶段共享同一份引用，不再各自 copy。
+    """
+    def __init__(self):
+        self._cond = Condition()
+        self._frame = None
+        self._version = 0
+        self._timestamp = 0.0
+        self._closed = False
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def publish(self, frame, timestamp=None):
+        """发布新帧 (PreparedFrame)，返回新版本号"""
+        with self._cond:
+            self._frame = frame
+            self._version += 1
+            self._timestamp = time.time() if timestamp is None else timestamp
+            self._cond.notify_all()
+            return self._version
+
+    def latest(self):
+        """返回 (版本号, 帧, 采集时间戳)"""
+        with self._cond:
+            return self._version, self._frame, self._timestamp
+
+    def wait_newer(self, version, timeout=None):
+        """等待比 version 更新的帧，超时或已关闭时返回 None"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._version > version or self._closed, timeout)
+            if self._version <= version:
+                return None
+            return self._version, self._frame, self._timestamp
+
+    def close(self):
+        """采集结束，唤醒所有等待者"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def letterbox(image, imgsz, auto=False, stride=32, color=(114, 114, 114)):
+    """
+    等比缩放并填充灰边 (与 ultralytics 的 LetterBox 一致，输入已是目标尺寸时 YOLO 内部不再缩放)
+    :param auto: True 时只填充到 stride 的整数倍 (矩形输入，仅 .pt 模型支持)；
+                 False 时填充为 imgsz x imgsz (导出模型的固定输入 / 跨路 batch)
+    :return: (图像, 缩放比例, (左侧填充, 顶部填充))
+    """
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    if auto:
+        out_w, out_h = -(-new_w // stride) * stride, -(-new_h // stride) * stride
+    else:
+        out_w = out_h = imgsz
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    left, top = (out_w - new_w) // 2, (out_h - new_h) // 2
+    if out_w != new_w or out_h != new_h:
+        image = cv2.copyMakeBorder(image, top, out_h - new_h - top, left, out_w - new_w - left,
+                                   cv2.BORDER_CONSTANT, value=color)
+    return image, scale, (left, top)
+
+
+class PreparedFrame:
+    """
+    共享预处理阶段：一帧原图 + 按需生成的缩放结果
+    YOLO 的 letterbox 输入和整帧 OCR 用的金字塔层在第一次使用时计算并缓存在帧上，
+    同一帧被多个阶段 (多路共享推理、OCR、调度器切换尺寸前后) 使用时不会重复缩放。
+    各阶段的结果在这里统一映射回原图坐标，绘制仍使用原图坐标。
+    """
+    __slots__ = ('image', '_letterboxed', '_levels', '_thumbnail', '_lock')
+
+    THUMBNAIL_WIDTH = 128  # 场景变化检测用的灰度缩略图宽度
+
+    def __init__(self, image):
+        image.setflags(write=False)
+        self.image = image  # 原始 BGR 帧 (只读)
+        self._letterboxed = {}  # (imgsz, auto) -> (图像, 缩放比例, 填充)
+        self._levels = {}       # max_side -> (图像, 缩放比例)
+        self._thumbnail = None
+        self._lock = Lock()
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def letterbox(self, imgsz, auto=False):
+        """YOLO 输入 (imgsz, auto 同 letterbox())，返回 (图像, 缩放比例, 填充)"""
+        key = (imgsz, auto)
+        with self._lock:
+            item = self._letterboxed.get(key)
+            if item is None:
+                item = self._letterboxed[key] = letterbox(self.image, imgsz, auto)
+        return item
+
+    def level(self, max_side):
+        """
+        金字塔层：长边缩小到不超过 max_side (max_side 为 0 或原图更小时返回原图)
+        :return: (图像, 缩放比例)
+        """
+        h, w = self.image.shape[:2]
+        if not max_side or max(h, w) <= max_side:
+            return self.image, 1.0
+        with self._lock:
+            item = self._levels.get(max_side)
+            if item is None:
+                scale = max_side / max(h, w)
+                size = (int(round(w * scale)), int(round(h * scale)))
+                item = self._levels[max_side] = (
+                    cv2.resize(self.image, size, interpolation=cv2.INTER_AREA), scale)
+        return item
+
+    def thumbnail(self):
+        """
+        灰度缩略图 (场景变化门控用)
+        先最近邻抽样到 4 倍大小再区域平均，4K 帧也只需约 1ms，同时平滑掉编码噪声
+        """
+        with self._lock:
+            if self._thumbnail is None:
+                h, w = self.image.shape[:2]
+                tw = self.THUMBNAIL_WIDTH
+                th = max(int(round(tw * h / w)), 1)
+                small = cv2.resize(self.image, (tw * 4, th * 4), interpolation=cv2.INTER_NEAREST)
+                small = cv2.resize(small, (tw, th), interpolation=cv2.INTER_AREA)
+                self._thumbnail = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            return self._thumbnail
+
+    def map_detections(self, detections, imgsz, auto=False):
+        """letterbox 坐标系下的检测框 -> 原图坐标 (裁剪到图像范围内)"""
+        _, scale, (left, top) = self.letterbox(imgsz, auto)
+        h, w = self.image.shape[:2]
+        xyxy = (detections.xyxy - (left, top, left, top)) / scale
+        np.clip(xyxy, 0, (w, h, w, h), out=xyxy)
+        return Detections(xyxy, detections.cls, detections.conf, detections.track_id,
+                          detections.names)
+
+
+def _file_digest(path):
+    """模型文件内容摘要 (文件不存在时用路径本身，如 ultralytics 会自动下载的官方权重名)"""
+    if not os.path.isfile(path):
+        return path
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_export(weights, export_format, cache_dir=MODEL_CACHE_DIR, **export_args):
+    """
+    把 YOLO 权重导出为 export_format (torchscript / onnx / engine / openvino ...) 并缓存到磁盘
+    以权重内容摘要和导出参数为键，之后的启动直接加载缓存的产物，跳过导出和层融合。
+    :return: 导出产物路径 (文件或 OpenVINO 目录)
+    """
+    key_source = f"{_file_digest(weights)}|{export_format}|{sorted(export_args.items())}"
+    key = hashlib.sha1(key_source.encode('utf-8')).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    target_dir = os.path.join(cache_dir, f"{stem}-{export_format}-{key}")
+    marker = os.path.join(target_dir, 'artifact.json')
+
+    if os.path.exists(marker):
+        with open(marker, 'r', encoding='utf-8') as f:
+            artifact = os.path.join(target_dir, json.load(f)['artifact'])
+        if os.path.exists(artifact):
+            print(f"♻️ 使用缓存的 {export_format} 模型: {artifact}")
+            return artifact
+
+    from ultralytics import YOLO
+
+    print(f"📦 导出 {weights} -> {export_format} (仅首次，之后使用缓存)")
+    exported = str(YOLO(weights).export(format=export_format, **export_args))
+    os.makedirs(target_dir, exist_ok=True)
+    artifact = os.path.join(target_dir, os.path.basename(exported.rstrip(os.sep)))
+    if os.path.isdir(artifact):
+        shutil.rmtree(artifact)
+    elif os.path.exists(artifact):
+        os.remove(artifact)
+    shutil.move(exported, artifact)
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump({'artifact': os.path.basename(artifact), 'weights': weights,
+                   'format': export_format, 'export_args': export_args}, f, ensure_ascii=False)
+    return artifact
+
+
+def quantize_onnx_int8(model_path):
+    """
+    ONNX 模型 int8 动态量化 (权重离线量化，激活在运行时量化，不需要校准数据)
+    结果与原模型放在同一缓存目录，之后直接复用
+    """
+    target = os.path.splitext(model_path)[0] + '-int8.onnx'
+    if os.path.exists(target):
+        print(f"♻️ 使用缓存的 int8 模型: {target}")
+        return target
+
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"📦 int8 量化 {model_path} (仅首次，之后使用缓存)")
+    temp_path = target + '.tmp'
+    quantize_dynamic(model_path, temp_path, weight_type=QuantType.QUInt8, per_channel=True)
+    # 保留 ultralytics 写入的元数据 (类别名等)
+    quantized = onnx.load(temp_path)
+    if not quantized.metadata_props:
+        quantized.metadata_props.extend(onnx.load(model_path).metadata_props)
+    onnx.save(quantized, target)
+    os.remove(temp_path)
+    return target
+
+
+def load_yolo_model(yolo_model, export_format=None, cache_dir=MODEL_CACHE_DIR, imgsz=640,
+                    use_gpu=True, int8=False, int8_data='coco8.yaml', threads=0):
+    """
+    加载 YOLO 推理后端 (见 UltralyticsBackend / OnnxRuntimeBackend / OpenVinoBackend)
+    - 传入的已经是模型对象 (如基准测试的桩模型)：直接包装
+    - export_format 为空或 'pt'：PyTorch 权重 + 层融合
+    - 'onnx' / 'openvino'：首次导出 (动态输入尺寸) 后缓存，由 ONNX Runtime / OpenVINO 直接推理，
+      int8 时分别做动态量化 / 以 int8_data 为校准集的训练后量化
+    - 其它格式 (torchscript / engine)：导出后缓存，由 ultralytics 加载
+    :param use_gpu: 推理设备 (False 时强制 CPU)
+    :param threads: CPU 推理的算子内线程数 (0 = 后端默认)
+    """
+    device = None if use_gpu else 'cpu'
+    if not isinstance(yolo_model, str):
+        return UltralyticsBackend(yolo_model, device, threads)
+    if int8 and export_format not in ('onnx', 'openvino'):
+        print(f"⚠️ int8 量化只支持 onnx / openvino 格式，{export_format or 'pt'} 模型按原精度加载")
+
+    if export_format == 'onnx':
+        artifact = cached_export(yolo_model, 'onnx', cache_dir, imgsz=imgsz, dynamic=True)
+        if int8:
+            artifact = quantize_onnx_int8(artifact)
+        return OnnxRuntimeBackend(artifact, threads, use_gpu)
+    if export_format == 'openvino':
+        export_args = {'imgsz': imgsz, 'dynamic': True}
+        if int8:
+            export_args.update(int8=True, data=int8_data)
+        artifact = cached_export(yolo_model, 'openvino', cache_dir, **export_args)
+        return OpenVinoBackend(artifact, threads, use_gpu)
+
+    from ultralytics import YOLO
+
+    if export_format in (None, 'pt') or not yolo_model.endswith('.pt'):
+        model = YOLO(yolo_model)
+        if yolo_model.endswith('.pt'):
+            model.fuse()
+        return UltralyticsBackend(model, device, threads, rect=yolo_model.endswith('.pt'))
+    artifact = cached_export(yolo_model, export_format, cache_dir, imgsz=imgsz)
+    return UltralyticsBackend(YOLO(artifact, task='detect'), device, threads, rect=False)
+
+
+def create_paddle_ocr(device='cpu', cpu_threads=0, enable_hpi=False):
+    """
+    创建 PaddleOCR 实例 (线程模式和进程池模式共用)；预热见 warmup_ocr
+    :param cpu_threads: CPU 推理线程数 (0 = PaddleOCR 默认)
+    :param enable_hpi: 高性能推理，检测/识别模型自动选用 OpenVINO / ONNX Runtime 等后端
+                       (需安装 PaddleOCR 的 HPI 依赖)
+    进程池模式下用 functools.partial 绑定参数，仍可被 pickle
+    """
+    from paddleocr import PaddleOCR
+
+    print(f"📦 初始化 PaddleOCR (新Pipeline版, {device}{', HPI' if enable_hpi else ''})...")
+    options = {}
+    if cpu_threads:
+        options['cpu_threads'] = cpu_threads
+    if enable_hpi:
+        options['enable_hpi'] = True
+    ocr = PaddleOCR(
+        device=device,
+        lang='ch',
+        use_textline_orientation=True,
+        **options
+    )
+    print("✅ PaddleOCR 初始化成功")
+    return ocr
+
+
+def warmup_ocr(ocr, shape=(100, 100, 3)):
+    """按实际输入尺寸预热一次，避免第一帧真实OCR时才做内存分配和算子选择"""
+    start_time = time.time()
+    ocr.ocr(np.zeros(shape, dtype=np.uint8))
+    print(f"🔥 OCR模型预热完成 ({shape[1]}x{shape[0]}, {(time.time() - start_time) * 1000:.0f}ms)")
+
+
+def parse_paddle_ocr(result, min_score=0.5):
+    """
+    解析PaddleOCR结果为紧凑记录
+    :return: [(文本, 置信度, (x0, y0, x1, y1, ...)), ...]
+    """
+    records = []
+    if result and isinstance(result, list) and len(result) > 0:
+        res = result[0]
 
-    # 绘制文本
-    draw.text(position, text, fill=textColor, font=fontStyle)
+        texts = res.get("rec_texts", [])
+        scores = res.get("rec_scores", [])
+        polys = res.get("rec_polys", [])
 
-    # 转换回 OpenCV 格式
-    return cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
+        for text, score, poly in zip(texts, scores, polys):
+            if score > min_score:
+                points = tuple(int(v) for p in poly for v in p[:2])
+                records.append((text, float(score), points))
+    return records
 
-class HighPerformanceDetectorPaddle:
-    def __init__(self, stream_source = 0, yolo_model='yolo11n.pt', use_gpu=True,rtsp_url=None):
-        print("="*60)
-        print("🚀 高性能检测系统 (PaddleOCR V5)")
-        print("="*60)
-        self.rtsp_url = rtsp_url
-        self.pipe = None
 
-        self.use_gpu = use_gpu
-        print(f"🎮 GPU模式: {'✅ 启用' if use_gpu else '❌ 禁用'}")
+def ocr_records_to_results(records, scale=1.0):
+    """
+    紧凑记录 -> 绘制用的 OCR 结果字典
+    :param scale: 识别所用图像相对原图的缩放比例 (PreparedFrame.level)，坐标除以它还原到原图
+    """
+    if scale != 1.0:
+        records = [(text, score, tuple(int(round(v / scale)) for v in points))
+                   for text, score, points in records]
+    return [{
+        'text': text,
+        'confidence': score,
+        'bbox': [[points[i], points[i + 1]] for i in range(0, len(points), 2)]
+    } for text, score, points in records]
+
+
+def _ocr_process_main(shm_names, task_queue, result_queue, ocr_factory, warmup_shape=None,
+                     index=0, current=None):
+    """
+    OCR 子进程入口：从共享内存读取帧，只回传紧凑记录
+    current[index] 记录本进程正在处理的任务ID (0 = 空闲)，进程意外退出时主进程据此回收共享内存块
+    """
+    ocr = ocr_factory()
+    if warmup_shape is not None:
+        warmup_ocr(ocr, warmup_shape)
+    buffers = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    result_queue.put(('ready', None, None, 0.0))
 
-        # 摄像头
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            job_id, slot, shape = task
+            if current is not None:
+                current[index] = job_id
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=buffers[slot].buf)
+
+            start_time = time.time()
+            try:
+                records = parse_paddle_ocr(ocr.ocr(frame))
+            except Exception as e:
+                print(f"❌ OCR子进程错误: {e}")
+                records = None
+            del frame  # 释放对共享内存的引用
+            result_queue.put((job_id, slot, records, (time.time() - start_time) * 1000))
+            if current is not None:
+                current[index] = 0
+    finally:
+        for buf in buffers:
+            buf.close()
+
+
+class OcrProcessPool:
+    """
+    PaddleOCR 进程池
+    OCR 的 Python 前后处理放到独立进程中，避免和采集 / YOLO / 渲染争抢 GIL。
+    每个在途任务占用一块共享内存，帧只做一次 memcpy，不经过 pickle；
+    子进程只回传 (文本, 置信度, 多边形) 紧凑记录。
+    """
+    def __init__(self, num_workers=2, ocr_factory=create_paddle_ocr):
+        self.num_workers = max(1, num_workers)
+        self.ocr_factory = ocr_factory  # 需可被 pickle (模块级函数/类)
+        self.capacity = 0
+        self._ctx = mp.get_context('spawn')  # 避免 fork 带上 CUDA / 线程状态
+        self._buffers = []
+        self._processes = []
+        self._task_queue = None
+        self._result_queue = None
+        self._free_slots = deque()
+        self._lock = Lock()
+        self._next_job_id = 0
+        self._jobs = {}           # 在途任务ID -> 共享内存块
+        self._current = None      # 各子进程正在处理的任务ID (共享数组)
+        self._warmup_shape = None
+        self._failed = deque()    # 子进程退出时丢失的任务，按失败结果返回
+        self._last_check = 0.0
+        self.in_flight = 0
+        self.restarts = 0
+
+    @property
+    def started(self):
+        return bool(self._processes)
+
+    def start(self, frame_nbytes, warmup_shape=None):
+        """按帧大小分配共享内存并启动子进程 (warmup_shape: 子进程按该尺寸预热)"""
+        self.capacity = frame_nbytes
+        self._buffers = [shared_memory.SharedMemory(create=True, size=frame_nbytes)
+                         for _ in range(self.num_workers)]
+        self._free_slots = deque(range(self.num_workers))
+        self._task_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        self._current = self._ctx.RawArray('q', self.num_workers)
+        self._warmup_shape = warmup_shape
+
+        self._processes = [None] * self.num_workers
+        for i in range(self.num_workers):
+            self._spawn(i)
+        print(f"✅ OCR进程池已启动 ({self.num_workers} 个进程, 每帧 {frame_nbytes / 1e6:.1f}MB 共享内存)")
+
+    def _spawn(self, i):
+        process = self._ctx.Process(target=_ocr_process_main, daemon=True,
+                                    name=f"PaddleOCR-{i}",
+                                    args=([buf.name for buf in self._buffers], self._task_queue,
+                                          self._result_queue, self.ocr_factory, self._warmup_shape,
+                                          i, self._current))
+        process.start()
+        self._processes[i] = process
+
+    def _check_workers(self):
+        """子进程意外退出：回收它手上任务的共享内存块，该任务按失败返回，并重新拉起进程"""
+        self._last_check = time.time()
+        for i, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            job_id = self._current[i]
+            self._current[i] = 0
+            print(f"⚠️ OCR子进程 {process.name} 已退出 (exitcode={process.exitcode})，重新启动")
+            with self._lock:
+                slot = self._jobs.pop(job_id, None) if job_id else None
+                if slot is not None:
+                    self._free_slots.append(slot)
+                    self.in_flight -= 1
+                    self._failed.append((job_id, None, 0.0))
+            self.restarts += 1
+            self._spawn(i)
+
+    def submit(self, frame):
+        """
+        提交一帧 (非阻塞)
+        :return: 任务ID；没有空闲共享内存块时返回 None
+        """
+        if not self.started:
+            self.start(frame.nbytes, frame.shape)
+        if frame.nbytes > self.capacity:
+            print(f"⚠️ 帧大小 {frame.nbytes} 超出共享内存容量 {self.capacity}")
+            return None
+
+        with self._lock:
+            if not self._free_slots:
+                return None
+            slot = self._free_slots.popleft()
+            self._next_job_id += 1
+            job_id = self._next_job_id
+            self._jobs[job_id] = slot
+            self.in_flight += 1
+
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._buffers[slot].buf)
+        np.copyto(view, frame)
+        del view
+        self._task_queue.put((job_id, slot, frame.shape))
+        return job_id
+
+    def get_result(self, timeout=0.5):
+        """
+        取回一个结果
+        :return: (任务ID, 紧凑记录, 耗时ms)；超时返回 None
+        """
+        if not self.started:
+            time.sleep(timeout)
+            return None
+        if time.time() - self._last_check >= 1.0:
+            self._check_workers()
+        if self._failed:
+            return self._failed.popleft()
         try:
-            self.source = int(stream_source)
-            source_type = "USB Camera"
-        except ValueError:
-            self.source = stream_source
-            source_type = "RTSP/Video Stream"
+            job_id, slot, records, elapsed = self._result_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if job_id == 'ready':
+            return None
+
+        with self._lock:
+            if self._jobs.pop(job_id, None) is None:
+                return None  # 已在子进程退出时回收
+            self._free_slots.append(slot)
+            self.in_flight -= 1
+        return job_id, records, elapsed
+
+    def close(self):
+        """通知子进程退出并释放共享内存"""
+        for _ in self._processes:
+            self._task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        for buf in self._buffers:
+            buf.close()
+            buf.unlink()
+        self._buffers = []
+
+
+class Detections:
+    """
+    检测结果容器 (结构数组)
+    xyxy / cls / conf / track_id 各为一个 NumPy 数组，从 YOLO 结果一次性整体拷贝得到，
+    绘制、统计和序列化都直接在数组上进行，不再为每个框创建字典。
+    """
+    __slots__ = ('xyxy', 'cls', 'conf', 'track_id', 'names')
+
+    def __init__(self, xyxy, cls, conf, track_id=None, names=None):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.cls = np.asarray(cls, dtype=np.int32).reshape(-1)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        if track_id is None:
+            track_id = np.full(len(self.cls), -1, dtype=np.int64)  # -1 表示未跟踪
+        self.track_id = np.asarray(track_id, dtype=np.int64).reshape(-1)
+        self.names = names if names is not None else {}
+
+    @classmethod
+    def empty(cls, names=None):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0), names=names)
+
+    @classmethod
+    def from_yolo(cls, result):
+        """从单张图片的 YOLO 结果构建 (boxes.data 一次性传回 CPU)"""
+        data = result.boxes.data.cpu().numpy()
+        # data 列: x1, y1, x2, y2, [track_id,] conf, cls
+        track_id = data[:, 4] if data.shape[1] == 7 else None
+        return cls(data[:, :4], data[:, -1], data[:, -2], track_id, result.names)
+
+    @classmethod
+    def concat(cls, parts, names=None):
+        """拼接多组检测结果 (如各切块的结果)"""
+        if not parts:
+            return cls.empty(names)
+        return cls(np.concatenate([p.xyxy for p in parts]), np.concatenate([p.cls for p in parts]),
+                   np.concatenate([p.conf for p in parts]), np.concatenate([p.track_id for p in parts]),
+                   names if names is not None else parts[0].names)
+
+    def __len__(self):
+        return len(self.cls)
+
+    def __getitem__(self, index):
+        """按布尔掩码或下标数组取子集"""
+        return Detections(self.xyxy[index], self.cls[index], self.conf[index],
+                          self.track_id[index], self.names)
+
+    def class_name(self, class_id):
+        return self.names.get(int(class_id), str(class_id))
+
+    def class_ids(self, class_names):
+        """类别名 -> 类别ID列表"""
+        class_names = set(class_names)
+        return [k for k, v in self.names.items() if v in class_names]
+
+    def class_counts(self):
+        """各类别数量 {类别名: 数量}"""
+        ids, counts = np.unique(self.cls, return_counts=True)
+        return {self.class_name(i): int(n) for i, n in zip(ids, counts)}
+
+    def to_dicts(self):
+        """转换为字典列表 (用于序列化 / 调试输出)"""
+        boxes = self.xyxy.round().astype(np.int32).tolist()
+        return [{
+            'class': self.class_name(c),
+            'confidence': conf,
+            'bbox': box,
+            'track_id': tid if tid >= 0 else None
+        } for box, c, conf, tid in zip(boxes, self.cls.tolist(), self.conf.tolist(),
+                                       self.track_id.tolist())]
+
+
+def box_iou(boxes_a, boxes_b):
+    """向量化 IoU: (N, 4) x (M, 4) -> (N, M)，框格式为 xyxy"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def box_ios(boxes_a, boxes_b):
+    """向量化 IoS (交集 / 较小框面积): (N, 4) x (M, 4) -> (N, M)，被切块截断的框与完整框之间也较大"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(np.minimum(area_a[:, None], area_b[None, :]), 1e-6)
+
+
+def nms(boxes, scores, iou_threshold=0.45, classes=None, metric='iou'):
+    """
+    向量化 NMS：一次算出重叠度矩阵，再按分数顺序逐个抑制
+    :param classes: 给出时只在同类别之间抑制 (各类别的框平移到互不重叠的区域)
+    :param metric: 'iou'，或 'ios' (合并切块推理结果时使用)
+    :return: 保留的下标 (按分数降序)
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if classes is not None:
+        boxes = boxes + (np.asarray(classes, dtype=np.float32) * (boxes.max() + 1))[:, None]
+    order = np.argsort(-np.asarray(scores))
+    overlap = box_ios if metric == 'ios' else box_iou
+    iou = overlap(boxes[order], boxes[order])
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_threshold
+    return order[keep]
+
+
+def decode_yolo_output(output, conf=0.25, iou=0.45, max_det=300, names=None):
+    """
+    导出模型单张图片的输出 -> Detections (letterbox 坐标)
+    :param output: (4 + 类别数, N) 原始输出 [cx, cy, w, h, 各类别分数]；
+                   或 (N, 6) 端到端输出 [x1, y1, x2, y2, 分数, 类别] (已做过 NMS)
+    """
+    if output.shape[-1] == 6 and not (names and output.shape[0] == 4 + len(names)):
+        output = output[output[:, 4] >= conf]
+        return Detections(output[:, :4], output[:, 5], output[:, 4], names=names)
 
-        print(f"📹 打开视频源: {self.source} [{source_type}]")
+    pred = output.T
+    scores = pred[:, 4:]
+    cls = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(cls)), cls]
+    mask = confidences >= conf
+    pred, cls, confidences = pred[mask], cls[mask], confidences[mask]
 
-        self.cap = cv2.VideoCapture(self.source)
-        if not self.cap.isOpened():
-            raise Exception(f"无法打开:{self.source}")
+    xy, wh = pred[:, :2], pred[:, 2:4] / 2
+    xyxy = np.concatenate([xy - wh, xy + wh], axis=1)
+    keep = nms(xyxy, confidences, iou, cls)[:max_det]
+    return Detections(xyxy[keep], cls[keep], confidences[keep], names=names)
 
-        if source_type == "USB Camera":
-            # 只有 USB 摄像头才需要手动设置分辨率
-            # RTSP 流的分辨率由推流端决定，客户端强行 set 通常无效或导致错误
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-            self.cap.set(cv2.CAP_PROP_FPS, 30)
-            print("✅ USB摄像头参数已配置")
+
+class UltralyticsBackend:
+    """
+    YOLO 推理后端：ultralytics 加载的模型 (.pt / TorchScript / TensorRT) 及基准测试桩模型
+    所有后端的接口相同：predict(letterbox 后的图像列表) -> [Detections (letterbox 坐标), ...]
+    """
+    def __init__(self, model, device=None, threads=0, rect=True):
+        self.model = model
+        self.device = device  # None = 自动 (有 GPU 时用 GPU)，'cpu' = 强制 CPU
+        self.rect = rect      # 是否支持矩形输入 (固定输入尺寸的导出模型为 False)
+        self.name = 'torch' if rect else 'ultralytics'
+        if threads and device == 'cpu':
+            import torch
+            torch.set_num_threads(threads)
+
+    def predict(self, images, conf=0.25, imgsz=640):
+        results = self.model(images, verbose=False, conf=conf, imgsz=imgsz, device=self.device)
+        return [Detections.from_yolo(result) for result in results]
+
+
+class ExportedYoloBackend:
+    """
+    导出模型后端的公共部分：直接使用共享预处理阶段的 letterbox 图像，
+    只做 BGR->RGB / HWC->CHW / 归一化，输出在 NumPy 中解码并做 NMS，绕过 ultralytics 的前后处理。
+    子类提供 _run(batch)：输入 NCHW float32 batch，返回每张图的原始输出 (decode_yolo_output 的输入)
+    """
+    rect = True  # 以动态输入尺寸导出，支持矩形输入和任意 batch
+
+    def __init__(self, names=None, iou=0.45, max_det=300):
+        self.names = names or {}
+        self.iou = iou
+        self.max_det = max_det
+
+    def predict(self, images, conf=0.25, imgsz=640):
+        batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2).astype(np.float32)
+        batch *= 1 / 255
+        outputs = self._run(np.ascontiguousarray(batch))
+        return [decode_yolo_output(output, conf, self.iou, self.max_det, self.names)
+                for output in outputs]
+
+
+def _parse_names(value):
+    """ultralytics 导出元数据中的类别名 (字符串形式的字典)"""
+    if isinstance(value, str):
+        import ast
+        value = ast.literal_eval(value)
+    return {int(k): v for k, v in (value or {}).items()}
+
+
+class OnnxRuntimeBackend(ExportedYoloBackend):
+    """ONNX Runtime 推理 (CPU 或 CUDA)"""
+    def __init__(self, model_path, threads=0, use_gpu=False):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        providers = ['CPUExecutionProvider']
+        if use_gpu and 'CUDAExecutionProvider' in ort.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = ort.InferenceSession(model_path, options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        super().__init__(_parse_names(metadata.get('names')))
+        self.name = 'onnxruntime' + ('-int8' if model_path.endswith('-int8.onnx') else '')
+        print(f"✅ ONNX Runtime 后端: {self.session.get_providers()[0]}, 线程 {threads or '默认'}")
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoBackend(ExportedYoloBackend):
+    """OpenVINO 推理 (CPU 或 Intel GPU)，以降低延迟为目标编译"""
+    def __init__(self, model_dir, threads=0, use_gpu=False):
+        import openvino as ov
+        import yaml
+
+        core = ov.Core()
+        xml = next(os.path.join(model_dir, f) for f in os.listdir(model_dir) if f.endswith('.xml'))
+        device = 'GPU' if use_gpu and 'GPU' in core.available_devices else 'CPU'
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        self.compiled = core.compile_model(core.read_model(xml), device, config)
+        self.output = self.compiled.output(0)
+        names = None
+        metadata_path = os.path.join(model_dir, 'metadata.yaml')
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                names = (yaml.safe_load(f) or {}).get('names')
+        super().__init__(_parse_names(names))
+        self.name = 'openvino' + ('-int8' if 'int8' in os.path.basename(model_dir.rstrip(os.sep)) else '')
+        print(f"✅ OpenVINO 后端: {device}, 线程 {threads or '默认'}")
+
+    def _run(self, batch):
+        return self.compiled([batch])[self.output]
+
+
+class RegionOcrCache:
+    """
+    区域 OCR 与按目标缓存
+    只裁剪指定类别的 YOLO 检测框 (带外扩边距)，拼成一张小图一次送入 OCR，
+    识别结果按目标缓存；只有框变化较大或缓存过期时才重新识别。
+    文字多边形以检测框左上角为原点保存，目标移动时跟着框一起走。
+    """
+    def __init__(self, classes=None, padding=0.1, ttl=5.0, min_iou=0.6,
+                 interval=0.2, max_regions=16, gap=8):
+        self.classes = set(classes) if classes else None  # None 表示所有类别
+        self.padding = padding          # 裁剪外扩比例
+        self.ttl = ttl                  # 缓存有效期 (秒)
+        self.min_iou = min_iou          # 与识别时的框 IoU 低于该值则重新识别
+        self.interval = interval        # 区域 OCR 请求间隔 (秒)
+        self.max_regions = max_regions  # 单次 OCR 最多拼接的区域数
+        self.gap = gap                  # 拼图中区域之间的间隔像素
+
+        self._entries = {}   # key -> 缓存条目
+        self._visible = []   # 当前帧可见目标 [(key, bbox), ...]
+        self._next_key = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _assign_keys(self, boxes, track_ids):
+        """为检测框分配目标 key：有 track_id 直接使用，否则按 IoU 贪心匹配上一帧"""
+        keys = [('track', int(tid)) if tid >= 0 else None for tid in track_ids]
+        free = [i for i, key in enumerate(keys) if key is None]
+
+        if free:
+            candidates = [key for key in self._entries if key[0] == 'iou']
+            if candidates:
+                iou = box_iou(boxes[free],
+                              [self._entries[key]['last_bbox'] for key in candidates])
+                for row in np.argsort(-iou.max(axis=1)):
+                    col = int(iou[row].argmax())
+                    if iou[row, col] >= 0.3:
+                        keys[free[row]] = candidates[col]
+                        iou[:, col] = -1
+            for i in free:
+                if keys[i] is None:
+                    self._next_key += 1
+                    keys[i] = ('iou', self._next_key)
+        return keys
+
+    def plan(self, frame, detections, now=None):
+        """
+        更新可见目标，返回需要(重新)识别的区域
+        :param detections: Detections
+        :return: [(key, bbox, crop_x0, crop_y0, crop), ...]
+        """
+        now = time.time() if now is None else now
+        h, w = frame.shape[:2]
+        if self.classes is not None:
+            detections = detections[np.isin(detections.cls, detections.class_ids(self.classes))]
+        boxes = detections.xyxy.round().astype(np.int32)
+
+        requests = []
+        with self._lock:
+            keys = self._assign_keys(boxes, detections.track_id)
+            self._visible = []
+            for key, bbox in zip(keys, boxes.tolist()):
+                entry = self._entries.setdefault(key, {
+                    'records': [], 'ocr_bbox': None, 'ocr_time': 0.0, 'pending_since': None
+                })
+                entry['last_bbox'] = bbox
+                entry['last_seen'] = now
+                self._visible.append((key, bbox))
+
+                fresh = (entry['ocr_bbox'] is not None
+                         and now - entry['ocr_time'] < self.ttl
+                         and box_iou([bbox], [entry['ocr_bbox']])[0, 0] >= self.min_iou)
+                if fresh:
+                    self.hits += 1
+                    continue
+                pending = (entry['pending_since'] is not None
+                           and now - entry['pending_since'] < max(self.ttl, 2.0))
+                if pending or len(requests) >= self.max_regions:
+                    continue
+
+                self.misses += 1
+                x1, y1, x2, y2 = bbox
+                pad_x, pad_y = int((x2 - x1) * self.padding), int((y2 - y1) * self.padding)
+                cx0, cy0 = max(x1 - pad_x, 0), max(y1 - pad_y, 0)
+                cx1, cy1 = min(x2 + pad_x, w), min(y2 + pad_y, h)
+                if cx1 - cx0 < 8 or cy1 - cy0 < 8:
+                    continue
+                entry['pending_since'] = now
+                requests.append((key, bbox, cx0, cy0, frame[cy0:cy1, cx0:cx1]))
+
+            # 清理长时间未出现的目标
+            for key in [key for key, entry in self._entries.items()
+                        if now - entry['last_seen'] > self.ttl * 2]:
+                del self._entries[key]
+
+        return requests
+
+    def build_mosaic(self, requests, max_width, max_height):
+        """
+        把待识别区域按行货架式拼接成一张图，一次送入 OCR
+        :return: (拼图, 布局)；布局记录每个区域在拼图中的位置
+        """
+        layout = []
+        x = y = shelf_h = 0
+        used_w = 0
+        for i, (key, bbox, cx0, cy0, crop) in enumerate(requests):
+            ch, cw = crop.shape[:2]
+            if x + cw > max_width:
+                x, y, shelf_h = 0, y + shelf_h + self.gap, 0
+            if y + ch > max_height:
+                # 放不下的区域留到下一轮
+                self.cancel([item[0] for item in requests[i:]])
+                break
+            layout.append((key, bbox, x, y, cw, ch, cx0 - bbox[0], cy0 - bbox[1]))
+            x += cw + self.gap
+            shelf_h = max(shelf_h, ch)
+            used_w = max(used_w, x - self.gap)
+
+        if not layout:
+            return None, []
+
+        mosaic = np.zeros((y + shelf_h, used_w, 3), dtype=np.uint8)
+        for (key, bbox, mx, my, cw, ch, _, _), request in zip(layout, requests):
+            mosaic[my:my + ch, mx:mx + cw] = request[4]
+        return mosaic, layout
+
+    def apply(self, layout, records, now=None):
+        """把拼图上的 OCR 记录分配回各个目标，多边形转换为相对检测框左上角的坐标"""
+        now = time.time() if now is None else now
+        assigned = {item[0]: [] for item in layout}
+        for text, score, points in records:
+            pts = np.array(points, dtype=np.int32).reshape(-1, 2)
+            cx, cy = pts.mean(axis=0)
+            for key, bbox, mx, my, cw, ch, ox, oy in layout:
+                if mx <= cx < mx + cw and my <= cy < my + ch:
+                    rel = pts - (mx, my) + (ox, oy)
+                    assigned[key].append((text, score, rel))
+                    break
+
+        with self._lock:
+            for key, bbox, *_ in layout:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                entry['records'] = assigned[key]
+                entry['ocr_bbox'] = bbox
+                entry['ocr_time'] = now
+                entry['pending_since'] = None
+        return sum(len(v) for v in assigned.values())
+
+    def cancel(self, keys):
+        """请求未能提交，清除等待标记以便下一轮重试"""
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry['pending_since'] = None
+
+    def results(self):
+        """当前可见目标的 OCR 结果 (整帧坐标，跟随最新检测框)"""
+        ocr_results = []
+        with self._lock:
+            for key, bbox in self._visible:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                for text, score, rel in entry['records']:
+                    pts = rel + (bbox[0], bbox[1])
+                    ocr_results.append({
+                        'text': text,
+                        'confidence': score,
+                        'bbox': pts.tolist()
+                    })
+        return ocr_results
+
+
+class BoxTracker:
+    """
+    轻量多目标跟踪器 (IoU 匹配 + alpha-beta 匀速模型，全部用 NumPy 向量化)
+    YOLO 结果到达时更新轨迹，渲染时按帧时间戳预测每个框的位置，
+    这样 YOLO 可以低于采集帧率运行，而叠加框仍然平滑移动。
+    """
+    def __init__(self, iou_threshold=0.3, max_misses=5, alpha=0.7, beta=0.2):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses  # 连续多少次 YOLO 结果未匹配后删除轨迹
+        self.alpha = alpha            # 位置修正系数
+        self.beta = beta              # 速度修正系数
+
+        self.boxes = np.zeros((0, 4), dtype=np.float32)       # 最近一次更新后的框
+        self.velocities = np.zeros((0, 4), dtype=np.float32)  # 像素/秒
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int32)
+        self.cls = np.zeros(0, dtype=np.int32)
+        self.confidences = np.zeros(0, dtype=np.float32)
+        self.names = {}
+        self.timestamp = None
+        self._next_id = 1
+
+    def _predict_boxes(self, timestamp):
+        if self.timestamp is None:
+            return self.boxes
+        dt = max(timestamp - self.timestamp, 0.0)
+        return self.boxes + self.velocities * dt
+
+    def _match(self, predicted, detections):
+        """按 IoU 从大到小贪心匹配，只匹配同类别"""
+        if len(predicted) == 0 or len(detections) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        iou = box_iou(predicted, detections.xyxy)
+        iou[self.cls[:, None] != detections.cls[None, :]] = 0
+
+        rows, cols = np.nonzero(iou >= self.iou_threshold)
+        order = np.argsort(-iou[rows, cols])
+        track_idx, det_idx = [], []
+        used_rows, used_cols = set(), set()
+        for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+            if r in used_rows or c in used_cols:
+                continue
+            used_rows.add(r)
+            used_cols.add(c)
+            track_idx.append(r)
+            det_idx.append(c)
+        return np.array(track_idx, dtype=np.int64), np.array(det_idx, dtype=np.int64)
+
+    def update(self, detections, timestamp):
+        """用一次 YOLO 结果 (Detections) 更新所有轨迹，返回带 track_id 的检测结果"""
+        dt = max(timestamp - self.timestamp, 1e-3) if self.timestamp is not None else 1e-3
+        predicted = self._predict_boxes(timestamp)
+        track_idx, det_idx = self._match(predicted, detections)
+
+        # 匹配上的轨迹：alpha-beta 修正位置和速度
+        boxes = predicted.copy()
+        velocities = self.velocities.copy()
+        misses = self.misses + 1
+        confidences = self.confidences.copy()
+        if len(track_idx):
+            residual = detections.xyxy[det_idx] - predicted[track_idx]
+            boxes[track_idx] = predicted[track_idx] + self.alpha * residual
+            velocities[track_idx] += self.beta * residual / dt
+            misses[track_idx] = 0
+            confidences[track_idx] = detections.conf[det_idx]
+
+        # 删除长时间未匹配的轨迹
+        keep = misses <= self.max_misses
+        boxes, velocities, misses = boxes[keep], velocities[keep], misses[keep]
+        ids, cls, confidences = self.ids[keep], self.cls[keep], confidences[keep]
+
+        # 未匹配的检测：新建轨迹
+        new_idx = np.setdiff1d(np.arange(len(detections)), det_idx)
+        if len(new_idx):
+            new_ids = np.arange(self._next_id, self._next_id + len(new_idx))
+            self._next_id += len(new_idx)
+            boxes = np.vstack([boxes, detections.xyxy[new_idx]])
+            velocities = np.vstack([velocities, np.zeros((len(new_idx), 4), dtype=np.float32)])
+            misses = np.concatenate([misses, np.zeros(len(new_idx), dtype=np.int32)])
+            ids = np.concatenate([ids, new_ids])
+            cls = np.concatenate([cls, detections.cls[new_idx]])
+            confidences = np.concatenate([confidences, detections.conf[new_idx]])
+
+        self.boxes, self.velocities, self.misses = boxes, velocities, misses
+        self.ids, self.cls, self.confidences = ids, cls, confidences
+        self.names = detections.names or self.names
+        self.timestamp = timestamp
+        return self.predict(timestamp)
+
+    def predict(self, timestamp):
+        """预测 timestamp 时刻各轨迹的位置 (只输出最近一次结果中匹配到的轨迹)"""
+        active = self.misses == 0
+        return Detections(self._predict_boxes(timestamp)[active], self.cls[active],
+                          self.confidences[active], self.ids[active], self.names)
+
+
+class SharedYoloInference:
+    """
+    多路共享 YOLO 推理线程
+    所有视频流共用一个模型实例：每轮从各路的单槽缓冲中取出最新帧，
+    拼成一个 batch 推理一次，再把结果按路回写到对应的检测器。
+    """
+    def __init__(self, yolo_model='yolo11n.pt', conf=0.25, imgsz=640, max_batch=8,
+                 export_format=None, cache_dir=MODEL_CACHE_DIR, use_gpu=True, yolo_options=None):
+        # 模型在后台加载，与各路视频源的打开并行进行；推理线程开始前等待加载完成
+        print(f"📦 加载共享YOLO模型: {yolo_model}")
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="YOLO-Load")
+        self._yolo_future = self._loader.submit(load_yolo_model, yolo_model, export_format,
+                                                cache_dir, imgsz, use_gpu, **(yolo_options or {}))
+        self._loader.shutdown(wait=False)
+        self.yolo = None
+
+        self.conf = conf
+        self.imgsz = imgsz
+        self.max_batch = max_batch
+        self.streams = []
+        self._last_versions = []
+        self.running = False
+        self.batch_sizes = deque(maxlen=30)  # 最近的 batch 大小
+        self._thread = None
+
+    def register(self, detector):
+        """注册一路视频流"""
+        self.streams.append(detector)
+        self._last_versions.append(0)
+
+    def start(self):
+        self.running = True
+        self._thread = Thread(target=self.worker, daemon=True, name="YOLO-Shared")
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=2.0):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _collect_batch(self):
+        """收集各路尚未推理过的最新帧"""
+        batch = []
+        for i, detector in enumerate(self.streams):
+            if not detector.running:
+                continue
+            version, frame, timestamp = detector.frame_slot.latest()
+            last_version = self._last_versions[i]
+            if frame is None or version < last_version + detector.yolo_stride:
+                continue
+            if last_version:
+                detector.dropped['yolo'] += max(version - last_version - detector.yolo_stride, 0)
+            self._last_versions[i] = version
+            detector._yolo_version = version
+            gate = detector.scene_gate
+            if gate is not None:
+                if not gate.changed('yolo', frame, timestamp):
+                    detector.reuse_detections(timestamp)
+                    continue
+                gate.mark('yolo', frame, timestamp)
+            batch.append((detector, frame, timestamp))
+        return batch
+
+    def worker(self):
+        """共享YOLO检测线程"""
+        print(f"🧵 共享YOLO线程已启动 ({len(self.streams)} 路)")
+        self.yolo = self._yolo_future.result()
+        print("✅ 共享YOLO模型已加载")
+        # 按实际 batch 形状预热 (各路 letterbox 后尺寸一致)
+        warmup_frames = [letterbox(detector.first_frame, self.imgsz)[0]
+                         for detector in self.streams if detector.first_frame is not None]
+        if warmup_frames:
+            start_time = time.time()
+            self.yolo.predict(warmup_frames[:self.max_batch], conf=self.conf, imgsz=self.imgsz)
+            print(f"🔥 共享YOLO预热完成 ({(time.time() - start_time) * 1000:.0f}ms)")
+
+        while self.running:
+            batch = self._collect_batch()
+            if not batch:
+                time.sleep(0.005)
+                continue
+
+            # 各路的输入尺寸 / 置信度可能不同 (调度器按路调整)，相同设置的视频流拼成一个 batch；
+            # 统一 letterbox 成 imgsz x imgsz，不同分辨率的视频流也能拼在一起
+            groups = {}
+            for item in batch:
+                detector = item[0]
+                groups.setdefault((detector.yolo_imgsz, detector.yolo_conf), []).append(item)
+            chunks = [(imgsz, conf, items[start:start + self.max_batch])
+                      for (imgsz, conf), items in groups.items()
+                      for start in range(0, len(items), self.max_batch)]
+
+            for imgsz, conf, chunk in chunks:
+                start_time = time.time()
+                inputs, spans = [], []
+                for detector, prepared, _ in chunk:
+                    if detector.tiler is not None:
+                        # 切块推理：该路的整帧和各切块都放进同一个 batch
+                        images, plan = detector.tiler.prepare(prepared, imgsz, detector._raw_detections)
+                    else:
+                        images, plan = [prepared.letterbox(imgsz)[0]], None
+                    spans.append((len(inputs), len(images), plan))
+                    inputs += images
+                results = self.yolo.predict(inputs, conf=conf, imgsz=imgsz)
+                elapsed = time.time() - start_time
+                self.batch_sizes.append(len(chunk))
+
+                # 结果映射回原图坐标，按顺序回写到对应的视频流
+                for (detector, prepared, timestamp), (first, count, plan) in zip(chunk, spans):
+                    detector.stats.record('yolo', elapsed)
+                    if plan is not None:
+                        detections = detector.tiler.merge(prepared, results[first:first + count], plan, imgsz)
+                    else:
+                        detections = prepared.map_detections(results[first], imgsz)
+                    detector.update_detections(detections, timestamp)
+
+        print("🛑 共享YOLO线程已停止")
+
+
+class SceneChangeGate:
+    """
+    场景变化门控
+    悬停或固定机位时画面几乎不变，每帧先用缩略图和该阶段上次推理时的画面比较，
+    变化像素占比低于阈值就跳过推理、沿用上次结果；超过 max_age 仍强制刷新一次，
+    避免小目标 (在缩略图上不到一个像素) 的变化一直被忽略。
+    整帧OCR结果另外按缩略图的感知哈希 (dHash) 缓存，镜头回到拍过的画面时直接复用
+    (缓存同样只在 ocr_max_age 内有效)。
+    """
+    def __init__(self, yolo_threshold=0.5, ocr_threshold=2.0, max_age=1.0, ocr_max_age=10.0,
+                 pixel_delta=10, hash_distance=4, cache_size=32):
+        self.thresholds = {'yolo': yolo_threshold, 'ocr': ocr_threshold}  # 变化像素百分比
+        self.max_ages = {'yolo': max_age, 'ocr': ocr_max_age}  # 跳过推理的最长时间 (秒)
+        self.pixel_delta = pixel_delta  # 灰度差超过该值视为变化像素
+        self.hash_distance = hash_distance  # 感知哈希汉明距离不超过该值视为同一画面
+        self.cache_size = cache_size
+        self._refs = {}  # 阶段 -> (参考缩略图, 参考时间)
+        self._ocr_cache = OrderedDict()  # dHash -> (OCR结果, 识别时间) (LRU)
+        self._lock = Lock()
+        self.scores = {'yolo': 0.0, 'ocr': 0.0}  # 最近一次的变化像素百分比
+        self.counts = {
+            'yolo': {'run': 0, 'skipped': 0},
+            'ocr': {'run': 0, 'skipped': 0, 'cache_hit': 0}
+        }
+
+    @staticmethod
+    def frame_hash(prepared):
+        """64 位 dHash：9x8 灰度图相邻像素的明暗关系"""
+        small = cv2.resize(prepared.thumbnail(), (9, 8), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return int(np.packbits(bits).view('>u8')[0])
+
+    def changed(self, stage, prepared, now=None):
+        """与该阶段上次推理的画面相比是否有明显变化 (无变化时计为一次跳过)"""
+        now = time.time() if now is None else now
+        ref = self._refs.get(stage)
+        if ref is None or now - ref[1] >= self.max_ages[stage]:
+            return True
+        thumb = prepared.thumbnail()
+        if thumb.shape != ref[0].shape:
+            return True
+        diff = cv2.absdiff(thumb, ref[0])
+        score = float(np.count_nonzero(diff > self.pixel_delta)) * 100 / diff.size
+        self.scores[stage] = score
+        if score >= self.thresholds[stage]:
+            return True
+        with self._lock:
+            self.counts[stage]['skipped'] += 1
+        return False
+
+    def mark(self, stage, prepared, now=None, ran=True):
+        """该阶段已对这一帧推理 (ran=False: 复用了缓存)，作为之后比较的参考画面"""
+        self._refs[stage] = (prepared.thumbnail(), time.time() if now is None else now)
+        if ran:
+            with self._lock:
+                self.counts[stage]['run'] += 1
+
+    def lookup_ocr(self, frame_hash, now=None):
+        """按感知哈希查找缓存的整帧OCR结果，未命中返回 None"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for key, (results, stored_at) in self._ocr_cache.items():
+                if (now - stored_at < self.max_ages['ocr']
+                        and bin(key ^ frame_hash).count('1') <= self.hash_distance):
+                    self._ocr_cache.move_to_end(key)
+                    self.counts['ocr']['cache_hit'] += 1
+                    return results
+        return None
+
+    def store_ocr(self, frame_hash, results):
+        with self._lock:
+            self._ocr_cache[frame_hash] = (results, time.time())
+            self._ocr_cache.move_to_end(frame_hash)
+            while len(self._ocr_cache) > self.cache_size:
+                self._ocr_cache.popitem(last=False)
+
+    def hit_rates(self):
+        """各阶段省掉的推理占比 {阶段: 比例}"""
+        rates = {}
+        for stage, counts in self.counts.items():
+            saved = counts['skipped'] + counts.get('cache_hit', 0)
+            total = saved + counts['run']
+            rates[stage] = round(saved / total, 3) if total else 0.0
+        return rates
+
+
+class TiledInference:
+    """
+    切块推理 (航拍画面中的小目标)
+    原图按 tile_size 切成有重叠的块，各块以接近原始分辨率送入 YOLO，
+    和缩小后的整帧 (大目标) 一起组成一个 batch 推理，结果映射回原图后做跨块 NMS。
+    adaptive 模式只切最近有检测结果或有运动的区域，再加上每帧轮换扫描的少量块
+    (保证静止的新目标最终也会被覆盖)，开销随画面内容而不是分辨率增长。
+    """
+    def __init__(self, tile_size=640, overlap=0.2, adaptive=False, max_tiles=16, scan_tiles=2,
+                 include_full=True, merge_threshold=0.6, motion_delta=15, margin=0.5):
+        self.tile_size = tile_size        # 切块边长 (原图像素)
+        self.overlap = overlap            # 相邻切块重叠比例
+        self.adaptive = adaptive
+        self.max_tiles = max_tiles        # 每帧最多推理的切块数
+        self.scan_tiles = scan_tiles      # adaptive 模式下每帧轮换扫描的切块数
+        self.include_full = include_full  # 是否同时推理整帧
+        self.merge_threshold = merge_threshold  # 跨块合并的 IoS 阈值
+        self.motion_delta = motion_delta  # 缩略图灰度差超过该值视为运动
+        self.margin = margin              # 最近检测框外扩比例 (目标移动后仍落在选中的块里)
+        self._grid = None
+        self._grid_shape = None
+        self._scan_cursor = 0
+        self._last_thumbnail = None
+        self.tile_counts = deque(maxlen=30)  # 最近每帧的切块数
+        self.tiles_total = 0
+        self.frames = 0
+
+    def grid(self, width, height):
+        """覆盖整帧的切块 (N, 4) xyxy，最后一行/列贴齐边缘"""
+        if self._grid_shape != (width, height):
+            tw, th = min(self.tile_size, width), min(self.tile_size, height)
+            step_x = max(int(tw * (1 - self.overlap)), 1)
+            step_y = max(int(th * (1 - self.overlap)), 1)
+            xs = list(range(0, width - tw + 1, step_x))
+            ys = list(range(0, height - th + 1, step_y))
+            if xs[-1] + tw < width:
+                xs.append(width - tw)
+            if ys[-1] + th < height:
+                ys.append(height - th)
+            self._grid = np.array([(x, y, x + tw, y + th) for y in ys for x in xs], dtype=np.int32)
+            self._grid_shape = (width, height)
+        return self._grid
+
+    def _motion_scores(self, prepared, grid):
+        """各切块内的运动像素占比 (缩略图差分 + 积分图，一次算出所有切块)"""
+        thumb = prepared.thumbnail()
+        last, self._last_thumbnail = self._last_thumbnail, thumb
+        if last is None or last.shape != thumb.shape:
+            return np.zeros(len(grid))
+        mask = (cv2.absdiff(thumb, last) > self.motion_delta).astype(np.uint8)
+        integral = cv2.integral(mask)
+        th, tw = mask.shape
+        h, w = prepared.shape[:2]
+        x0 = (grid[:, 0] * tw // w).clip(0, tw)
+        x1 = np.maximum((grid[:, 2] * tw + w - 1) // w, x0 + 1).clip(0, tw)
+        y0 = (grid[:, 1] * th // h).clip(0, th)
+        y1 = np.maximum((grid[:, 3] * th + h - 1) // h, y0 + 1).clip(0, th)
+        moving = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+        return moving / np.maximum((x1 - x0) * (y1 - y0), 1)
+
+    def select(self, prepared, recent=None):
+        """本帧要推理的切块 (K, 4)"""
+        h, w = prepared.shape[:2]
+        grid = self.grid(w, h)
+        if not self.adaptive:
+            return grid if len(grid) <= self.max_tiles else self._rotate(grid, self.max_tiles)
+
+        scores = self._motion_scores(prepared, grid)
+        if recent is not None and len(recent):
+            boxes = recent.xyxy
+            pad = (boxes[:, 2:] - boxes[:, :2]) * self.margin
+            expanded = np.concatenate([boxes[:, :2] - pad, boxes[:, 2:] + pad], axis=1)
+            # 与任一 (外扩后的) 最近检测框相交的切块
+            scores = scores + (box_ios(grid, expanded) > 0).sum(axis=1)
+        chosen = np.flatnonzero(scores > 0)
+        chosen = chosen[np.argsort(-scores[chosen])][:max(self.max_tiles - self.scan_tiles, 0)]
+        scan = self._rotate(np.arange(len(grid)), self.scan_tiles)
+        return grid[np.union1d(chosen, scan)]
+
+    def _rotate(self, items, count):
+        """轮换取出 count 项，多帧之后覆盖全部"""
+        count = min(count, len(items))
+        index = (self._scan_cursor + np.arange(count)) % len(items)
+        self._scan_cursor = (self._scan_cursor + count) % len(items)
+        return items[index]
+
+    def prepare(self, prepared, imgsz, recent=None):
+        """
+        生成本帧的 batch 输入
+        :param recent: 最近一次检测结果 (原图坐标)，adaptive 模式据此选块
+        :return: (图像列表, 计划)；计划与图像一一对应，None 表示整帧
+        """
+        images, plan = [], []
+        if self.include_full:
+            images.append(prepared.letterbox(imgsz)[0])
+            plan.append(None)
+        for x0, y0, x1, y1 in self.select(prepared, recent).tolist():
+            image, scale, (left, top) = letterbox(prepared.image[y0:y1, x0:x1], imgsz)
+            images.append(image)
+            plan.append((x0 - left / scale, y0 - top / scale, scale))
+        self.tile_counts.append(len(plan) - self.include_full)
+        self.tiles_total += self.tile_counts[-1]
+        self.frames += 1
+        return images, plan
+
+    def merge(self, prepared, results, plan, imgsz):
+        """各切块 / 整帧的结果映射回原图坐标，跨块合并 (同类别 IoS NMS)"""
+        h, w = prepared.shape[:2]
+        parts = []
+        for detections, entry in zip(results, plan):
+            if entry is None:
+                parts.append(prepared.map_detections(detections, imgsz))
+                continue
+            offset_x, offset_y, scale = entry
+            xyxy = detections.xyxy / scale + (offset_x, offset_y, offset_x, offset_y)
+            np.clip(xyxy, 0, (w, h, w, h), out=xyxy)
+            parts.append(Detections(xyxy, detections.cls, detections.conf, names=detections.names))
+        merged = Detections.concat(parts)
+        keep = nms(merged.xyxy, merged.conf, self.merge_threshold, merged.cls, metric='ios')
+        return merged[keep]
+
+    def describe(self):
+        tiles = sum(self.tile_counts) / len(self.tile_counts) if self.tile_counts else 0
+        mode = 'adaptive' if self.adaptive else 'grid'
+        return f"Tiles: {tiles:.1f}/frame ({self.tile_size}px {mode})"
+
+
+class LoadScheduler:
+    """
+    自适应负载调度器
+    每个周期根据实际输出帧率、端到端延迟和丢帧情况，在给定范围内调整
+    OCR间隔、YOLO帧间隔和YOLO输入尺寸：过载时依次降级，持续空闲时按相反顺序恢复。
+    OCR 自身积压 (请求被拒) 只拉长OCR间隔，不影响 YOLO 的降级；
+    固定输入尺寸的导出模型 (torchscript / engine) 不调整输入尺寸。
+    """
+    IMGSZ_STEPS = (320, 384, 448, 512, 576, 640, 768, 960, 1280)
+
+    def __init__(self, target_fps=20.0, target_latency=0.2, min_imgsz=320, max_imgsz=640,
+                 max_yolo_stride=4, max_ocr_interval=5.0, period=1.0, patience=3):
+        self.target_fps = target_fps
+        self.target_latency = target_latency  # 秒
+        self.imgsz_steps = [s for s in self.IMGSZ_STEPS if min_imgsz <= s <= max_imgsz] or [max_imgsz]
+        self.max_yolo_stride = max(1, max_yolo_stride)
+        self.max_ocr_interval = max_ocr_interval
+        self.period = period
+        self.patience = patience  # 连续空闲多少个周期后才恢复
+
+        self.min_ocr_interval = None  # 首次调度时取当前值
+        self.decision = "init"
+        self._last_time = None
+        self._last_counts = None
+        self._idle_periods = 0
+
+    def _ocr_interval(self, detector):
+        return detector.region_ocr.interval if detector.region_ocr is not None else detector.ocr_interval
+
+    def _set_ocr_interval(self, detector, value):
+        if detector.region_ocr is not None:
+            detector.region_ocr.interval = value
         else:
-            # 对于 RTSP，稍微做一下缓冲区优化（可选）
-            # 读取实际流的分辨率用于显示信息
-            w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            print(f"✅ RTSP流已连接 (分辨率: {w}x{h})")
+            detector.ocr_interval = value
+
+    def _imgsz_index(self, detector):
+        sizes = np.array(self.imgsz_steps)
+        return int(np.abs(sizes - detector.yolo_imgsz).argmin())
+
+    def _resizable(self, detector):
+        """后端是否支持改变输入尺寸 (固定输入尺寸的导出模型 rect=False)"""
+        backend = detector.yolo if detector.yolo is not None else getattr(detector.yolo_engine, 'yolo', None)
+        return backend is not None and backend.rect
+
+    def _slow_ocr(self, detector):
+        """拉长OCR间隔；已到上限时返回 None"""
+        interval = self._ocr_interval(detector)
+        if interval < self.max_ocr_interval:
+            self._set_ocr_interval(detector, min(interval * 1.5, self.max_ocr_interval))
+            return "ocr+"
+        return None
+
+    def _degrade(self, detector):
+        """过载：先拉长OCR间隔，再加大YOLO帧间隔，最后缩小YOLO输入尺寸"""
+        decision = self._slow_ocr(detector)
+        if decision is not None:
+            return decision
+        if detector.yolo_stride < self.max_yolo_stride:
+            detector.yolo_stride += 1
+            return "stride+"
+        index = self._imgsz_index(detector)
+        if index > 0 and self._resizable(detector):
+            detector.yolo_imgsz = self.imgsz_steps[index - 1]
+            return "imgsz-"
+        return "max"
+
+    def _upgrade(self, detector):
+        """空闲：按相反顺序恢复"""
+        index = self._imgsz_index(detector)
+        if index < len(self.imgsz_steps) - 1 and self._resizable(detector):
+            detector.yolo_imgsz = self.imgsz_steps[index + 1]
+            return "imgsz+"
+        if detector.yolo_stride > 1:
+            detector.yolo_stride -= 1
+            return "stride-"
+        interval = self._ocr_interval(detector)
+        if interval > self.min_ocr_interval:
+            self._set_ocr_interval(detector, max(interval / 1.5, self.min_ocr_interval))
+            return "ocr-"
+        return "idle"
+
+    def maybe_step(self, detector, now=None):
+        """在渲染循环中调用，每个周期做一次决策"""
+        now = time.time() if now is None else now
+        counts = (detector.capture_count, detector.frame_count,
+                  detector.dropped['display'], detector.dropped['ocr'])
+        if self._last_time is None:
+            self.min_ocr_interval = self._ocr_interval(detector)
+            self._last_time, self._last_counts = now, counts
+            return
+        elapsed = now - self._last_time
+        if elapsed < self.period:
+            return
 
-        print("✅ 视频源初始化完成")
+        captured, displayed, display_drops, ocr_drops = (
+            (c - l) for c, l in zip(counts, self._last_counts))
+        self._last_time, self._last_counts = now, counts
+
+        # 输出帧率不可能超过采集帧率
+        target_fps = min(self.target_fps, captured / elapsed * 0.95)
+        output_fps = displayed / elapsed
+        latency = (sum(detector.latency_deque) / len(detector.latency_deque)
+                   if detector.latency_deque else 0)
+
+        overloaded = (output_fps < target_fps * 0.9 or latency > self.target_latency
+                      or display_drops > 0)
+        if overloaded:
+            self._idle_periods = 0
+            self.decision = self._degrade(detector)
+        elif ocr_drops > 0:
+            # 只有 OCR 跟不上：放慢OCR节奏，YOLO 和渲染不受影响
+            self._idle_periods = 0
+            self.decision = self._slow_ocr(detector) or "hold"
+        elif latency < self.target_latency * 0.5:
+            self._idle_periods += 1
+            if self._idle_periods >= self.patience:
+                self._idle_periods = 0
+                self.decision = self._upgrade(detector)
+        else:
+            self._idle_periods = 0
+            self.decision = "hold"
+
+    def describe(self, detector):
+        """信息面板上显示的当前决策"""
+        return (f"Sched: {detector.yolo_imgsz}px s{detector.yolo_stride} "
+                f"ocr {self._ocr_interval(detector):.1f}s [{self.decision}]")
+
+
+def build_ffmpeg_command(rtsp_url, width, height, fps=25, pix_fmt='bgr24'):
+    """推流用 FFmpeg 命令 (从标准输入读取原始帧，libx264 编码后推 RTSP)"""
+    # 注意：这里加上了 -bf 0 和 -profile:v baseline 以完美兼容 WebRTC
+    return [
+        'ffmpeg',
+        '-y', '-an',
+        '-f', 'rawvideo',
+        '-vcodec', 'rawvideo',
+        '-pix_fmt', pix_fmt,  # OpenCV 默认是 bgr24，也可在进程内预转 yuv420p
+        '-s', f"{width}x{height}",  # 动态获取宽高
+        '-r', str(fps),  # 帧率
+        '-i', '-',  # 从标准输入读取
+        '-c:v', 'libx264',
+        '-pix_fmt', 'yuv420p',
+        '-preset', 'ultrafast',
+        '-tune', 'zerolatency',
+        '-profile:v', 'baseline',  # 关键：兼容 WebRTC
+        '-bf', '0',  # 关键：去 B 帧
+    ] + (['-f', 'null', '-'] if rtsp_url == 'null' else  # 只编码不输出 (基准测试用)
+         ['-rtsp_transport', 'tcp', '-f', 'rtsp', rtsp_url])
+
+
+def build_ffmpeg_copy_command(source, rtsp_url):
+    """原始流直接转发 (-c copy，不解码不重新编码)"""
+    command = ['ffmpeg']
+    if str(source).startswith('rtsp://'):
+        command += ['-rtsp_transport', 'tcp']  # 只有 RTSP 输入认这个选项，文件/http/rtmp 输入会报错
+    return command + [
+        '-i', str(source),
+        '-an',
+        '-c', 'copy',
+        '-rtsp_transport', 'tcp',
+        '-f', 'rtsp',
+        rtsp_url
+    ]
+
+
+def build_ffmpeg_segment_command(source, pattern, list_path, segment_time=1.0, start_number=0):
+    """
+    源码流 -c copy 切成按序号命名的短分段 (事件录像的预录环形缓冲)
+    每写完一个分段，在 list_path (csv) 追加一行: 文件名,开始时间,结束时间 (流时间，秒)
+    """
+    command = ['ffmpeg', '-loglevel', 'error']
+    if str(source).startswith('rtsp://'):
+        command += ['-rtsp_transport', 'tcp']
+    return command + [
+        '-i', str(source),
+        '-an',
+        '-c', 'copy',
+        '-f', 'segment',
+        '-segment_time', str(segment_time),  # 只能在关键帧处切，实际分段长度不小于 GOP
+        '-segment_format', 'matroska',
+        '-reset_timestamps', '1',
+        '-segment_start_number', str(start_number),
+        '-segment_list', list_path,
+        '-segment_list_type', 'csv',
+        pattern
+    ]
+
+
+def build_ffmpeg_concat_command(list_path, output):
+    """按列表拼接分段 (-c copy，不重新编码)"""
+    return ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+            '-i', list_path, '-c', 'copy', output]
+
+
+class _MetadataClient:
+    """元数据客户端的待发送消息：视频流 -> 最新一行"""
+    def __init__(self):
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+
+class MetadataPublisher:
+    """
+    检测元数据 WebSocket 推送 (每帧一行 JSON，沿用 WebSocketServer.py 的 asyncio/websockets 写法)
+    叠加层由前端在原始视频上自行绘制，服务端不再把检测框画进像素、也不再重新编码。
+    每个客户端按视频流各保留最新一条待发送消息：慢客户端不会积压，也不会拖住检测循环，
+    多路时某一路的更新也不会被其它路顶掉。
+    """
+    def __init__(self, host="0.0.0.0", port=8766):
+        self.host = host
+        self.port = port
+        self._clients = set()
+        self._loop = None
+        self._stop_event = None
+        self._thread = None
+        self._ready = Condition()
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    def start(self):
+        self._thread = Thread(target=self._run_loop, daemon=True, name="MetadataWS")
+        with self._ready:
+            self._thread.start()
+            self._ready.wait(timeout=5.0)
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._serve())
+        finally:
+            self._loop.close()
+
+    async def _serve(self):
+        import websockets
 
-        # YOLO模型
-        print(f"📦 加载YOLO模型: {yolo_model}")
-        self.yolo = YOLO(yolo_model)
-        self.yolo.fuse()
-        print("✅ YOLO模型已加载")
+        self._stop_event = asyncio.Event()
+        async with websockets.serve(self._handler, self.host, self.port,
+                                    ping_interval=20, ping_timeout=40):
+            print(f"✅ 元数据推送已启动: ws://{self.host}:{self.port}")
+            with self._ready:
+                self._ready.notify_all()
+            await self._stop_event.wait()
 
-        # PaddleOCR - 延迟初始化
+    async def _handler(self, websocket, path=None):
+        import websockets
+
+        print(f"🔗 元数据客户端已连接: {websocket.remote_address}")
+        client = _MetadataClient()
+        self._clients.add(client)
+        try:
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                lines, client.pending = client.pending, {}
+                for line in lines.values():
+                    await websocket.send(line)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._clients.discard(client)
+            print(f"🔌 元数据客户端已断开: {websocket.remote_address}")
+
+    def _broadcast(self, stream, line):
+        for client in self._clients:
+            if stream in client.pending:
+                self.dropped += 1  # 同一路只保留最新一帧的元数据
+            client.pending[stream] = line
+            client.ready.set()
+
+    def publish(self, message):
+        """线程安全：序列化一次后广播给所有客户端"""
+        if self._loop is None or not self._clients:
+            return
+        line = json.dumps(message, ensure_ascii=False, separators=(',', ':')) + '\n'
+        self._loop.call_soon_threadsafe(self._broadcast, message.get('stream'), line)
+        self.published += 1
+
+    def close(self):
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+
+def rendition_url(rtsp_url, height):
+    """推流阶梯中低分辨率输出的地址: rtsp://host:8554/cam0 -> rtsp://host:8554/cam0_720p"""
+    if rtsp_url == 'null':
+        return rtsp_url
+    base, sep, query = rtsp_url.partition('?')
+    return f"{base}_{height}p{sep}{query}"
+
+
+class _Rendition:
+    """推流阶梯中的一路输出：独立的 FFmpeg 进程、写入线程和待写入队列"""
+    def __init__(self, url, width, height, yuv420):
+        self.url = url
+        self.width = width
+        self.height = height
+        self.name = f"{height}p"
+        # yuv420p 需要偶数宽高，数据量只有 bgr24 的一半
+        self.yuv420 = yuv420 and width % 2 == 0 and height % 2 == 0
+        self.pipe = None
+        self.started = False
+        self.pending = deque()  # 待写入 [(序号, 共享帧缓冲, 采集时间戳)]
+        self.thread = None
+        self._scaled = None
+        self._yuv_buffer = None
+
+        # 统计
+        self.written = 0
+        self.dropped = 0
+        self.restarts = 0
+        self.bytes_written = 0
+
+
+class FFmpegWriter:
+    """
+    非阻塞推流写入线程
+    渲染循环从写入器借一块帧缓冲直接在上面绘制，提交后由独立线程写入 FFmpeg 管道，
+    编码器或 RTSP 服务器变慢时只会按策略丢帧，不会拖住采集和渲染。
+    管道断开时自动重启 FFmpeg。
+    drop_policy: 'oldest' 丢弃队列中最旧的帧 / 'newest' 丢弃当前帧 / 'block' 等待
+
+    ladder: 额外输出的高度列表 (例如 [720, 360])，与原分辨率输出组成推流阶梯。
+    同一块绘制好的帧缓冲按引用计数被各路共享 (不按路复制)，每路在自己的写入线程中
+    每帧缩放一次后写入各自的 FFmpeg 进程；某一路变慢或断开只影响这一路。
+    fps: 编码帧率；None 表示先测量 fps_window 秒内实际提交的帧率，再启动编码器
+    command_factory: (地址, 宽, 高, 帧率, 像素格式) -> 命令行，默认 build_ffmpeg_command (测试时可换成慢速桩)
+    """
+    def __init__(self, rtsp_url, width, height, fps=None, queue_size=2,
+                 drop_policy='oldest', yuv420=False, restart_delay=1.0, stats=None,
+                 ladder=(), fps_window=1.0, command_factory=build_ffmpeg_command):
+        if drop_policy not in ('oldest', 'newest', 'block'):
+            raise ValueError(f"未知的丢帧策略: {drop_policy}")
+        self.rtsp_url = rtsp_url
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self._auto_fps = fps is None
+        self.fps_window = fps_window
+        self.queue_size = max(1, queue_size)
+        self.drop_policy = drop_policy
+        self.restart_delay = restart_delay
+        self.stats = stats  # StageStats，记录 encode 阶段耗时
+        self.command_factory = command_factory
+
+        self.renditions = [_Rendition(rtsp_url, width, height, yuv420)]
+        for rendition_height in sorted({h - h % 2 for h in ladder}, reverse=True):
+            if 0 < rendition_height < height:
+                rendition_width = max(2, round(width * rendition_height / height / 2) * 2)
+                self.renditions.append(_Rendition(rendition_url(rtsp_url, rendition_height),
+                                                  rendition_width, rendition_height, yuv420))
+
+        self.running = False
+        self._cond = Condition()
+        self._free = []           # 空闲帧缓冲
+        self._refs = {}           # id(帧缓冲) -> 尚未写完它的输出数
+        self._sequence = 0
+        self._submit_times = deque()  # 测量实际帧率用
+        self._allocated = 0
+        # 队列 + 各路正在写入 + 正在绘制
+        self._max_buffers = self.queue_size + len(self.renditions) + 1
+        self.write_ms = deque(maxlen=30)
+        self.blocked_seconds = 0.0  # 'block' 策略下 submit 等待队列空位的累计时间
+
+    # 汇总统计 (written 以原分辨率输出为准，其余为各路之和)
+    @property
+    def written(self):
+        return self.renditions[0].written
+
+    @property
+    def dropped(self):
+        return sum(r.dropped for r in self.renditions)
+
+    @property
+    def restarts(self):
+        return sum(r.restarts for r in self.renditions)
+
+    @property
+    def bytes_written(self):
+        return sum(r.bytes_written for r in self.renditions)
+
+    @property
+    def queue_depth(self):
+        return max(len(r.pending) for r in self.renditions)
+
+    def _start_process(self, rendition):
+        rendition.started = True
+        pix_fmt = 'yuv420p' if rendition.yuv420 else 'bgr24'
+        command = self.command_factory(rendition.url, rendition.width, rendition.height, self.fps, pix_fmt)
+        try:
+            rendition.pipe = subprocess.Popen(command, stdin=subprocess.PIPE)
+            print(f"✅ 推流管道建立成功 ({rendition.name}, {pix_fmt}, {self.fps}fps)")
+        except Exception as e:
+            print(f"❌ FFmpeg启动失败: {e}")
+            rendition.pipe = None
+
+    def _stop_process(self, rendition):
+        if rendition.pipe is None:
+            return
+        try:
+            rendition.pipe.stdin.close()
+        except Exception:
+            pass
+        try:
+            rendition.pipe.wait(timeout=2.0)
+        except subprocess.TimeoutExpired:
+            rendition.pipe.kill()
+        rendition.pipe = None
+
+    def start(self):
+        self.running = True
+        for rendition in self.renditions:
+            print(f"📺 正在连接推流服务器: {rendition.url} ({rendition.width}x{rendition.height})")
+            rendition.thread = Thread(target=self._worker, args=(rendition,), daemon=True,
+                                      name=f"FFmpegWriter-{rendition.name}")
+            rendition.thread.start()
+
+    def _measure_fps(self):
+        """最近 fps_window 秒内实际提交的帧率 (即渲染循环的真实输出帧率)"""
+        times = self._submit_times
+        if len(times) < 2 or times[-1] - times[0] < self.fps_window:
+            return None
+        return round(min(max((len(times) - 1) / (times[-1] - times[0]), 1.0), 120.0), 2)
+
+    def _unref(self, buffer):
+        """一路输出用完了共享帧缓冲；所有输出都用完后放回空闲列表"""
+        key = id(buffer)
+        self._refs[key] -= 1
+        if self._refs[key] == 0:
+            del self._refs[key]
+            self._free.append(buffer)
+            self._cond.notify_all()
+
+    def _drop_oldest(self):
+        """从各路队列中撤下最旧的一帧，只有它因此被释放时才撤 (正在被某路写入的帧不动)"""
+        fronts = [r for r in self.renditions if r.pending]
+        if not fronts:
+            return False
+        sequence = min(r.pending[0][0] for r in fronts)
+        holders = [r for r in fronts if r.pending[0][0] == sequence]
+        if self._refs[id(holders[0].pending[0][1])] != len(holders):
+            return False
+        for rendition in holders:
+            rendition.dropped += 1
+            self._unref(rendition.pending.popleft()[1])
+        return True
+
+    def acquire(self):
+        """借一块帧缓冲用于绘制；按 'newest' 策略丢帧时返回 None"""
+        with self._cond:
+            while True:
+                if self._free:
+                    return self._free.pop()
+                if self._allocated < self._max_buffers:
+                    self._allocated += 1
+                    return np.empty((self.height, self.width, 3), dtype=np.uint8)
+                if self.drop_policy == 'oldest' and self._drop_oldest():
+                    continue
+                if self.drop_policy == 'newest':
+                    for rendition in self.renditions:
+                        rendition.dropped += 1
+                    return None
+                self._cond.wait(timeout=0.1)
+                if not self.running:
+                    return None
+
+    def submit(self, buffer, capture_time=None):
+        """提交已绘制好的帧缓冲 (各路共享同一块缓冲)；'block' 策略下等到各路队列都有空位，其余策略立即返回"""
+        with self._cond:
+            now = time.time()
+            times = self._submit_times
+            times.append(now)
+            while len(times) > 2 and now - times[1] >= self.fps_window:
+                times.popleft()
+            if self.fps is None:
+                self.fps = self._measure_fps()
+                if self.fps is None:
+                    # 还在测量帧率，编码器尚未启动
+                    self._free.append(buffer)
+                    return False
+                print(f"⏱️ 实测输出帧率: {self.fps} fps")
+
+            if self.drop_policy == 'block':
+                # 只有本线程往队列里放帧，等到的空位不会被别人占掉
+                start_time = time.time()
+                while self.running and any(len(r.pending) >= self.queue_size for r in self.renditions):
+                    self._cond.wait(timeout=0.1)
+                self.blocked_seconds += time.time() - start_time
+                if not self.running:
+                    self._free.append(buffer)
+                    return False
+
+            self._sequence += 1
+            accepted = 0
+            for rendition in self.renditions:
+                if len(rendition.pending) >= self.queue_size:
+                    rendition.dropped += 1
+                    if self.drop_policy == 'newest':
+                        continue
+                    self._unref(rendition.pending.popleft()[1])
+                rendition.pending.append((self._sequence, buffer, capture_time))
+                accepted += 1
+            if accepted == 0:
+                self._free.append(buffer)
+                return False
+            self._refs[id(buffer)] = accepted
+            self._cond.notify_all()
+            return True
+
+    def release(self, buffer):
+        """归还未提交的帧缓冲"""
+        with self._cond:
+            self._free.append(buffer)
+            self._cond.notify_all()
+
+    def _write(self, rendition, buffer):
+        image = buffer
+        if rendition.height != buffer.shape[0] or rendition.width != buffer.shape[1]:
+            # 每路每帧只缩放一次 (在本路写入线程中，cv2 释放 GIL，各路并行)
+            rendition._scaled = cv2.resize(buffer, (rendition.width, rendition.height),
+                                           dst=rendition._scaled, interpolation=cv2.INTER_AREA)
+            image = rendition._scaled
+        if rendition.yuv420:
+            rendition._yuv_buffer = cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420, dst=rendition._yuv_buffer)
+            image = rendition._yuv_buffer
+        # 直接写入数组内存，不经过 tobytes() 复制
+        rendition.pipe.stdin.write(memoryview(image).cast('B'))
+        rendition.bytes_written += image.nbytes
+
+    def _worker(self, rendition):
+        print(f"🧵 推流写入线程已启动 ({rendition.name})")
+
+        while self.running:
+            with self._cond:
+                if not rendition.pending:
+                    self._cond.wait(timeout=0.1)
+                    continue
+                _, buffer, capture_time = rendition.pending.popleft()
+
+            try:
+                if rendition.pipe is None:
+                    if rendition.started:
+                        # 管道断开：等待一段时间后按当前实测帧率重启 FFmpeg
+                        time.sleep(self.restart_delay)
+                        rendition.restarts += 1
+                        if self._auto_fps:
+                            with self._cond:
+                                self.fps = self._measure_fps() or self.fps
+                        print(f"🔁 重启推流管道 {rendition.name} (第 {rendition.restarts} 次)")
+                    self._start_process(rendition)
+                    if rendition.pipe is None:
+                        continue
+                start_time = time.time()
+                self._write(rendition, buffer)
+                elapsed = time.time() - start_time
+                self.write_ms.append(elapsed * 1000)
+                if self.stats is not None:
+                    self.stats.record('encode', elapsed)
+                rendition.written += 1
+            except (BrokenPipeError, OSError, ValueError) as e:
+                print(f"⚠️ 推流中断 ({rendition.name}): {e}")
+                self._stop_process(rendition)
+            finally:
+                with self._cond:
+                    self._unref(buffer)
+
+        print(f"🛑 推流写入线程已停止 ({rendition.name})")
+
+    def close(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        for rendition in self.renditions:
+            if rendition.thread is not None:
+                rendition.thread.join(timeout=2.0)
+            self._stop_process(rendition)
+
+
+class EventRules:
+    """
+    事件录像触发规则
+    'class:person'      检测到该类别
+    'class:person@0.6'  检测到该类别且置信度不低于 0.6
+    'text:京A'          OCR 文字包含关键词 (不区分大小写)
+    """
+    def __init__(self, specs):
+        self.classes = {}   # 类名 -> 最低置信度
+        self.keywords = []
+        for spec in specs:
+            kind, _, value = spec.partition(':')
+            if kind == 'class' and value:
+                name, _, conf = value.partition('@')
+                self.classes[name] = float(conf) if conf else 0.0
+            elif kind == 'text' and value:
+                self.keywords.append(value.casefold())
+            else:
+                raise ValueError(f"未知的录像触发规则: {spec}")
+
+    def match(self, detections, ocr_results):
+        """返回命中的规则 (空列表 = 未触发)"""
+        hits = []
+        if self.classes and len(detections):
+            for cls, conf in zip(detections.cls.tolist(), detections.conf.tolist()):
+                name = detections.class_name(cls)
+                threshold = self.classes.get(name)
+                if threshold is not None and conf >= threshold and f"class:{name}" not in hits:
+                    hits.append(f"class:{name}")
+        if self.keywords:
+            for ocr in ocr_results:
+                text = ocr['text'].casefold()
+                for keyword in self.keywords:
+                    if keyword in text and f"text:{keyword}" not in hits:
+                        hits.append(f"text:{keyword}")
+        return hits
+
+
+class ClipRecorder:
+    """
+    事件录像：始终保留最近 pre_seconds 秒的画面，规则命中时在后台写出
+    [事件前 pre_seconds, 最后一次命中后 post_seconds] 的片段；持续命中会延长同一片段 (最长 max_clip 秒)。
+    环形缓冲按 max_bytes 封顶，超出时先丢最旧的数据。
+
+    mode:
+    'packets' 网络流：后台 FFmpeg 把源码流 -c copy 切成约 segment_time 秒的分段放在 spool 目录，
+              片段由分段直接拼接，不解码也不重新编码 (起点对齐到关键帧)
+    'frames'  USB 摄像头 / 本地文件等无法按实时转发码流的源：采集到的帧在后台线程压成 JPEG
+              放入内存环形缓冲，写片段时再编码成 mp4
+    'auto'    网络流用 packets (需要 ffmpeg)，其余用 frames
+    采集线程只调用 push()，渲染循环只调用 check()，两者都只做入队和赋值，不做 IO、不等待。
+    """
+    def __init__(self, rules, output_dir='recordings', pre_seconds=5.0, post_seconds=5.0,
+                 max_clip=60.0, max_bytes=256 * 1024 * 1024, mode='auto', segment_time=1.0,
+                 jpeg_quality=85):
+        if mode not in ('auto', 'packets', 'frames'):
+            raise ValueError(f"未知的录像缓冲方式: {mode}")
+        self.rules = rules
+        self.output_dir = output_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_clip = max_clip
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.segment_time = segment_time
+        self.jpeg_quality = jpeg_quality
+
+        self.name = "cam0"
+        self.running = False
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._thread = None
+        self._clip = None             # 当前片段 {'start', 'end', 'event_time', 'reasons', 'snapshot', ...}
+        self._closed = []             # 达到最长时长、被新片段顶替但尚未写出的片段
+        self._writers = []            # frames 模式的片段写入线程
+
+        # frames 模式
+        self._incoming = deque(maxlen=4)  # 采集线程交来的 (PreparedFrame, 时间戳)，编码跟不上时丢最旧的
+        self._ring = deque()              # (时间戳, JPEG)
+
+        # packets 模式
+        self.source = None
+        self.spool_dir = None
+        self._segmenter = None
+        self._list_path = None
+        self._list_offset = 0         # 分段列表已读取到的位置
+        self._segment_info = {}       # 已写完的分段路径 -> (墙上时间开始, 结束)
+        self._clock_offsets = deque(maxlen=30)  # 发现分段写完的时间 - 分段结束的流时间
+        self._next_segment = 0
+
+        # 统计
+        self.events = 0
+        self.clips = 0
+        self.dropped = 0
+        self.buffer_bytes = 0
+        self.last_clip = None
+
+    @property
+    def recording(self):
+        return self._clip is not None
+
+    def start(self, source, name="cam0"):
+        self.name = name
+        self.source = source
+        if self.mode == 'auto':
+            network = '://' in str(source)
+            self.mode = 'packets' if network and shutil.which('ffmpeg') else 'frames'
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.running = True
+        if self.mode == 'packets':
+            self.spool_dir = os.path.join(self.output_dir, f".spool_{name}")
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+            os.makedirs(self.spool_dir)
+            self._start_segmenter()
+        target = self._packets_worker if self.mode == 'packets' else self._frames_worker
+        self._thread = Thread(target=target, daemon=True, name=f"Recorder-{name}")
+        self._thread.start()
+        print(f"🎥 事件录像已启用 [{name}] ({self.mode}, 预录 {self.pre_seconds:.0f}s, "
+              f"缓冲上限 {self.max_bytes / 1024 / 1024:.0f}MB) -> {self.output_dir}")
+
+    def push(self, prepared, timestamp):
+        """采集线程调用：frames 模式下把帧交给后台编码 (只保存引用，PreparedFrame 不可变)"""
+        if self.mode != 'frames' or not self.running:
+            return
+        if len(self._incoming) == self._incoming.maxlen:
+            self.dropped += 1
+        self._incoming.append((prepared, timestamp))
+        self._wakeup.set()
+
+    def check(self, detections, ocr_results, prepared, timestamp):
+        """渲染循环调用：按规则判断本帧是否触发 (命中时开始或延长片段)"""
+        if not self.running:
+            return []
+        hits = self.rules.match(detections, ocr_results)
+        if not hits:
+            return hits
+        with self._lock:
+            clip = self._clip
+            if clip is not None and clip['end'] >= timestamp and timestamp - clip['start'] < self.max_clip:
+                clip['end'] = timestamp + self.post_seconds
+                clip['reasons'].update(hits)
+                return hits
+            start = timestamp - self.pre_seconds
+            if clip is not None:
+                # 上一个片段已到最长时长：就地结束，新片段从它的结尾接上
+                clip['end'] = min(clip['end'], timestamp)
+                start = max(start, clip['end'])
+                self._closed.append(clip)
+            self.events += 1
+            self._clip = {'id': self.events, 'start': start, 'end': timestamp + self.post_seconds,
+                          'event_time': timestamp, 'reasons': set(hits), 'snapshot': prepared,
+                          'frames': None, 'bytes': 0}
+        print(f"🔔 录像事件 [{self.name}]: {', '.join(hits)}")
+        self._wakeup.set()
+        return hits
+
+    def _clip_path(self, clip, extension):
+        """同一秒内的多个事件靠毫秒和事件序号区分，不会互相覆盖"""
+        event_time = clip['event_time']
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(event_time))
+        millis = int(event_time * 1000) % 1000
+        return os.path.join(self.output_dir, f"{self.name}_{stamp}-{millis:03d}_{clip['id']:04d}.{extension}")
+
+    def _finish(self, clip, path, duration):
+        """片段写出后：保存触发帧截图并打印"""
+        cv2.imwrite(os.path.splitext(path)[0] + '.jpg', clip['snapshot'].image)
+        self.clips += 1
+        self.last_clip = path
+        print(f"🎞️ 事件录像已保存: {path} ({duration:.1f}s, {', '.join(sorted(clip['reasons']))})")
+
+    def _take_finished(self, ready):
+        """取出已结束且 ready(片段) 为真 (覆盖它的数据都已就绪) 的片段，包括被新片段顶替的"""
+        with self._lock:
+            finished, waiting = [], []
+            for clip in self._closed:
+                (finished if ready(clip) else waiting).append(clip)
+            self._closed = waiting
+            clip = self._clip
+            if clip is not None and ready(clip):
+                finished.append(clip)
+                self._clip = None
+            return finished
+
+    # ---------- frames 模式 ----------
+
+    def _frames_worker(self):
+        while self.running:
+            self._wakeup.wait(timeout=0.2)
+            self._wakeup.clear()
+            self._drain_frames()
+            latest = self._ring[-1][0] if self._ring else time.time()
+            for clip in self._take_finished(lambda c: latest > c['end']):
+                self._write_frames_clip(clip)
+        self._drain_frames()
+        for clip in self._take_finished(lambda c: True):
+            self._write_frames_clip(clip)
+        for writer in self._writers:
+            writer.join(timeout=10.0)
+
+    def _drain_frames(self):
+        while self._incoming:
+            prepared, timestamp = self._incoming.popleft()
+            ok, jpeg = cv2.imencode('.jpg', prepared.image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                continue
+            self._ring.append((timestamp, jpeg))
+            self.buffer_bytes += jpeg.nbytes
+            with self._lock:
+                clip = self._clip
+                if clip is not None:
+                    if clip['frames'] is None:
+                        # 新片段：从环形缓冲里取出事件前的帧 (共享 JPEG，不复制)
+                        clip['frames'] = [item for item in self._ring if item[0] >= clip['start']]
+                        clip['bytes'] = sum(item[1].nbytes for item in clip['frames'])
+                    elif timestamp >= clip['start']:
+                        clip['frames'].append((timestamp, jpeg))
+                        clip['bytes'] += jpeg.nbytes
+                    if clip['bytes'] > self.max_bytes:
+                        clip['end'] = timestamp  # 单个片段也不超过内存上限
+            # 只保留 pre_seconds 内的帧，且总大小不超过上限
+            while self._ring and (self.buffer_bytes > self.max_bytes
+                                  or self._ring[0][0] < timestamp - self.pre_seconds):
+                self.buffer_bytes -= self._ring.popleft()[1].nbytes
+
+    def _write_frames_clip(self, clip):
+        frames = [item for item in clip['frames'] or [] if item[0] <= clip['end']]
+        if len(frames) < 2:
+            return
+        writer = Thread(target=self._encode_frames, args=(clip, frames), daemon=True,
+                        name=f"ClipWriter-{self.name}")
+        writer.start()
+        self._writers = [w for w in self._writers if w.is_alive()] + [writer]
+
+    def _encode_frames(self, clip, frames):
+        duration = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / max(duration, 1e-3)
+        path = self._clip_path(clip, 'mp4')
+        height, width = clip['snapshot'].shape[:2]
+        video = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+        try:
+            for _, jpeg in frames:
+                image = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+                if image.shape[:2] == (height, width):
+                    video.write(image)
+        finally:
+            video.release()
+        self._finish(clip, path, duration)
+
+    # ---------- packets 模式 ----------
+
+    def _start_segmenter(self):
+        # 上一个进程没写完的分段不在列表里，直接删掉；新进程的序号接着往下编，不会覆盖已有分段
+        for entry in os.scandir(self.spool_dir):
+            if entry.path not in self._segment_info:
+                os.remove(entry.path)
+        self._list_path = os.path.join(self.spool_dir, f"segments_{self._next_segment}.csv")
+        self._list_offset = 0
+        self._clock_offsets.clear()  # 新进程的流时间从头开始
+        pattern = os.path.join(self.spool_dir, 'seg_%06d.mkv')
+        try:
+            self._segmenter = subprocess.Popen(
+                build_ffmpeg_segment_command(self.source, pattern, self._list_path,
+                                             self.segment_time, self._next_segment),
+                stdin=subprocess.DEVNULL)
+        except Exception as e:
+            print(f"❌ 录像分段 FFmpeg 启动失败: {e}")
+            self._segmenter = None
+
+    def _read_segment_list(self):
+        """
+        读取分段列表中新写完的分段，流时间换算成墙上时间
+        发现一个分段写完的时刻一定不早于它真正写完的时刻，最近若干个分段中的最小差值
+        就是流时间到墙上时间的偏移 (启动时积压数据突发到达的那几个分段会很快移出窗口)
+        """
+        try:
+            with open(self._list_path, 'rb') as f:
+                f.seek(self._list_offset)
+                data = f.read()
+        except OSError:
+            return
+        complete = data.rfind(b'\n') + 1  # 只处理完整的行
+        self._list_offset += complete
+        now = time.time()
+        for line in data[:complete].decode('utf-8', errors='ignore').splitlines():
+            name, _, times = line.partition(',')
+            try:
+                start, end = (float(value) for value in times.split(','))
+            except ValueError:
+                continue
+            self._clock_offsets.append(now - end)
+            offset = min(self._clock_offsets)
+            path = os.path.join(self.spool_dir, os.path.basename(name))
+            self._segment_info[path] = (start + offset, end + offset)
+            number = os.path.basename(name)[4:-4]
+            if number.isdigit():
+                self._next_segment = max(self._next_segment, int(number) + 1)
+
+    def _segments(self):
+        """已写完的分段 [(开始时间, 结束时间, 路径, 字节数)]，按时间排序"""
+        segments = []
+        for path, (start, end) in list(self._segment_info.items()):
+            try:
+                segments.append((start, end, path, os.path.getsize(path)))
+            except OSError:
+                del self._segment_info[path]
+        segments.sort()
+        return segments
+
+    def _spool_bytes(self):
+        """spool 目录总大小 (包括正在写入的分段)"""
+        return sum(entry.stat().st_size for entry in os.scandir(self.spool_dir)
+                   if entry.name.startswith('seg_'))
+
+    def _packets_worker(self):
+        while self.running:
+            self._wakeup.wait(timeout=0.5)
+            self._wakeup.clear()
+            if self._segmenter is None or self._segmenter.poll() is not None:
+                print("🔁 重启录像分段 FFmpeg")
+                time.sleep(1.0)
+                self._read_segment_list()
+                self._start_segmenter()
+            self._read_segment_list()
+            segments = self._segments()
+            done_until = segments[-1][1] if segments else 0
+            # 已写完的分段覆盖到片段结尾，说明片段需要的分段都已就绪
+            timeout = self.segment_time * 3 + 2.0
+            for clip in self._take_finished(
+                    lambda c: done_until >= c['end'] or time.time() > c['end'] + timeout):
+                self._write_packets_clip(clip, segments)
+            self._evict(segments)
+
+        if self._segmenter is not None:
+            # 正常退出时 FFmpeg 会写完当前分段并追加到列表
+            self._segmenter.terminate()
+            try:
+                self._segmenter.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                self._segmenter.kill()
+        self._read_segment_list()
+        segments = self._segments()
+        for clip in self._take_finished(lambda c: True):
+            self._write_packets_clip(clip, segments)
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def _covering(self, clip, segments):
+        """与 [start, end] 有重叠的已写完分段"""
+        return [path for start, end, path, _ in segments if end > clip['start'] and start <= clip['end']]
+
+    def _write_packets_clip(self, clip, segments):
+        paths = self._covering(clip, segments)
+        if not paths:
+            return
+        path = self._clip_path(clip, 'mkv')
+        list_path = path + '.txt'
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for segment in paths:
+                f.write(f"file '{os.path.abspath(segment)}'\n")
+        try:
+            result = subprocess.run(build_ffmpeg_concat_command(list_path, path),
+                                    stdin=subprocess.DEVNULL, capture_output=True, timeout=60)
+            if result.returncode != 0:
+                print(f"❌ 事件录像拼接失败: {result.stderr.decode(errors='ignore')[-200:]}")
+                return
+        except Exception as e:
+            print(f"❌ 事件录像拼接失败: {e}")
+            return
+        finally:
+            os.remove(list_path)
+        self._finish(clip, path, clip['end'] - clip['start'])
+
+    def _evict(self, segments):
+        """删除预录时长之外、且没有片段需要的分段；总大小超过上限时从最旧的开始删"""
+        with self._lock:
+            clips = self._closed + ([self._clip] if self._clip is not None else [])
+            protect_from = min((clip['start'] for clip in clips), default=float('inf'))
+        now = time.time()
+        total = self._spool_bytes()
+        for start, end, path, size in segments:
+            expired = end < now - self.pre_seconds
+            if not (total > self.max_bytes or (expired and end <= protect_from)):
+                break
+            os.remove(path)
+            del self._segment_info[path]
+            total -= size
+        self.buffer_bytes = total
+
+    def close(self):
+        self.running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=15.0)
+
+
+class HighPerformanceDetectorPaddle:
+    def __init__(self, stream_source = 0, yolo_model='yolo11n.pt', use_gpu=True,rtsp_url=None,
+                 yolo_engine=None, name="cam0", ocr_processes=0, region_ocr=None,
+                 tracker=None, yolo_stride=1, push_options=None, metadata_publisher=None,
+                 ocr_factory=create_paddle_ocr, scheduler=None, yolo_imgsz=640, auto_ocr=True,
+                 yolo_format=None, model_cache=MODEL_CACHE_DIR, ocr_max_side=1920,
+                 scene_gate=None, yolo_options=None, tiler=None, recorder=None):
+        print("="*60)
+        print(f"🚀 高性能检测系统 (PaddleOCR V5) [{name}]")
+        print("="*60)
+        self.name = name
+        self.rtsp_url = rtsp_url
+        self.push_options = push_options or {}  # FFmpegWriter 参数 (队列长度/丢帧策略/yuv420/推流阶梯)
+        self.writer = None
+        # 元数据模式：只推送检测/OCR结果，视频用 -c copy 原样转发
+        self.metadata = metadata_publisher
+        self.forwarder = None
+
+        self.use_gpu = use_gpu
+        print(f"🎮 GPU模式: {'✅ 启用' if use_gpu else '❌ 禁用'}")
+
+        # 启动：视频源、YOLO、PaddleOCR 并行初始化 (各自耗时记录在 startup_times)
+        self.startup_times = {}
+        self.ttfaf = None  # 首帧标注耗时 (秒，从模块导入算起)
         self.ocr = None
+        self.ocr_factory = ocr_factory
+        self.auto_ocr = auto_ocr  # 自动OCR开关；关闭时不预加载 PaddleOCR
+        self.ocr_max_side = ocr_max_side  # 整帧OCR输入的最大边长 (0 = 原图)
+        startup = ThreadPoolExecutor(max_workers=3, thread_name_prefix="Startup")
+        stream_future = startup.submit(self._timed, 'stream', self._open_stream, stream_source)
+        yolo_future = None
+        if yolo_engine is None:
+            print(f"📦 加载YOLO模型: {yolo_model}")
+            # yolo_options: 推理后端参数 (int8 / int8_data / threads)，见 load_yolo_model
+            yolo_future = startup.submit(self._timed, 'yolo_load', load_yolo_model, yolo_model,
+                                         yolo_format, model_cache, yolo_imgsz, use_gpu,
+                                         **(yolo_options or {}))
+        self._ocr_future = None
+        if auto_ocr and ocr_processes == 0:
+            self._ocr_future = startup.submit(self._timed, 'ocr_load', self._load_ocr, stream_future)
+        startup.shutdown(wait=False)
+
+        self.first_frame = stream_future.result()
+
+        # YOLO模型 (多路模式下使用共享推理线程，不再各自加载)
+        self.yolo_engine = yolo_engine
+        if yolo_future is not None:
+            self.yolo = yolo_future.result()
+            print(f"✅ YOLO模型已加载 ({self.yolo.name})")
+            # 按实际分辨率和输入尺寸预热，第一帧真实推理不再承担初始化开销
+            warmup_input = letterbox(self.first_frame, yolo_imgsz, auto=self.yolo.rect)[0]
+            self._timed('yolo_warmup', self.yolo.predict, [warmup_input], conf=0.25, imgsz=yolo_imgsz)
+        else:
+            self.yolo = None
+            print("✅ 使用共享YOLO推理线程")
+
+        # 目标跟踪：在 YOLO 结果之间预测框的位置
+        self.tracker = tracker
+        self.yolo_stride = max(1, yolo_stride)  # 每 N 帧推理一次YOLO
+        self.yolo_imgsz = yolo_imgsz  # YOLO 输入尺寸
+        # .pt 和动态尺寸导出的模型支持矩形输入，其它导出模型为固定的正方形输入
+        self.yolo_rect = self.yolo.rect if self.yolo is not None else False
+        self.yolo_conf = 0.25
+        self.scheduler = scheduler    # LoadScheduler：按负载自动调整上面几项和 OCR 间隔
+        self.scene_gate = scene_gate  # SceneChangeGate：画面未变时跳过 YOLO / 整帧OCR
+        self.tiler = tiler            # TiledInference：高分辨率切块推理 (小目标)
+        self.recorder = recorder      # ClipRecorder：规则命中时保存带预录的事件片段
+
+        # PaddleOCR - 线程模式已在后台加载；ocr_processes > 0 时改用进程池 (子进程立即开始加载)
+        self.ocr_pool = OcrProcessPool(ocr_processes, ocr_factory) if ocr_processes > 0 else None
+        if self.ocr_pool is not None and auto_ocr:
+            self.ocr_pool.start(self.first_frame.nbytes, self._ocr_input_shape(self.first_frame))
+        self.region_ocr = region_ocr  # RegionOcrCache：只识别检测框区域
+        self._ocr_jobs = {}           # 进程池任务ID -> (区域布局, 缩放比例, 缓存键)
+
+        # 叠加层渲染器 (字体和标签贴图缓存)
+        self.renderer = get_overlay_renderer()
 
         # 线程控制
         self.running = False
-        self.yolo_queue = queue.Queue(maxsize=2)
+        self.frame_slot = LatestFrameSlot()
         self.ocr_queue = queue.Queue(maxsize=2)
 
         # 结果存储
-        self.latest_detections = []
+        self.latest_detections = Detections.empty()
+        self._raw_detections = None  # 最近一次 YOLO 原始结果 (跟踪前)
         self.latest_ocr = []
         self.detections_lock = Lock()
         self.ocr_lock = Lock()
 
         # 性能统计
-        self.fps_deque = deque(maxlen=30)
+        self.fps_deque = deque(maxlen=30)  # 相邻两个输出帧的间隔
+        self._last_display = None
         self.frame_count = 0
         self.yolo_fps = 0
         self.ocr_fps = 0
+        self.display_fps = 0.0
+        self._ocr_count = 0
+        self._ocr_last_time = time.time()
+        self._yolo_frame_count = 0
+        self._yolo_last_time = time.time()
         self.ocr_processing = False
         self.last_ocr_time = 0
+        self.capture_count = 0
+        self.latency_deque = deque(maxlen=30)  # 采集→推流 端到端延迟
+        self.dropped = {'yolo': 0, 'ocr': 0, 'display': 0, 'encode': 0}  # 各阶段丢帧数
+        self._last_ocr_drop = 0.0
+        self.stats = StageStats()  # 各阶段耗时 (capture/yolo/ocr/draw/encode/e2e)
+        self.yolo_count = 0        # 累计YOLO结果数
+        self._yolo_version = 0     # YOLO 最近处理的帧版本号
+        self._display_version = 0  # 渲染最近处理的帧版本号
+        self.ocr_count = 0         # 累计OCR结果数
+        self._display_buffer = None
 
         # 显示设置
         self.show_detections = True
         self.show_ocr = True
         self.show_info = True
         # 在 self.show_info = True 后面添加：
-        self.auto_ocr = True  # 自动OCR开关
         self.ocr_interval = 1.0  # 自动OCR间隔（秒）
         self.last_auto_ocr_time = 0  # 上次自动OCR时间
+        if yolo_engine is not None:
+            yolo_engine.register(self)
+
         # 颜色
         self.colors = {}
         self.color_palette = [
@@ -137,26 +2673,91 @@ class HighPerformanceDetectorPaddle:
         print("="*60)
         print()
 
-    def _init_paddle_ocr(self):
-        if self.ocr is None:
-            print("📦 初始化 PaddleOCR (新Pipeline版)...")
+    def _timed(self, stage, func, *args, **kwargs):
+        """执行启动阶段并记录耗时"""
+        start_time = time.time()
+        result = func(*args, **kwargs)
+        self.startup_times[stage] = time.time() - start_time
+        return result
 
-            try:
-                self.ocr = PaddleOCR(
-                    use_gpu=False,
-                    lang='ch',
-                    use_textline_orientation=True
-                )
-                print("✅ PaddleOCR 初始化成功")
+    def _open_stream(self, stream_source):
+        """打开视频源并读取第一帧 (用于预热和推流初始化)"""
+        try:
+            self.source = int(stream_source)
+            source_type = "USB Camera"
+        except ValueError:
+            self.source = stream_source
+            source_type = "RTSP/Video Stream"
+
+        print(f"📹 打开视频源: {self.source} [{source_type}]")
 
-                dummy = np.zeros((100, 100, 3), dtype=np.uint8)
-                self.ocr.ocr(dummy)
-                print("🔥 模型预热完成")
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            raise Exception(f"无法打开:{self.source}")
 
+        if source_type == "USB Camera":
+            # 只有 USB 摄像头才需要手动设置分辨率
+            # RTSP 流的分辨率由推流端决定，客户端强行 set 通常无效或导致错误
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+            self.cap.set(cv2.CAP_PROP_FPS, 30)
+            print("✅ USB摄像头参数已配置")
+        else:
+            # 对于 RTSP，稍微做一下缓冲区优化（可选）
+            # 读取实际流的分辨率用于显示信息
+            w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            print(f"✅ RTSP流已连接 (分辨率: {w}x{h})")
+
+        ret, frame = self.cap.read()
+        if not ret:
+            raise Exception(f"无法读取第一帧:{self.source}")
+        print("✅ 视频源初始化完成")
+        return frame
+
+    def _load_ocr(self, stream_future):
+        """后台创建 PaddleOCR，拿到第一帧后按实际分辨率预热"""
+        ocr = self.ocr_factory()
+        warmup_ocr(ocr, self._ocr_input_shape(stream_future.result()))
+        return ocr
+
+    def _ocr_input_shape(self, frame):
+        """整帧OCR的实际输入尺寸 (与 PreparedFrame.level(ocr_max_side) 一致)"""
+        h, w = frame.shape[:2]
+        if not self.ocr_max_side or max(h, w) <= self.ocr_max_side:
+            return frame.shape
+        scale = self.ocr_max_side / max(h, w)
+        return (int(round(h * scale)), int(round(w * scale))) + frame.shape[2:]
+
+    def _init_paddle_ocr(self):
+        if self.ocr is None:
+            try:
+                if self._ocr_future is not None:
+                    self.ocr = self._ocr_future.result()
+                else:
+                    # 启动时关闭了自动OCR，首次手动OCR时才加载
+                    self.ocr = self.ocr_factory()
+                    warmup_ocr(self.ocr, self._ocr_input_shape(self.first_frame))
             except Exception as e:
                 print("❌ PaddleOCR 初始化失败:", e)
                 raise
 
+    def _tick_display(self):
+        """记录一帧输出，显示FPS按相邻输出帧的间隔计算 (包含等待新帧的时间)"""
+        now = time.time()
+        if self._last_display is not None:
+            self.fps_deque.append(now - self._last_display)
+            self.display_fps = 1.0 / max(sum(self.fps_deque) / len(self.fps_deque), 1e-6)
+        self._last_display = now
+        return self.display_fps
+
+    def _mark_first_annotated(self):
+        """第一次输出带检测结果的帧时记录首帧标注耗时 (TTFAF)"""
+        if self.ttfaf is None and self.yolo_count > 0:
+            self.ttfaf = time.time() - PROCESS_START
+            stages = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in self.startup_times.items())
+            print(f"⏱️ [{self.name}] 首帧标注耗时 TTFAF: {self.ttfaf:.2f}s (启动阶段: {stages})")
+
     def get_color(self, class_name):
         """获取类别颜色"""
         if class_name not in self.colors:
@@ -164,56 +2765,142 @@ class HighPerformanceDetectorPaddle:
             self.colors[class_name] = self.color_palette[idx]
         return self.colors[class_name]
 
+    def update_detections(self, detections, timestamp=None):
+        """
+        更新检测结果并统计YOLO FPS (单路线程和共享推理线程共用)
+        :param timestamp: 该结果对应帧的采集时间戳，用于跟踪器预测
+        """
+        with self.detections_lock:
+            self._raw_detections = detections
+            if self.tracker is not None:
+                timestamp = time.time() if timestamp is None else timestamp
+                detections = self.tracker.update(detections, timestamp)
+            self.latest_detections = detections
+
+        # 计算YOLO FPS
+        self.yolo_count += 1
+        self._yolo_frame_count += 1
+        if time.time() - self._yolo_last_time >= 1.0:
+            self.yolo_fps = self._yolo_frame_count
+            self._yolo_frame_count = 0
+            self._yolo_last_time = time.time()
+
+    def reuse_detections(self, timestamp):
+        """
+        场景门控跳过了本帧推理：沿用上次 YOLO 结果 (不计入 YOLO 帧数)
+        启用跟踪时按本帧时间用上次结果修正轨迹，静止画面里框不会按旧速度继续漂移
+        """
+        with self.detections_lock:
+            if self.tracker is not None and self._raw_detections is not None:
+                self.latest_detections = self.tracker.update(self._raw_detections, timestamp)
+
     def yolo_worker(self):
         """YOLO检测线程"""
         print("🧵 YOLO线程已启动")
-        yolo_frame_count = 0
-        last_time = time.time()
+        last_version = 0
 
         while self.running:
-            try:
-                frame = self.yolo_queue.get(timeout=0.1)
-            except queue.Empty:
+            # yolo_stride > 1 时每隔若干帧才推理一次，中间帧由跟踪器预测
+            item = self.frame_slot.wait_newer(last_version + self.yolo_stride - 1, timeout=0.1)
+            if item is None:
                 continue
+            version, prepared, timestamp = item
+            if last_version:
+                self.dropped['yolo'] += max(version - last_version - self.yolo_stride, 0)
+            last_version = version
+            self._yolo_version = version
+
+            gate = self.scene_gate
+            if gate is not None:
+                if not gate.changed('yolo', prepared, timestamp):
+                    self.reuse_detections(timestamp)
+                    continue
+                gate.mark('yolo', prepared, timestamp)
+
+            # YOLO检测 (输入为共享预处理阶段的 letterbox 结果，框映射回原图坐标)
+            start_time = time.time()
+            imgsz, rect = self.yolo_imgsz, self.yolo_rect
+            if self.tiler is not None:
+                # 切块推理：整帧 + 选中的切块一个 batch，结果跨块合并
+                images, plan = self.tiler.prepare(prepared, imgsz, self._raw_detections)
+                results = self.yolo.predict(images, conf=self.yolo_conf, imgsz=imgsz)
+                detections = self.tiler.merge(prepared, results, plan, imgsz)
+            else:
+                detections = self.yolo.predict([prepared.letterbox(imgsz, rect)[0]],
+                                               conf=self.yolo_conf, imgsz=imgsz)[0]
+                detections = prepared.map_detections(detections, imgsz, rect)
+            self.stats.record('yolo', time.time() - start_time)
+            self.update_detections(detections, timestamp)
 
-            # YOLO检测
-            results = self.yolo(frame, verbose=False, conf=0.25, imgsz=640)
-
-            detections = []
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    detections.append({
-                        'class': result.names[int(box.cls[0])],
-                        'confidence': float(box.conf[0]),
-                        'bbox': [int(x1), int(y1), int(x2), int(y2)]
-                    })
+        print("🛑 YOLO线程已停止")
 
-            # 更新检测结果
-            with self.detections_lock:
-                self.latest_detections = detections
+    def capture_worker(self):
+        """视频采集线程：持续解码，只发布最新帧"""
+        print("🧵 采集线程已启动")
 
-            # 计算YOLO FPS
-            yolo_frame_count += 1
-            if time.time() - last_time >= 1.0:
-                self.yolo_fps = yolo_frame_count
-                yolo_frame_count = 0
-                last_time = time.time()
+        while self.running:
+            start_time = time.time()
+            ret, frame = self.cap.read()
+            if not ret:
+                print("❌ 无法读取摄像头")
+                break
+            now = time.time()
+            self.stats.record('capture', now - start_time)
+            self.capture_count += 1
+            prepared = PreparedFrame(frame)
+            self.frame_slot.publish(prepared, now)
+            if self.recorder is not None:
+                self.recorder.push(prepared, now)
+
+        self.frame_slot.close()
+        print("🛑 采集线程已停止")
+
+    def _apply_ocr_results(self, ocr_results, elapsed, cache_key=None):
+        """更新OCR结果并统计OCR FPS (cache_key: 场景门控的帧哈希，结果按它缓存)"""
+        if cache_key is not None and self.scene_gate is not None:
+            self.scene_gate.store_ocr(cache_key, ocr_results)
+        self.stats.record('ocr', elapsed / 1000)
+        self.ocr_count += 1
+        with self.ocr_lock:
+            self.latest_ocr = ocr_results
+            self.last_ocr_time = time.time()
+
+        # 计算OCR FPS
+        self._ocr_count += 1
+        if time.time() - self._ocr_last_time >= 1.0:
+            self.ocr_fps = self._ocr_count
+            self._ocr_count = 0
+            self._ocr_last_time = time.time()
+
+        print(f"✅ OCR完成: {len(ocr_results)} 个文字, 耗时 {elapsed:.0f}ms")
+        for ocr in ocr_results:
+            print(f"   - {ocr['text']} ({ocr['confidence']:.2f})")
 
-        print("🛑 YOLO线程已停止")
+    def _apply_region_results(self, layout, records, elapsed):
+        """区域OCR结果写回按目标缓存"""
+        count = self.region_ocr.apply(layout, records)
+        self.stats.record('ocr', elapsed / 1000)
+        self.ocr_count += 1
+
+        self._ocr_count += 1
+        if time.time() - self._ocr_last_time >= 1.0:
+            self.ocr_fps = self._ocr_count
+            self._ocr_count = 0
+            self._ocr_last_time = time.time()
+
+        print(f"✅ 区域OCR完成: {len(layout)} 个区域, {count} 个文字, 耗时 {elapsed:.0f}ms")
 
     def ocr_worker(self):
         """PaddleOCR识别线程"""
+        if self.ocr_pool is not None:
+            return self.ocr_pool_collector()
+
         print("🧵 OCR线程已启动")
         self._init_paddle_ocr()
 
-        ocr_count = 0
-        last_time = time.time()
-
         while self.running:
             try:
-                frame = self.ocr_queue.get(timeout=0.5)
+                frame, layout, scale, cache_key = self.ocr_queue.get(timeout=0.5)
                 self.ocr_processing = True
             except queue.Empty:
                 self.ocr_processing = False
@@ -226,44 +2913,14 @@ class HighPerformanceDetectorPaddle:
                 # PaddleOCR调用（新版本不需要cls参数）
                 result = self.ocr.ocr(frame)
 
-                ocr_results = []
-                print("🔍 OCR原始结果:", result)
-
                 # 解析PaddleOCR结果
-                ocr_results = []
-
-                if result and isinstance(result, list) and len(result) > 0:
-                    res = result[0]
-
-                    texts = res.get("rec_texts", [])
-                    scores = res.get("rec_scores", [])
-                    polys = res.get("rec_polys", [])
-
-                    for text, score, poly in zip(texts, scores, polys):
-                        if score > 0.5:
-                            ocr_results.append({
-                                'text': text,
-                                'confidence': float(score),
-                                'bbox': [[int(p[0]), int(p[1])] for p in poly]
-                            })
-
+                records = parse_paddle_ocr(result)
                 elapsed = (time.time() - start_time) * 1000
-
-                # 更新OCR结果
-                with self.ocr_lock:
-                    self.latest_ocr = ocr_results
-                    self.last_ocr_time = time.time()
-
-                # 计算OCR FPS
-                ocr_count += 1
-                if time.time() - last_time >= 1.0:
-                    self.ocr_fps = ocr_count
-                    ocr_count = 0
-                    last_time = time.time()
-
-                print(f"✅ OCR完成: {len(ocr_results)} 个文字, 耗时 {elapsed:.0f}ms")
-                for ocr in ocr_results:
-                    print(f"   - {ocr['text']} ({ocr['confidence']:.2f})")
+                if layout is not None:
+                    self._apply_region_results(layout, records, elapsed)
+                else:
+                    print("🔍 OCR原始结果:", result)
+                    self._apply_ocr_results(ocr_records_to_results(records, scale), elapsed, cache_key)
 
             except Exception as e:
                 print(f"❌ OCR错误: {e}")
@@ -275,140 +2932,163 @@ class HighPerformanceDetectorPaddle:
 
         print("🛑 OCR线程已停止")
 
+    def ocr_pool_collector(self):
+        """进程池模式：收集子进程回传的OCR结果"""
+        print(f"🧵 OCR结果收集线程已启动 (进程池: {self.ocr_pool.num_workers})")
+        last_job_id = 0
+
+        while self.running:
+            item = self.ocr_pool.get_result(timeout=0.5)
+            self.ocr_processing = self.ocr_pool.in_flight > 0
+            if item is None:
+                continue
+            job_id, records, elapsed = item
+            layout, scale, cache_key = self._ocr_jobs.pop(job_id, (None, 1.0, None))
+            if records is None:
+                if layout is not None:
+                    self.region_ocr.cancel([entry[0] for entry in layout])
+                continue
+            if layout is not None:
+                self._apply_region_results(layout, records, elapsed)
+                continue
+            # 多进程下结果可能乱序到达，只保留更新的结果
+            if job_id < last_job_id:
+                self.dropped['ocr'] += 1
+                continue
+            last_job_id = job_id
+            self._apply_ocr_results(ocr_records_to_results(records, scale), elapsed, cache_key)
+
+        print("🛑 OCR结果收集线程已停止")
+
     def draw_detections(self, frame, detections):
-        """绘制检测框"""
-        for det in detections:
-            x1, y1, x2, y2 = det['bbox']
-            color = self.get_color(det['class'])
+        """绘制检测框 (直接遍历 Detections 的数组)"""
+        boxes = detections.xyxy.round().astype(np.int32).tolist()
+        for (x1, y1, x2, y2), cls, conf, track_id in zip(
+                boxes, detections.cls.tolist(), detections.conf.tolist(),
+                detections.track_id.tolist()):
+            class_name = detections.class_name(cls)
+            color = self.get_color(class_name)
 
             # 边框
             cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
 
-            # 标签
-            label = f"{det['class']} {det['confidence']:.2f}"
-            (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-            cv2.rectangle(frame, (x1, y1 - 25), (x1 + w + 10, y1), color, -1)
-            cv2.putText(frame, label, (x1 + 5, y1 - 7),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+            # 标签 (缓存贴图，类名为中文也能正常显示)
+            label = f"{class_name} {conf:.2f}"
+            if track_id >= 0:
+                label = f"#{track_id} {label}"
+            sprite = self.renderer.get_sprite(label, 18, (0, 0, 0))
+            w, h = sprite.width, sprite.height
+            cv2.rectangle(frame, (x1, y1 - h - 10), (x1 + w + 10, y1), color, -1)
+            self.renderer.blit(frame, sprite, x1 + 5, y1 - h - 5)
 
         return frame
 
     def draw_ocr(self, frame, ocr_results):
         """
         绘制OCR结果 (支持中文)
-        优化策略：OpenCV画几何图形 -> 转PIL画中文 -> 转回OpenCV
+        优化策略：半透明背景只在多边形外接矩形内混合，
+        文字使用缓存的标签贴图直接合成到 BGR 帧上，不做整帧 PIL 转换
         """
-        # 1. 初始化字体 (建议放在 __init__ 中只加载一次，这里为了演示放在这里)
-        # Windows 默认黑体: "simhei.ttf", Mac: "/System/Library/Fonts/PingFang.ttc"
-        font_path = "simhei.ttf"
         font_size = 20
-        try:
-            font = ImageFont.truetype(font_path, font_size, encoding="utf-8")
-        except OSError:
-            # 如果找不到字体，回退到默认
-            font = ImageFont.load_default()
-            print(f"⚠️ 未找到字体 {font_path}，已回退默认字体")
-
-        # 2. 第一轮循环：使用 OpenCV 绘制几何图形 (框、半透明背景、标签底色)
-        #    同时收集需要绘制的文字信息
-        text_tasks = []  # 存储待绘制的文字任务 [(x, y, text, color), ...]
+        box_color = (74, 222, 128)
 
         for ocr in ocr_results:
             bbox = ocr['bbox']
             points = np.array(bbox, np.int32)
 
-            # --- 几何图形绘制 (保持 OpenCV 的高性能) ---
-
             # A. 绘制多边形框
-            cv2.polylines(frame, [points], True, (74, 222, 128), 2)
+            cv2.polylines(frame, [points], True, box_color, 2)
 
-            # B. 填充半透明背景
-            overlay = frame.copy()
-            cv2.fillPoly(overlay, [points], (74, 222, 128))
-            cv2.addWeighted(overlay, 0.2, frame, 0.8, 0, frame)
+            # B. 填充半透明背景 (仅 ROI)
+            self.renderer.fill_poly_alpha(frame, points, box_color, 0.2)
 
-            # --- 准备文字标签信息 ---
+            # C. 标签贴图 (宽高来自 PIL 字体度量，而不是 cv2.getTextSize)
             x, y = int(bbox[0][0]), int(bbox[0][1])
-            text = ocr['text']
-            conf = ocr['confidence']
-            label = f"{text} ({conf:.2f})"
-
-            # C. 计算中文文字的宽高 (关键：用 PIL 字体计算，而不是 cv2.getTextSize)
-            # getbbox 返回 (left, top, right, bottom)
-            left, top, right, bottom = font.getbbox(label)
-            w = right - left
-            h = bottom - top
-
-            # D. 绘制标签背景 (OpenCV rectangle)
-            # 注意：Pillow文字绘制基线和OpenCV不同，y坐标需要微调
-            # 这里背景框的高度适当加高一点以容纳中文
-            cv2.rectangle(frame, (x, y - h - 10), (x + w + 10, y), (74, 222, 128), -1)
-
-            # E. 将文字任务加入列表，稍后统一绘制
-            # 记录：(坐标x, 坐标y, 文本内容)
-            # 这里的 y - h - 5 是为了让文字落在绿色背景框里
-            text_tasks.append((x + 5, y - h - 5, label))
-
-        # 3. 转换图片格式 (只做一次转换，性能损耗最小)
-        img_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(img_pil)
-
-        # 4. 第二轮循环：批量绘制中文
-        for (tx, ty, t_label) in text_tasks:
-            # 参数：坐标, 文本, 颜色(RGB), 字体
-            draw.text((tx, ty), t_label, fill=(0, 0, 0), font=font)
-
-        # 5. 转回 OpenCV 格式并返回
-        return cv2.cvtColor(np.asarray(img_pil), cv2.COLOR_RGB2BGR)
+            label = f"{ocr['text']} ({ocr['confidence']:.2f})"
+            sprite = self.renderer.get_sprite(label, font_size, (0, 0, 0))
+            w, h = sprite.width, sprite.height
+
+            # D. 绘制标签背景，文字落在绿色背景框里
+            cv2.rectangle(frame, (x, y - h - 10), (x + w + 10, y), box_color, -1)
+            self.renderer.blit(frame, sprite, x + 5, y - h - 5)
+
+        return frame
 
     def draw_info(self, frame, detections, fps):
         """绘制信息面板"""
         h, w = frame.shape[:2]
 
-        # 背景
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (10, 10), (340, 200), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
-
-        # 文字
-        y = 35
-        cv2.putText(frame, f"Display FPS: {fps:.1f}", (20, y),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 212, 255), 2)
-        y += 30
-        cv2.putText(frame, f"YOLO FPS: {self.yolo_fps}", (20, y),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (74, 222, 128), 2)
-        y += 30
-        cv2.putText(frame, f"Detections: {len(detections)}", (20, y),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (251, 191, 36), 2)
-        y += 30
-
         # OCR状态
         if self.ocr_processing:
             ocr_text = "Processing..."
-            color = (239, 68, 68)
+            ocr_color = (239, 68, 68)
         elif self.latest_ocr:
             ocr_text = f"{len(self.latest_ocr)} texts"
-            color = (74, 222, 128)
+            ocr_color = (74, 222, 128)
         else:
             ocr_text = "Press 'o'"
-            color = (168, 85, 247)
-        cv2.putText(frame, f"OCR: {ocr_text}", (20, y),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+            ocr_color = (168, 85, 247)
 
-        y += 30
         gpu_text = "GPU ✅" if self.use_gpu else "CPU"
-        cv2.putText(frame, f"Mode: {gpu_text}", (20, y),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (236, 72, 153), 2)
+        backend = self.yolo if self.yolo is not None else getattr(self.yolo_engine, 'yolo', None)
+        if backend is not None:
+            gpu_text += f" {backend.name}"
+        latency = (sum(self.latency_deque) / len(self.latency_deque) * 1000
+                   if self.latency_deque else 0)
+        dropped = self.dropped
+        streams = self.yolo_engine.streams if self.yolo_engine is not None else []
+
+        # (文本, 颜色, 字号, 线宽)
+        lines = [
+            (f"Display FPS: {fps:.1f}", (0, 212, 255), 0.6, 2),
+            (f"YOLO FPS: {self.yolo_fps}", (74, 222, 128), 0.6, 2),
+            (f"Detections: {len(detections)}", (251, 191, 36), 0.6, 2),
+            (f"OCR: {ocr_text}", ocr_color, 0.6, 2),
+            (f"Mode: {gpu_text}", (236, 72, 153), 0.6, 2),
+            (f"Latency: {latency:.0f}ms", (20, 184, 166), 0.6, 2),
+            (f"Frame: {self.frame_count}", (200, 200, 200), 0.5, 1),
+            (f"Drop Y/O/D/E: {dropped['yolo']}/{dropped['ocr']}/{dropped['display']}/"
+             f"{dropped['encode'] + (self.writer.dropped if self.writer else 0)}",
+             (200, 200, 200), 0.5, 1),
+        ]
+
+        if self.writer is not None:
+            renditions = "/".join(r.name for r in self.writer.renditions)
+            lines.append((f"Push: {renditions} @ {self.writer.fps or '-'}fps", (200, 200, 200), 0.5, 1))
+        if self.scheduler is not None:
+            lines.append((self.scheduler.describe(self), (251, 191, 36), 0.5, 1))
+        if self.tiler is not None:
+            lines.append((self.tiler.describe(), (168, 85, 247), 0.5, 1))
+        if self.scene_gate is not None:
+            rates = self.scene_gate.hit_rates()
+            lines.append((f"Gate: YOLO {rates['yolo']:.0%} OCR {rates['ocr']:.0%}", (20, 184, 166), 0.5, 1))
+        if self.recorder is not None:
+            recorder = self.recorder
+            lines.append((f"Rec: {'REC' if recorder.recording else 'idle'} clips {recorder.clips} "
+                          f"buf {recorder.buffer_bytes / 1024 / 1024:.0f}MB",
+                          (239, 68, 68) if recorder.recording else (200, 200, 200), 0.5, 1))
+
+        # 多路模式：显示本路名称以及各路 Display / YOLO FPS
+        if len(streams) > 1:
+            lines.insert(0, (f"Stream: {self.name}", (255, 255, 255), 0.6, 2))
+            for stream in streams:
+                lines.append((f"{stream.name}: {stream.display_fps:.1f} / YOLO {stream.yolo_fps}",
+                              stream.get_color(stream.name), 0.5, 1))
 
-        y += 30
-        cv2.putText(frame, f"Frame: {self.frame_count}", (20, y),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+        # 背景
+        overlay = frame.copy()
+        cv2.rectangle(overlay, (10, 10), (340, 20 + len(lines) * 30), (0, 0, 0), -1)
+        cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
+
+        # 文字
+        y = 35
+        for text, color, scale, thickness in lines:
+            cv2.putText(frame, text, (20, y),
+                       cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+            y += 30
 
         # 类别统计
-        class_counts = {}
-        for det in detections:
-            cls = det['class']
-            class_counts[cls] = class_counts.get(cls, 0) + 1
+        class_counts = detections.class_counts()
 
         if class_counts:
             y = h - 20 - len(class_counts) * 25
@@ -420,108 +3100,303 @@ class HighPerformanceDetectorPaddle:
 
         return frame
 
-    def request_ocr(self, frame):
-        """请求OCR处理"""
+    def _count_ocr_drop(self):
+        """
+        OCR 忙时自动OCR会在之后的每一帧重试 (空出来就能马上提交)，
+        同一个OCR间隔内被拒绝的请求只算一次丢帧
+        :return: 本次是否计入
+        """
+        now = time.time()
+        if now - self._last_ocr_drop < self.ocr_interval:
+            return False
+        self._last_ocr_drop = now
+        self.dropped['ocr'] += 1
+        return True
+
+    def request_ocr(self, frame, layout=None, scale=1.0, cache_key=None):
+        """
+        请求OCR处理
+        :param layout: 区域OCR拼图的布局；为 None 时表示整帧识别
+        :param scale: 整帧识别时 frame 相对原图的缩放比例，结果坐标据此还原
+        :param cache_key: 场景门控的帧哈希，结果返回后按它缓存
+        """
+        if self.ocr_pool is not None:
+            # 进程池模式：拷贝到空闲共享内存块后立即返回
+            job_id = self.ocr_pool.submit(frame)
+            if job_id is None:
+                self._count_ocr_drop()
+                return False
+            self._ocr_jobs[job_id] = (layout, scale, cache_key)
+            self.ocr_processing = True
+            return True
+
         if self.ocr_processing:
-            print("⚠️ OCR正在处理中，请稍后...")
+            if self._count_ocr_drop():
+                print("⚠️ OCR正在处理中，请稍后...")
             return
 
         # 清空队列，只保留最新请求
         while not self.ocr_queue.empty():
             try:
-                self.ocr_queue.get_nowait()
+                _, stale_layout, _, _ = self.ocr_queue.get_nowait()
+                if stale_layout is not None:
+                    self.region_ocr.cancel([entry[0] for entry in stale_layout])
             except:
                 break
 
         try:
-            self.ocr_queue.put_nowait(frame.copy())
-            print("📝 OCR请求已提交")
+            self.ocr_queue.put_nowait((frame, layout, scale, cache_key))
+            if layout is None:
+                print("📝 OCR请求已提交")
             return True
         except queue.Full:
             print("⚠️ OCR队列已满")
+            self.dropped['ocr'] += 1
             return False
 
+    def collect_metrics(self):
+        """
+        导出本路的指标样本，由 collect_pipeline_metrics 汇总成 Prometheus 文本
+        :return: {指标名: [(标签, 数值或Histogram), ...]}
+        """
+        labels = {'stream': self.name}
+        slot_version = self.frame_slot.latest()[0]
+        writer = self.writer
+        queues = {
+            'ocr': self.ocr_queue.qsize(),
+            'ocr_pool_inflight': self.ocr_pool.in_flight if self.ocr_pool is not None else 0,
+            'encoder': writer.queue_depth if writer is not None else 0,
+            # 单槽缓冲中尚未被该阶段处理的帧数 (替代原来的 yolo_queue)
+            'yolo_lag': max(slot_version - self._yolo_version, 0),
+            'display_lag': max(slot_version - self._display_version, 0),
+        }
+        dropped = dict(self.dropped)
+        if writer is not None:
+            dropped['encode'] += writer.dropped
+        tiles = list(self.tiler.tile_counts) if self.tiler is not None else []
+
+        return {
+            'stage_seconds': [({**labels, 'stage': stage}, histogram)
+                              for stage, histogram in list(self.stats.histograms.items())],
+            'queue_depth': [({**labels, 'queue': name}, value) for name, value in queues.items()],
+            'dropped_frames_total': [({**labels, 'stage': stage}, value)
+                                     for stage, value in dropped.items()],
+            'frames_total': [({**labels, 'kind': kind}, value) for kind, value in (
+                ('captured', self.capture_count), ('displayed', self.frame_count),
+                ('yolo', self.yolo_count), ('ocr', self.ocr_count))],
+            'fps': [({**labels, 'kind': kind}, value) for kind, value in (
+                ('display', round(self.display_fps, 2)), ('yolo', self.yolo_fps),
+                ('ocr', self.ocr_fps))],
+            'frame_age_seconds': [(labels, round(self.latency_deque[-1], 4) if self.latency_deque else 0)],
+            'encoder_bytes_total': [(labels, writer.bytes_written if writer is not None else 0)],
+            'encoder_restarts_total': [(labels, writer.restarts if writer is not None else 0)],
+            'encoder_fps': [(labels, (writer.fps or 0) if writer is not None else 0)],
+            'encoder_frames_total': [
+                ({**labels, 'rendition': r.name, 'result': result}, value)
+                for r in (writer.renditions if writer is not None else [])
+                for result, value in (('written', r.written), ('dropped', r.dropped))],
+            'ttfaf_seconds': [(labels, round(self.ttfaf, 3) if self.ttfaf is not None else 0)],
+            'yolo_tiles': [(labels, round(sum(tiles) / len(tiles), 2) if tiles else 0)],
+            **self._gate_metrics(labels),
+            **self._recorder_metrics(labels),
+        }
+
+    def _recorder_metrics(self, labels):
+        """事件录像 (未启用时不导出)"""
+        recorder = self.recorder
+        if recorder is None:
+            return {}
+        return {
+            'recorder_events_total': [(labels, recorder.events)],
+            'recorder_clips_total': [(labels, recorder.clips)],
+            'recorder_buffer_bytes': [(labels, recorder.buffer_bytes)],
+            'recorder_dropped_frames_total': [(labels, recorder.dropped)],
+        }
+
+    def _gate_metrics(self, labels):
+        """场景门控的命中情况 (未启用时不导出)"""
+        gate = self.scene_gate
+        if gate is None:
+            return {}
+        return {
+            'scene_gate_total': [({**labels, 'stage': stage, 'result': result}, value)
+                                 for stage, counts in gate.counts.items()
+                                 for result, value in counts.items()],
+            'scene_gate_hit_ratio': [({**labels, 'stage': stage}, value)
+                                     for stage, value in gate.hit_rates().items()],
+            'scene_change_percent': [({**labels, 'stage': stage}, round(value, 3))
+                                     for stage, value in gate.scores.items()],
+        }
+
+    def build_metadata(self, frame, capture_time, detections, ocr_results):
+        """单帧元数据 (帧号、时间戳、检测框、OCR文字与多边形)"""
+        h, w = frame.shape[:2]
+        return {
+            'stream': self.name,
+            'frame': self.frame_count,
+            'timestamp': round(capture_time, 3),
+            'width': w,
+            'height': h,
+            'detections': detections.to_dicts(),
+            'ocr': ocr_results
+        }
+
+    def request_full_ocr(self, prepared, now):
+        """
+        整帧自动OCR (经场景门控)：画面未变时跳过，命中帧哈希缓存时直接复用结果
+        :return: 本轮是否已处理 (提交、跳过或命中缓存)
+        """
+        gate = self.scene_gate
+        frame_hash = None
+        if gate is not None:
+            if not gate.changed('ocr', prepared, now):
+                return True
+            frame_hash = gate.frame_hash(prepared)
+            cached = gate.lookup_ocr(frame_hash, now)
+            if cached is not None:
+                gate.mark('ocr', prepared, now, ran=False)
+                with self.ocr_lock:
+                    self.latest_ocr = cached
+                    self.last_ocr_time = time.time()
+                return True
+
+        # 整帧OCR使用缩小后的金字塔层，结果坐标在回写时还原
+        ocr_input, scale = prepared.level(self.ocr_max_side)
+        if not self.request_ocr(ocr_input, scale=scale, cache_key=frame_hash):
+            return False
+        if gate is not None:
+            gate.mark('ocr', prepared, now)
+        return True
+
+    def request_region_ocr(self, frame, detections):
+        """区域OCR：裁剪需要(重新)识别的检测框，拼成一张图提交"""
+        requests = self.region_ocr.plan(frame, detections)
+        if not requests:
+            return True
+        h, w = frame.shape[:2]
+        mosaic, layout = self.region_ocr.build_mosaic(requests, w, h)
+        if mosaic is None:
+            return True
+        if not self.request_ocr(mosaic, layout):
+            self.region_ocr.cancel([entry[0] for entry in layout])
+            return False
+        return True
+
     def run(self):
         """主循环"""
         print("🚀 启动检测系统...")
 
         # 启动工作线程
         self.running = True
-        yolo_thread = Thread(target=self.yolo_worker, daemon=True, name="YOLO")
+        if self.yolo_engine is None:
+            yolo_thread = Thread(target=self.yolo_worker, daemon=True, name="YOLO")
+            yolo_thread.start()
         ocr_thread = Thread(target=self.ocr_worker, daemon=True, name="PaddleOCR")
-        yolo_thread.start()
         ocr_thread.start()
 
         print("✅ 所有线程已启动")
         print("🎬 开始检测...\n")
-        ret, first_frame = self.cap.read()
-        if not ret: return
+        first_frame = self.first_frame
         height, width = first_frame.shape[:2]
 
-        # 【修改点3】初始化 FFmpeg 管道 (如果有 RTSP 地址)
-        if self.rtsp_url:
-            print(f"📺 正在连接推流服务器: {self.rtsp_url}")
-            # 注意：这里加上了 -bf 0 和 -profile:v baseline 以完美兼容 WebRTC
-            command = [
-                'ffmpeg',
-                '-y', '-an',
-                '-f', 'rawvideo',
-                '-vcodec', 'rawvideo',
-                '-pix_fmt', 'bgr24',  # OpenCV 默认也是 bgr24
-                '-s', f"{width}x{height}",  # 动态获取宽高
-                '-r', '25',  # 帧率
-                '-i', '-',  # 从标准输入读取
-                '-c:v', 'libx264',
-                '-pix_fmt', 'yuv420p',
-                '-preset', 'ultrafast',
-                '-tune', 'zerolatency',
-                '-profile:v', 'baseline',  # 关键：兼容 WebRTC
-                '-bf', '0',  # 关键：去 B 帧
-                '-rtsp_transport', 'tcp',
-                '-f', 'rtsp',
-                self.rtsp_url
-            ]
-            # 启动子进程
-            try:
-                self.pipe = subprocess.Popen(command, stdin=subprocess.PIPE)
-                print("✅ 推流管道建立成功")
-            except Exception as e:
-                print(f"❌ FFmpeg启动失败: {e}")
+        # 采集线程：持续解码，只往单槽缓冲里发布最新帧
+        self.frame_slot.publish(PreparedFrame(first_frame))
+        if self.recorder is not None:
+            self.recorder.start(self.source, self.name)
+        capture_thread = Thread(target=self.capture_worker, daemon=True, name="Capture")
+        capture_thread.start()
+
+        # 【修改点3】初始化 FFmpeg 推流 (如果有 RTSP 地址)
+        if self.rtsp_url and self.metadata is not None:
+            if self.push_options.get('ladder'):
+                print("⚠️ 元数据模式只做 -c copy 转发，不生成低分辨率推流")
+            if isinstance(self.source, int):
+                print("⚠️ USB摄像头无法 -c copy 转发，元数据模式下不推流")
+            else:
+                print(f"📺 原始流转发: {self.source} -> {self.rtsp_url}")
+                try:
+                    self.forwarder = subprocess.Popen(build_ffmpeg_copy_command(self.source, self.rtsp_url))
+                except Exception as e:
+                    print(f"❌ FFmpeg启动失败: {e}")
+        elif self.rtsp_url:
+            self.writer = FFmpegWriter(self.rtsp_url, width, height, stats=self.stats,
+                                       **self.push_options)
+            self.writer.start()
+        last_version = 0
         try:
-            while True:
-                start_time = time.time()
-
-                # 读取帧
-                ret, frame = self.cap.read()
-                if not ret:
-                    print("❌ 无法读取摄像头")
-                    break
+            while self.running:
+                # 等待新帧 (渲染慢时中间帧直接跳过，不在缓冲区积压)
+                item = self.frame_slot.wait_newer(last_version, timeout=1.0)
+                if item is None:
+                    if self.frame_slot.closed:
+                        break
+                    continue
+                version, prepared, capture_time = item
+                frame = prepared.image
+                if last_version:
+                    self.dropped['display'] += version - last_version - 1
+                last_version = version
+                self._display_version = version
 
+                start_time = time.time()
                 self.frame_count += 1
 
-                # 提交YOLO处理
+                # 获取最新结果 (启用跟踪时按本帧采集时间预测框位置)
+                with self.detections_lock:
+                    if self.tracker is not None:
+                        detections = self.tracker.predict(capture_time)
+                    else:
+                        detections = self.latest_detections  # 不可变结果，直接共享引用
+
                 # 自动OCR逻辑
                 if self.auto_ocr:
                     current_time = time.time()
-                    if current_time - self.last_auto_ocr_time >= self.ocr_interval:
-                        if self.request_ocr(frame):  # 只有成功提交才更新时间
+                    if self.region_ocr is not None:
+                        if current_time - self.last_auto_ocr_time >= self.region_ocr.interval:
+                            if self.request_region_ocr(frame, detections):
+                                self.last_auto_ocr_time = current_time
+                    elif current_time - self.last_auto_ocr_time >= self.ocr_interval:
+                        if self.request_full_ocr(prepared, current_time):  # 只有成功处理才更新时间
                             self.last_auto_ocr_time = current_time
-                try:
-                    if self.yolo_queue.full():
-                        self.yolo_queue.get_nowait()
-                    self.yolo_queue.put_nowait(frame.copy())
-                except:
-                    pass
-
-                # 获取最新结果
-                with self.detections_lock:
-                    detections = self.latest_detections.copy()
-
-                with self.ocr_lock:
-                    ocr_results = self.latest_ocr.copy()
 
-                # 绘制
-                display_frame = frame.copy()
+                if self.region_ocr is not None:
+                    # 区域模式：按目标缓存的文字跟随当前检测框
+                    ocr_results = self.region_ocr.results()
+                    with self.ocr_lock:
+                        self.latest_ocr = ocr_results
+                else:
+                    with self.ocr_lock:
+                        ocr_results = self.latest_ocr.copy()
+
+                if self.recorder is not None:
+                    self.recorder.check(detections, ocr_results, prepared, capture_time)
+
+                if self.metadata is not None:
+                    # 元数据模式：不绘制、不编码，只推送本帧结果
+                    self.metadata.publish(self.build_metadata(frame, capture_time, detections, ocr_results))
+                    self._tick_display()
+                    self.latency_deque.append(time.time() - capture_time)
+                    self.stats.record('e2e', self.latency_deque[-1])
+                    if self.scheduler is not None:
+                        self.scheduler.maybe_step(self)
+                    self._mark_first_annotated()
+                    continue
+
+                # 绘制 (frame 为只读共享帧，复制到推流写入器借出的缓冲区上再画)
+                if self.writer is not None:
+                    display_frame = self.writer.acquire()
+                    if display_frame is None:
+                        continue  # 编码器积压，本帧不再绘制 (写入器已计入丢帧)
+                    if display_frame.shape != frame.shape:
+                        # 分辨率变化，推流管道尺寸固定，只能丢弃
+                        self.writer.release(display_frame)
+                        self.dropped['encode'] += 1
+                        continue
+                else:
+                    if self._display_buffer is None or self._display_buffer.shape != frame.shape:
+                        self._display_buffer = np.empty_like(frame)
+                    display_frame = self._display_buffer
+                np.copyto(display_frame, frame)
 
                 if self.show_detections and detections:
                     display_frame = self.draw_detections(display_frame, detections)
@@ -530,24 +3405,21 @@ class HighPerformanceDetectorPaddle:
                     display_frame = self.draw_ocr(display_frame, ocr_results)
 
                 # 计算FPS
-                elapsed = time.time() - start_time
-                self.fps_deque.append(elapsed)
-                fps = 1.0 / (sum(self.fps_deque) / len(self.fps_deque))
+                fps = self._tick_display()
 
                 if self.show_info:
                     display_frame = self.draw_info(display_frame, detections, fps)
+                self.stats.record('draw', time.time() - start_time)
 
-                if self.pipe:
-                    try:
-                        self.pipe.stdin.write(display_frame.tobytes())
-                    except Exception as e:
-                        print(f"⚠️ 推流中断: {e}")
-                        self.pipe = None  # 避免重复报错
-
-
-
+                if self.writer is not None:
+                    self.writer.submit(display_frame, capture_time)
 
+                self.latency_deque.append(time.time() - capture_time)
+                self.stats.record('e2e', self.latency_deque[-1])
 
+                if self.scheduler is not None:
+                    self.scheduler.maybe_step(self)
+                self._mark_first_annotated()
 
         except KeyboardInterrupt:
             print("\n⚠️ 程序被中断")
@@ -555,42 +3427,335 @@ class HighPerformanceDetectorPaddle:
         finally:
             # 清理
             self.running = False
-            if self.pipe:
-                self.pipe.stdin.close()
-                self.pipe.wait()
+            if self.writer is not None:
+                self.writer.close()
+            if self.forwarder is not None:
+                self.forwarder.terminate()
+                self.forwarder.wait()
+            if self.recorder is not None:
+                self.recorder.close()
+            self.frame_slot.close()
+            capture_thread.join(timeout=1.0)
+            if self.ocr_pool is not None:
+                self.ocr_pool.close()
             time.sleep(0.5)  # 等待线程结束
             self.cap.release()
             cv2.destroyAllWindows()
             print("✅ 程序已退出")
 
 
+def collect_pipeline_metrics(detectors):
+    """把所有检测器的指标汇总成 Prometheus 文本行"""
+    merged = {}
+    for detector in detectors:
+        for name, samples in detector.collect_metrics().items():
+            merged.setdefault(name, []).extend(samples)
+
+    descriptions = {
+        'queue_depth': ('gauge', '各阶段队列占用'),
+        'dropped_frames_total': ('counter', '各阶段累计丢帧数'),
+        'frames_total': ('counter', '累计处理帧数'),
+        'fps': ('gauge', '最近一秒的帧率'),
+        'frame_age_seconds': ('gauge', '最近一帧从采集到交给推流的端到端延迟'),
+        'encoder_bytes_total': ('counter', '写入 FFmpeg 管道的累计字节数'),
+        'encoder_restarts_total': ('counter', 'FFmpeg 推流管道重启次数'),
+        'encoder_fps': ('gauge', '传给编码器的实测帧率 (0 = 仍在测量)'),
+        'encoder_frames_total': ('counter', '推流阶梯各路写入/丢弃的帧数'),
+        'ttfaf_seconds': ('gauge', '启动到第一帧带检测结果输出的耗时 (0 = 尚未输出)'),
+        'yolo_tiles': ('gauge', '切块推理最近每帧平均切块数 (0 = 未启用)'),
+        'scene_gate_total': ('counter', '场景门控结果 (run=推理, skipped=画面未变跳过, cache_hit=复用OCR缓存)'),
+        'scene_gate_hit_ratio': ('gauge', '场景门控省掉的推理占比'),
+        'scene_change_percent': ('gauge', '最近一次比较的变化像素百分比 (用于调整阈值)'),
+        'recorder_events_total': ('counter', '事件录像规则命中次数 (持续命中只算一次)'),
+        'recorder_clips_total': ('counter', '已保存的事件片段数'),
+        'recorder_buffer_bytes': ('gauge', '预录环形缓冲占用字节数'),
+        'recorder_dropped_frames_total': ('counter', '预录缓冲编码跟不上而丢弃的帧数'),
+    }
+    lines = histogram_lines('pipeline_stage_seconds', '各阶段耗时 (capture/yolo/ocr/draw/encode/e2e)',
+                            merged.pop('stage_seconds', []))
+    for name, samples in merged.items():
+        metric_type, help_text = descriptions[name]
+        lines += metric_lines(f'pipeline_{name}', help_text, metric_type, samples)
+    return lines
+
+
+def run_multi_stream(sources, push_urls, yolo_model='yolo11n.pt', use_gpu=True, ocr_processes=0,
+                     region_ocr_factory=None, track=False, yolo_stride=1, push_options=None,
+                     metadata_publisher=None, metrics_port=0, scheduler_factory=None,
+                     auto_ocr=True, yolo_format=None, model_cache=MODEL_CACHE_DIR, ocr_max_side=1920,
+                     scene_gate_factory=None, yolo_options=None, ocr_factory=create_paddle_ocr,
+                     tiler_factory=None, recorder_factory=None, yolo_imgsz=640):
+    """多路模式：所有视频流共享一个 YOLO 推理线程，跨流批量推理"""
+    engine = SharedYoloInference(yolo_model, imgsz=yolo_imgsz, export_format=yolo_format,
+                                 cache_dir=model_cache, use_gpu=use_gpu, yolo_options=yolo_options)
+
+    def create_detector(i):
+        return HighPerformanceDetectorPaddle(
+            stream_source=sources[i],
+            rtsp_url=push_urls[i] if push_urls else None,
+            use_gpu=use_gpu,
+            yolo_engine=engine,
+            yolo_imgsz=yolo_imgsz,
+            name=f"cam{i}",
+            ocr_processes=ocr_processes,
+            region_ocr=region_ocr_factory() if region_ocr_factory else None,
+            tracker=BoxTracker() if track else None,
+            yolo_stride=yolo_stride,
+            push_options=push_options,
+            metadata_publisher=metadata_publisher,
+            scheduler=scheduler_factory() if scheduler_factory else None,
+            auto_ocr=auto_ocr,
+            ocr_max_side=ocr_max_side,
+            scene_gate=scene_gate_factory() if scene_gate_factory else None,
+            ocr_factory=ocr_factory,
+            tiler=tiler_factory() if tiler_factory else None,
+            recorder=recorder_factory() if recorder_factory else None
+        )
+
+    # 各路视频源并行打开 (同时共享模型在后台加载)
+    with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="Startup-Stream") as pool:
+        detectors = list(pool.map(create_detector, range(len(sources))))
+
+    if metrics_port:
+        MetricsServer(lambda: collect_pipeline_metrics(detectors), port=metrics_port).start()
+
+    threads = [Thread(target=detector.run, daemon=True, name=f"Stream-{detector.name}")
+               for detector in detectors]
+    engine.start()
+    for thread in threads:
+        thread.start()
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+    except KeyboardInterrupt:
+        print("\n⚠️ 程序被中断")
+        for detector in detectors:
+            detector.running = False
+        for thread in threads:
+            thread.join(timeout=2.0)
+    finally:
+        engine.stop()
+
+
 def main():
     """主函数"""
     import argparse
 
     parser = argparse.ArgumentParser(description='YOLO + PaddleOCR V5 实时检测')
-    parser.add_argument('--camera', type=str, default="0", help='视频源: 传入摄像头ID (如 0) 或 RTSP流地址/视频文件路径')
-    parser.add_argument('--push', type=str, default="", help='推流地址, 例如: rtsp://IP:8554/mystream')
+    parser.add_argument('--camera', type=str, nargs='+', default=["0"],
+                       help='视频源: 传入摄像头ID (如 0) 或 RTSP流地址/视频文件路径，多个视频源用空格分隔')
+    parser.add_argument('--push', type=str, nargs='*', default=[],
+                       help='推流地址, 例如: rtsp://IP:8554/mystream，多路时与 --camera 一一对应')
+    parser.add_argument('--push-queue', type=int, default=2, help='推流写入队列长度')
+    parser.add_argument('--push-drop', choices=['oldest', 'newest', 'block'], default='oldest',
+                       help='推流队列满时的丢帧策略')
+    parser.add_argument('--push-yuv', action='store_true',
+                       help='在进程内预转换为 yuv420p 再写入管道 (管道带宽减半)')
+    parser.add_argument('--push-ladder', type=int, nargs='*', default=[],
+                       help='额外推流的低分辨率高度, 例如 720 360 (地址为推流地址加 _720p / _360p 后缀)')
+    parser.add_argument('--push-fps', type=float, default=0,
+                       help='编码帧率 (默认: 0 = 启动时实测渲染输出帧率)')
+    parser.add_argument('--overlay', choices=['burn', 'metadata'], default='burn',
+                       help='burn=叠加层画进视频并重新编码; metadata=通过WebSocket推送元数据，视频 -c copy 转发')
+    parser.add_argument('--meta-port', type=int, default=8766, help='元数据 WebSocket 端口')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                       help='Prometheus 指标端口, 例如 9100 (默认: 0 = 关闭)')
     parser.add_argument('--yolo', type=str, default='yolo11n.pt',
                        help='YOLO模型 (默认: yolov8n.pt)')
+    parser.add_argument('--yolo-format', type=str, default=None,
+                       choices=['torchscript', 'onnx', 'engine', 'openvino'],
+                       help='YOLO导出格式，首次运行导出后缓存复用；onnx / openvino 由 ONNX Runtime / '
+                            'OpenVINO 直接推理，适合无GPU的边缘设备 (默认: 直接加载 .pt)')
+    parser.add_argument('--int8', action='store_true',
+                       help='int8 量化 (仅 onnx / openvino 格式)')
+    parser.add_argument('--int8-data', type=str, default='coco8.yaml',
+                       help='OpenVINO int8 量化的校准数据集 (默认: coco8.yaml)')
+    parser.add_argument('--threads', type=int, default=0,
+                       help='CPU 推理的算子内线程数，YOLO 和 PaddleOCR 共用 (默认: 0 = 后端默认)')
+    parser.add_argument('--ocr-backend', type=str, default='paddle', choices=['paddle', 'hpi'],
+                       help='PaddleOCR 推理后端：paddle 原生 / hpi 高性能推理 (OpenVINO / ONNX Runtime)')
+    parser.add_argument('--model-cache', type=str, default=MODEL_CACHE_DIR,
+                       help=f'导出模型缓存目录 (默认: {MODEL_CACHE_DIR})')
+    parser.add_argument('--no-ocr', action='store_true',
+                       help='关闭自动OCR (不预加载 PaddleOCR)')
+    parser.add_argument('--ocr-max-side', type=int, default=1920,
+                       help='整帧OCR前把长边缩小到该值，结果坐标自动还原 (默认: 1920, 0 = 原图)')
     parser.add_argument('--cpu', action='store_true', help='强制使用CPU')
+    parser.add_argument('--track', action='store_true',
+                       help='启用目标跟踪 (稳定ID，YOLO结果之间平滑预测框位置)')
+    parser.add_argument('--yolo-stride', type=int, default=1,
+                       help='每N帧运行一次YOLO (建议配合 --track 使用)')
+    parser.add_argument('--adaptive', action='store_true',
+                       help='启用自适应负载调度 (自动调整YOLO尺寸/帧间隔和OCR间隔)')
+    parser.add_argument('--target-fps', type=float, default=20.0, help='自适应调度的目标输出帧率')
+    parser.add_argument('--target-latency', type=float, default=200,
+                       help='自适应调度的目标端到端延迟 (毫秒)')
+    parser.add_argument('--imgsz-range', type=int, nargs=2, default=[320, 640], metavar=('MIN', 'MAX'),
+                       help='自适应调度允许的YOLO输入尺寸范围')
+    parser.add_argument('--max-yolo-stride', type=int, default=4, help='自适应调度允许的最大YOLO帧间隔')
+    parser.add_argument('--max-ocr-interval', type=float, default=5.0,
+                       help='自适应调度允许的最大OCR间隔 (秒)')
+    parser.add_argument('--tile', action='store_true',
+                       help='切块推理：高分辨率画面切成重叠的块和整帧一起推理，提高小目标检出率')
+    parser.add_argument('--tile-size', type=int, default=640,
+                       help='切块边长 (原图像素, 默认: 640，即以原始分辨率推理)')
+    parser.add_argument('--tile-overlap', type=float, default=0.2,
+                       help='相邻切块重叠比例 (默认: 0.2)')
+    parser.add_argument('--tile-adaptive', action='store_true',
+                       help='只切最近有检测结果或有运动的区域 (另有少量切块轮换扫描全图)')
+    parser.add_argument('--max-tiles', type=int, default=16,
+                       help='每帧最多推理的切块数，超出时轮换覆盖 (默认: 16)')
+    parser.add_argument('--scene-gate', action='store_true',
+                       help='场景变化门控：画面基本不变时跳过YOLO和整帧OCR，沿用上次结果')
+    parser.add_argument('--gate-yolo-threshold', type=float, default=0.5,
+                       help='YOLO 门控阈值：缩略图变化像素百分比 (默认: 0.5)')
+    parser.add_argument('--gate-ocr-threshold', type=float, default=2.0,
+                       help='整帧OCR 门控阈值：缩略图变化像素百分比 (默认: 2.0)')
+    parser.add_argument('--gate-max-age', type=float, default=1.0,
+                       help='画面不变时最长跳过多久强制YOLO推理一次 (秒, 默认: 1.0)')
+    parser.add_argument('--gate-ocr-max-age', type=float, default=10.0,
+                       help='画面不变时最长跳过多久强制整帧OCR一次，也是OCR缓存有效期 (秒, 默认: 10.0)')
+    parser.add_argument('--record-on', type=str, nargs='*', default=[],
+                       help='事件录像触发规则, 例如 class:person class:car@0.6 text:京A (默认: 不录像)')
+    parser.add_argument('--record-dir', type=str, default='recordings', help='事件录像保存目录')
+    parser.add_argument('--record-pre', type=float, default=5.0, help='事件前预录时长 (秒)')
+    parser.add_argument('--record-post', type=float, default=5.0, help='最后一次命中后继续录制的时长 (秒)')
+    parser.add_argument('--record-max-clip', type=float, default=60.0, help='单个片段最长时长 (秒)')
+    parser.add_argument('--record-buffer-mb', type=float, default=256,
+                       help='预录环形缓冲上限 (MB，内存 JPEG 或磁盘分段)')
+    parser.add_argument('--record-mode', choices=['auto', 'packets', 'frames'], default='auto',
+                       help='预录缓冲: packets=源码流 -c copy 分段 (不重新编码), frames=内存 JPEG 帧, '
+                            'auto=网络流用 packets')
+    parser.add_argument('--ocr-procs', type=int, default=0,
+                       help='OCR进程池大小 (默认: 0 = 在线程中运行OCR)')
+    parser.add_argument('--ocr-mode', choices=['frame', 'region'], default='frame',
+                       help='OCR模式: frame=整帧识别, region=只识别检测框区域并按目标缓存')
+    parser.add_argument('--ocr-classes', type=str, nargs='*', default=[],
+                       help='区域OCR只处理这些类别 (默认: 所有类别)')
+    parser.add_argument('--ocr-ttl', type=float, default=5.0,
+                       help='区域OCR结果缓存有效期 (秒)')
 
     args = parser.parse_args()
 
     use_gpu = not args.cpu
+    if args.push and len(args.push) != len(args.camera):
+        parser.error("--push 的数量必须与 --camera 一致")
+
+    push_options = {
+        'queue_size': args.push_queue,
+        'drop_policy': args.push_drop,
+        'yuv420': args.push_yuv,
+        'ladder': args.push_ladder,
+        'fps': args.push_fps or None
+    }
+
+    metadata_publisher = None
+    if args.overlay == 'metadata':
+        metadata_publisher = MetadataPublisher(port=args.meta_port)
+        metadata_publisher.start()
+
+    scheduler_factory = None
+    if args.adaptive:
+        scheduler_factory = lambda: LoadScheduler(
+            target_fps=args.target_fps,
+            target_latency=args.target_latency / 1000,
+            min_imgsz=args.imgsz_range[0],
+            max_imgsz=args.imgsz_range[1],
+            max_yolo_stride=args.max_yolo_stride,
+            max_ocr_interval=args.max_ocr_interval
+        )
+
+    # 推理后端：--cpu 决定推理设备，--yolo-format / --int8 / --threads 选择 CPU 优化后端
+    yolo_options = {'int8': args.int8, 'int8_data': args.int8_data, 'threads': args.threads}
+    ocr_factory = functools.partial(create_paddle_ocr, cpu_threads=args.threads,
+                                    enable_hpi=args.ocr_backend == 'hpi')
+
+    scene_gate_factory = None
+    if args.scene_gate:
+        scene_gate_factory = lambda: SceneChangeGate(
+            yolo_threshold=args.gate_yolo_threshold,
+            ocr_threshold=args.gate_ocr_threshold,
+            max_age=args.gate_max_age,
+            ocr_max_age=args.gate_ocr_max_age
+        )
+
+    tiler_factory = None
+    if args.tile:
+        tiler_factory = lambda: TiledInference(
+            tile_size=args.tile_size,
+            overlap=args.tile_overlap,
+            adaptive=args.tile_adaptive,
+            max_tiles=args.max_tiles
+        )
+
+    recorder_factory = None
+    if args.record_on:
+        try:
+            EventRules(args.record_on)
+        except ValueError as e:
+            parser.error(str(e))
+        recorder_factory = lambda: ClipRecorder(
+            EventRules(args.record_on),
+            output_dir=args.record_dir,
+            pre_seconds=args.record_pre,
+            post_seconds=args.record_post,
+            max_clip=args.record_max_clip,
+            max_bytes=int(args.record_buffer_mb * 1024 * 1024),
+            mode=args.record_mode
+        )
+
+    region_ocr_factory = None
+    if args.ocr_mode == 'region':
+        region_ocr_factory = lambda: RegionOcrCache(classes=args.ocr_classes, ttl=args.ocr_ttl)
 
     try:
+        if len(args.camera) > 1:
+            run_multi_stream(args.camera, args.push, yolo_model=args.yolo, use_gpu=use_gpu,
+                             ocr_processes=args.ocr_procs, region_ocr_factory=region_ocr_factory,
+                             track=args.track, yolo_stride=args.yolo_stride,
+                             push_options=push_options, metadata_publisher=metadata_publisher,
+                             metrics_port=args.metrics_port, scheduler_factory=scheduler_factory,
+                             auto_ocr=not args.no_ocr, yolo_format=args.yolo_format,
+                             model_cache=args.model_cache, ocr_max_side=args.ocr_max_side,
+                             scene_gate_factory=scene_gate_factory, yolo_options=yolo_options,
+                             ocr_factory=ocr_factory, tiler_factory=tiler_factory,
+                             recorder_factory=recorder_factory)
+            return
+
         detector = HighPerformanceDetectorPaddle(
-            stream_source=args.camera,
+            stream_source=args.camera[0],
             yolo_model=args.yolo,
-            rtsp_url=args.push if args.push else None,
-            use_gpu=use_gpu
+            rtsp_url=args.push[0] if args.push else None,
+            use_gpu=use_gpu,
+            ocr_processes=args.ocr_procs,
+            region_ocr=region_ocr_factory() if region_ocr_factory else None,
+            tracker=BoxTracker() if args.track else None,
+            yolo_stride=args.yolo_stride,
+            push_options=push_options,
+            metadata_publisher=metadata_publisher,
+            scheduler=scheduler_factory() if scheduler_factory else None,
+            auto_ocr=not args.no_ocr,
+            yolo_format=args.yolo_format,
+            model_cache=args.model_cache,
+            ocr_max_side=args.ocr_max_side,
+            scene_gate=scene_gate_factory() if scene_gate_factory else None,
+            yolo_options=yolo_options,
+            ocr_factory=ocr_factory,
+            tiler=tiler_factory() if tiler_factory else None,
+            recorder=recorder_factory() if recorder_factory else None
         )
+        if args.metrics_port:
+            MetricsServer(lambda: collect_pipeline_metrics([detector]), port=args.metrics_port).start()
         detector.run()
     except Exception as e:
         print(f"❌ 错误: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        if metadata_publisher is not None:
+            metadata_publisher.close()
 
 
 if __name__ == "__main__":